@@ -0,0 +1,74 @@
+"""
+Compares the per-page time of labelling highlight colours with lookup tables (`HighlightClassifier.labels`)
+with one `highlightMask` (`inRange`) pass per colour, for an increasing number of colours.
+
+Usage:
+    python benchmarks/bench_colors.py [--pages 10] [--dpi 72 150] [--repeat 3]
+
+The pages of the default raster document of `bench_refine.py` are rendered once; only the labelling is timed.
+Both ways give the same labels: a pixel takes the first colour whose range holds it.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import fitz
+import numpy as np
+from utils import *
+from synth import build_highlighted_pdf
+from bench_refine import DOCUMENTS
+
+
+def per_color_masks(img, classifier):
+    """Labels the pixels of an image with one `highlightMask` pass per colour, kept here for comparison."""
+    labels = np.zeros(img.shape[:2], np.uint8)
+    for label, name in reversed(list(enumerate(classifier.names, 1))):
+        mask, _ = highlightMask(img, HIGHLIGHT_CLASSES[name][0])
+        labels[mask > 0] = label
+    return labels
+
+
+def lookup_tables(img, classifier):
+    """Labels the pixels of an image like `getHighlightedText`."""
+    return classifier.labels(img)[0]
+
+
+def measure(label, images, classifier, repeat):
+    """Returns the fastest seconds per page of a labelling over the rendered pages, and its labels."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        labels = [label(img, classifier) for img in images]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(images), labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare lookup table and per-colour highlight labelling.")
+    parser.add_argument("--pages", type=int, default=10, help="Pages rendered (default: 10).")
+    parser.add_argument("--dpi", type=int, nargs="+", default=[72, 150], help="Render resolutions (default: 72 150).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per labelling; the fastest is kept (default: 3).")
+    args = parser.parse_args()
+
+    print(f"{'dpi':>4}  {'colours':>7}  {'per colour ms':>13}  {'tables ms':>9}  {'same':>4}")
+    with tempfile.TemporaryDirectory() as tmp:
+        doc = fitz.open(build_highlighted_pdf(os.path.join(tmp, "raster.pdf"), pages=args.pages, **DOCUMENTS["raster"]))
+        for dpi in args.dpi:
+            images = [render_page(page, dpi=dpi) for page in doc]
+            for count in range(1, len(HIGHLIGHT_CLASSES) + 1):
+                classifier = HighlightClassifier(list(HIGHLIGHT_CLASSES)[:count])
+                masks_seconds, masks_labels = measure(per_color_masks, images, classifier, args.repeat)
+                tables_seconds, tables_labels = measure(lookup_tables, images, classifier, args.repeat)
+                same = all(np.array_equal(a, b) for a, b in zip(masks_labels, tables_labels))
+                print(f"{dpi:>4}  {count:>7}  {masks_seconds * 1000:>13.2f}  {tables_seconds * 1000:>9.2f}  {'yes' if same else 'no':>4}")
+        doc.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Measures `get_summary` wall time against the number of worker processes.
+
+Usage:
+    python benchmarks/bench_jobs.py [pages] [max_jobs]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+from main import get_summary
+from synth import build_highlighted_pdf
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    max_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = build_highlighted_pdf(os.path.join(tmp, "reference.pdf"), pages=pages)
+        baseline = None
+        reference = None
+        print(f"{'jobs':>4}  {'seconds':>8}  {'speedup':>7}")
+        for jobs in sorted({1, 2, 4, max_jobs}):
+            if jobs > max_jobs:
+                continue
+            doc = fitz.open(pdf_path)
+            start = time.perf_counter()
+            results = get_summary(doc, show_progress=False, jobs=jobs)
+            elapsed = time.perf_counter() - start
+            doc.close()
+
+            baseline = baseline or elapsed
+            reference = reference or results
+            assert results == reference, "parallel output differs from the serial run"
+            print(f"{jobs:>4}  {elapsed:>8.2f}  {baseline / elapsed:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares the ways of mapping highlights to the sentences of a page (`map_highlights`): by geometry, by fuzzy
+matching and both, for time per page and sentence precision and recall.
+
+Usage:
+    python benchmarks/bench_mapping.py [--pages 10] [--threshold 25 50] [--repeat 3]
+
+The highlights are read by the pipeline's extractors. The benchmark generator highlights the first 40 characters
+of each chosen sentence, so the truth is the sentence each highlight starts in, whatever share of it is covered.
+The time of the geometry includes assigning the words of the page to its sentences (`sentence_words`).
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+from utils import *
+from extractors import getAnnotationHighlights, getHighlightedText
+from synth import build_highlighted_pdf
+
+
+# Documents measured: the default pages with highlight annotations, with raster highlights, and dense pages.
+DOCUMENTS = {
+    "annotations": dict(),
+    "raster": dict(highlight_style="raster"),
+    "raster-dense": dict(sentences_per_page=40, highlights_per_page=12, highlight_style="raster"),
+}
+
+
+def read_page(doc, page_num, truth_page):
+    """Returns the sentences, highlights and highlight boxes of a page, and the indices of its highlighted sentences."""
+    page_ctx = PageContext(doc, page_num)
+    sentences, _ = getTextFromPDFAsParagraphs(doc, page_num, page_ctx=page_ctx)
+    highlights = getAnnotationHighlights(page_ctx, with_boxes=True)
+    if not highlights:
+        img = pdf_page_to_image(doc, page_num, page_ctx=page_ctx)
+        highlights = getHighlightedText(doc, page_num, img, show_result_image=False, page_ctx=page_ctx, with_boxes=True)
+
+    # The truth: the sentence holding the first word under each highlight annotation of the annotated twin
+    truth_ctx = PageContext(truth_page.parent, page_num)
+    words = sentence_words(truth_ctx.text, truth_ctx.words.words)
+    truth = set()
+    for annot in truth_page.annots(types=[fitz.PDF_ANNOT_HIGHLIGHT]):
+        found = [sentence for sentence, boxes in enumerate(words) for _, *box in boxes if (fitz.Rect(box) & annot.rect).get_area() > 0.5 * fitz.Rect(box).get_area()]
+        truth.add(min(found)) if found else None
+    return page_ctx, sentences, [text for text, _, _ in highlights], [boxes for _, _, boxes in highlights], truth
+
+
+def measure(pages, mode, threshold, repeat):
+    """Returns the fastest seconds per page of a mapping over the pages, and the indices of the sentences it selected on each."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        selected = []
+        for page_ctx, sentences, texts, boxes, _ in pages:
+            words = sentence_words(page_ctx.text, page_ctx.words.words) if mode != "fuzzy" else []
+            matches, _ = map_highlights(texts, boxes, sentences, words, threshold=threshold, mode=mode)
+            selected.append({sentences.index(match) for match in matches})
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(pages), selected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the geometry and fuzzy mapping of highlights to sentences.")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document (default: 10).")
+    parser.add_argument("--threshold", type=int, nargs="+", default=[25, 50], help="Thresholds measured (default: 25 50).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode; the fastest is kept (default: 3).")
+    args = parser.parse_args()
+
+    print(f"{'document':<14}  {'threshold':>9}  {'mode':<8}  {'ms/page':>8}  {'precision':>9}  {'recall':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, spec in DOCUMENTS.items():
+            doc = fitz.open(build_highlighted_pdf(os.path.join(tmp, f"{name}.pdf"), pages=args.pages, **spec))
+            truth_doc = fitz.open(build_highlighted_pdf(os.path.join(tmp, f"{name}-truth.pdf"), pages=args.pages, **{**spec, "highlight_style": "annotation"}))
+            pages = [read_page(doc, page_num, truth_doc[page_num - 1]) for page_num in range(1, doc.page_count + 1)]
+            for threshold in args.threshold:
+                for mode in MATCH_MODES:
+                    seconds, selected = measure(pages, mode, threshold, args.repeat)
+                    found = sum(len(page_selected & page[4]) for page_selected, page in zip(selected, pages))
+                    chosen, expected = sum(map(len, selected)), sum(len(page[4]) for page in pages)
+                    print(f"{name:<14}  {threshold:>9}  {mode:<8}  {seconds * 1000:>8.2f}  {found / chosen if chosen else 0:>9.3f}  {found / expected if expected else 0:>6.3f}")
+            doc.close()
+            truth_doc.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares the per-highlight `thefuzz.process.extract` loop with the batched `match_highlights`
+on synthetic pages with many sentences, and checks both give the same matches.
+
+Usage:
+    python benchmarks/bench_matching.py [sentences] [highlights] [threshold]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thefuzz import fuzz, process
+from utils import match_highlights
+from synth import make_sentence
+
+
+def match_highlights_thefuzz(highlights, sentences, threshold=50):
+    """The matching loop used before `match_highlights`, kept here for comparison."""
+    matches = []
+    for text in highlights:
+        matches.extend(process.extract(text, sentences, scorer=fuzz.token_sort_ratio))
+    matches = list(dict.fromkeys([match for match, score in matches if score >= threshold]))
+    return sorted(matches, key=lambda x: sentences.index(x))
+
+
+def main():
+    n_sentences = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    n_highlights = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    threshold = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    rng = random.Random(0)
+    sentences = [make_sentence(rng) for _ in range(n_sentences)]
+    # Highlights are clipped fragments of real sentences, like the text read from highlight boxes
+    highlights = [s[rng.randint(0, 10):rng.randint(25, len(s))] for s in rng.sample(sentences, n_highlights)]
+
+    timings = {}
+    outputs = {}
+    for name, match in (("thefuzz", match_highlights_thefuzz), ("cdist", match_highlights)):
+        start = time.perf_counter()
+        outputs[name] = match(highlights, sentences, threshold=threshold)
+        timings[name] = time.perf_counter() - start
+
+    assert outputs["thefuzz"] == outputs["cdist"], "matching outputs differ"
+    print(f"{n_sentences} sentences x {n_highlights} highlights, {len(outputs['cdist'])} matches")
+    for name, seconds in timings.items():
+        print(f"{name:<8}  {seconds * 1000:>9.2f} ms  {timings['thefuzz'] / seconds:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Compares per-page render time and peak traced memory of `render_page` with the old
+PNG round-trip path (`get_pixmap` -> `tobytes` -> `PIL.Image.open` -> `np.array` -> `cvtColor`).
+
+Usage:
+    python benchmarks/bench_render.py [pages] [dpi]
+"""
+import io
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import fitz
+import numpy as np
+from PIL import Image
+from utils import render_page
+from synth import build_highlighted_pdf
+
+
+def render_page_png(page, dpi=72):
+    """The rendering path used before `render_page`, kept here for comparison."""
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    rgb_array = np.array(Image.open(io.BytesIO(pix.tobytes())))
+    return cv2.cvtColor(rgb_array, cv2.COLOR_RGB2BGR)
+
+
+def measure(doc, render, dpi):
+    """Returns the mean seconds per page and the peak traced memory of rendering every page."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    for page in doc:
+        render(page, dpi=dpi)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / doc.page_count, peak
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    dpi = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+
+    with tempfile.TemporaryDirectory() as tmp:
+        doc = fitz.open(build_highlighted_pdf(os.path.join(tmp, "reference.pdf"), pages=pages))
+        assert np.array_equal(render_page(doc[0], dpi=dpi), render_page_png(doc[0], dpi=dpi)), "render paths disagree"
+
+        print(f"{'path':<12}  {'ms/page':>8}  {'peak MiB':>8}")
+        for name, render in (("png", render_page_png), ("samples", render_page)):
+            per_page, peak = measure(doc, render, dpi)
+            print(f"{name:<12}  {per_page * 1000:>8.2f}  {peak / 2**20:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
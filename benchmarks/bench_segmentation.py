@@ -0,0 +1,82 @@
+"""
+Compares the per-page CV time and accuracy of the highlight segmentation (`HighlightClassifier.labels` and
+`getMaskRegions`: one closing and connected components on the mask) with the chain it replaced
+(`detectColor`, then `getContours`: blur, Canny, dilation, closing, contours and polygon fits, then `getRoi`).
+
+Usage:
+    python benchmarks/bench_segmentation.py [--pages 10] [--dpi 72 150 300] [--repeat 3]
+
+The pages of the raster documents of `bench_refine.py` are rendered once; only the segmentation is timed.
+Accuracy is measured on the words read from the boxes, against the same sentences highlighted with annotations.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import fitz
+from utils import *
+from synth import build_highlighted_pdf
+from bench_refine import DOCUMENTS, page_words, truth_words, score
+
+
+# The single HSV range highlights were detected in before `HighlightClassifier`, as [H_min, H_max, S_min, S_max, V_min, V_max].
+FORMER_HIGHLIGHT_HSV = [0, 65, 59, 255, 0, 255]
+# The Canny thresholds the contour chain used on highlights.
+FORMER_CANNY_THRESHOLDS = [100, 150]
+
+def contour_chain(img, zoom):
+    """The highlight segmentation used before `getMaskRegions`, kept here for comparison."""
+    imgResult, _ = detectColor(img, FORMER_HIGHLIGHT_HSV)
+    _, contours = getContours(imgResult, img, minArea=1000 * zoom * zoom, filter=0, cThr=FORMER_CANNY_THRESHOLDS, draw=True)
+    return getRoi(contours)
+
+
+def mask_components(img, zoom):
+    """The highlight segmentation of `getHighlightedText`."""
+    labels, _ = highlight_classifier().labels(img)
+    mask = cv2.compare(labels, 0, cv2.CMP_GT)
+    return getMaskRegions(mask, minArea=HIGHLIGHT_MIN_AREA * zoom * zoom, closeSize=round(HIGHLIGHT_CLOSE_SIZE * zoom))
+
+
+def measure(segment, pages, zoom, repeat):
+    """Returns the fastest seconds per page of a segmentation over the rendered pages, and the boxes found on each page in points."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        boxes = [segment(img, zoom) for _, img in pages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(pages), [[pixel_box_to_points(box, zoom) for box in page_boxes] for page_boxes in boxes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the highlight segmentation with the contour chain it replaced.")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document (default: 10).")
+    parser.add_argument("--dpi", type=int, nargs="+", default=[72, 150, 300], help="Render resolutions (default: 72 150 300).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per segmentation; the fastest is kept (default: 3).")
+    args = parser.parse_args()
+
+    print(f"{'document':<14}  {'dpi':>4}  {'segmentation':<12}  {'ms/page':>8}  {'precision':>9}  {'recall':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, spec in DOCUMENTS.items():
+            doc = fitz.open(build_highlighted_pdf(os.path.join(tmp, f"{name}.pdf"), pages=args.pages, **spec))
+            truth_doc = fitz.open(build_highlighted_pdf(os.path.join(tmp, f"{name}-truth.pdf"), pages=args.pages, **{**spec, "highlight_style": "annotation"}))
+            truths = [truth_words(page) for page in truth_doc]
+            for dpi in args.dpi:
+                pages = [(page, render_page(page, dpi=dpi)) for page in doc]
+                for label, segment in (("contours", contour_chain), ("components", mask_components)):
+                    seconds, boxes = measure(segment, pages, dpi / 72, args.repeat)
+                    words = [page_words(" ".join(page.get_text("text", clip=fitz.Rect(box)) for box in page_boxes)) for (page, _), page_boxes in zip(pages, boxes)]
+                    precision, recall = score(words, truths)
+                    print(f"{name:<14}  {dpi:>4}  {label:<12}  {seconds * 1000:>8.2f}  {precision:>9.3f}  {recall:>6.3f}")
+            doc.close()
+            truth_doc.close()
+
+
+if __name__ == '__main__':
+    main()
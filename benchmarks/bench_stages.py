@@ -0,0 +1,173 @@
+"""
+Times each stage of the summarize pipeline on the synthetic benchmark corpus and saves the results as JSON.
+
+Usage:
+    python benchmarks/bench_stages.py [--corpus folder] [--documents name ...] [--dpi 72] [--repeat 3]
+                                      [--output results.json] [--compare baseline.json]
+
+The stages are timed on every page of every corpus document (see `synth.CORPUS`), each one run on
+its own with the inputs the pipeline would give it: render (`pdf_page_to_image`), the colour labels
+(`HighlightClassifier.labels`), `getMaskRegions`, `get_text_from_bbox` (one call per detected region), page text
+(`getTextFromPDFAsParagraphs`), the annotation and drawing highlight readers, the sentences of the
+page's words (`sentence_words`), geometry matching (`match_sentence_boxes`), fuzzy matching
+(`match_highlights`), `getHeadings`, `attach_headings`, and each writer on the document's summary.
+Each document is measured `--repeat` times and the fastest run of each stage is kept.
+
+With `--compare`, the per-call time of each stage is printed next to that of an earlier results file.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import fitz
+from main import get_summary
+from utils import *
+from extractors import getHeadings, getAnnotationHighlights, getDrawingHighlights
+from synth import CORPUS, build_corpus
+
+
+def timed(timings, stage, function, *args, **kwargs):
+    """Calls `function`, adds its wall time to `timings[stage]` and returns its result."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    timings[stage].append(time.perf_counter() - start)
+    return result
+
+
+def time_document(pdf_path, dpi, tmp):
+    """
+    Runs every stage once on every page of a document.
+
+    Returns:
+    + A dict mapping each stage to the list of its call durations in seconds.
+    """
+    timings = defaultdict(list)
+    zoom = dpi / 72
+    classifier = highlight_classifier()
+    doc = fitz.open(pdf_path)
+    for page_num in range(1, doc.page_count + 1):
+        page_ctx = PageContext(doc, page_num)
+        sentences, paragraphs = timed(timings, "page_text", getTextFromPDFAsParagraphs, doc, page_num, page_ctx=page_ctx)
+        highlights = timed(timings, "annotation_highlights", getAnnotationHighlights, page_ctx, with_boxes=True)
+        highlights = timed(timings, "drawing_highlights", getDrawingHighlights, page_ctx, with_boxes=True) or highlights
+
+        img = timed(timings, "render", pdf_page_to_image, doc, page_num, page_ctx=page_ctx, dpi=dpi)
+        labels, _ = timed(timings, "highlightLabels", classifier.labels, img)
+        mask = cv2.compare(labels, 0, cv2.CMP_GT)
+        rois = timed(timings, "getMaskRegions", getMaskRegions, mask, minArea=HIGHLIGHT_MIN_AREA * zoom * zoom, closeSize=round(HIGHLIGHT_CLOSE_SIZE * zoom))
+        raster_boxes = [pixel_box_to_points(roi, zoom) for roi in rois]
+        raster_highlights = [(timed(timings, "get_text_from_bbox", get_text_from_bbox, doc, page_num, box, page_ctx=page_ctx), None, [box]) for box in raster_boxes]
+
+        texts, _, boxes = zip(*(highlights or raster_highlights)) if highlights or raster_highlights else ((), (), ())
+        words = timed(timings, "sentence_words", sentence_words, page_ctx.text, page_ctx.words.words)
+        selected, _, _ = timed(timings, "match_sentence_boxes", match_sentence_boxes, list(boxes), words, threshold=MATCH_THRESHOLDS["geometry"])
+        timed(timings, "match_highlights", match_highlights, list(texts), sentences)
+        matches = [sentences[sentence] for sentence in selected]
+        headings = timed(timings, "getHeadings", getHeadings, paragraphs)
+        timed(timings, "attach_headings", attach_headings, matches, headings)
+
+    results = get_summary(doc, show_progress=False)
+    for writer, extension in ((save_to_txt, "txt"), (save_to_pdf, "pdf"), (save_to_docx, "docx")):
+        timed(timings, f"{writer.__name__}", writer, results, os.path.join(tmp, f"summary.{extension}"))
+    doc.close()
+    return timings
+
+
+def summarize_timings(runs):
+    """
+    Keeps the fastest of several runs of each stage.
+
+    Returns:
+    + A dict mapping each stage to its `calls`, total `seconds` and `ms_per_call`.
+    """
+    stages = {}
+    for stage in runs[0]:
+        seconds = min(sum(run[stage]) for run in runs)
+        calls = len(runs[0][stage])
+        stages[stage] = {"calls": calls, "seconds": round(seconds, 6), "ms_per_call": round(seconds / calls * 1000, 4) if calls else 0}
+    return stages
+
+
+def git_commit():
+    """Returns the commit the repository is at, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(totals, baseline=None):
+    """Prints the per-stage totals, with the change in time per call against `baseline` totals if given."""
+    header = f"{'stage':<22}  {'calls':>6}  {'total ms':>10}  {'ms/call':>9}"
+    print(header + (f"  {'baseline':>9}  {'change':>7}" if baseline else ""))
+    for stage, result in totals.items():
+        line = f"{stage:<22}  {result['calls']:>6}  {result['seconds'] * 1000:>10.2f}  {result['ms_per_call']:>9.3f}"
+        if baseline and stage in baseline and baseline[stage]["ms_per_call"]:
+            before = baseline[stage]["ms_per_call"]
+            line += f"  {before:>9.3f}  {(result['ms_per_call'] - before) / before * 100:>+6.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each summarize stage on the synthetic corpus.")
+    parser.add_argument("--corpus", default=None, help="Folder to build the corpus in (default: a temporary folder).")
+    parser.add_argument("--documents", nargs="*", default=list(CORPUS), help="Corpus documents to measure (default: all).")
+    parser.add_argument("--dpi", type=int, default=72, help="Render resolution (default: 72).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per document; the fastest of each stage is kept (default: 3).")
+    parser.add_argument("--output", default=None, help="Where to save the results as JSON.")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = {name: CORPUS[name] for name in args.documents}
+        paths = build_corpus(args.corpus or os.path.join(tmp, "corpus"), corpus)
+
+        documents = {}
+        for name, path in paths.items():
+            runs = [time_document(path, args.dpi, tmp) for _ in range(args.repeat)]
+            documents[name] = {"spec": corpus[name], "pages": fitz.open(path).page_count, "stages": summarize_timings(runs)}
+            print(f"[INFO] {name}: {documents[name]['pages']} page(s) measured {args.repeat} time(s).")
+
+    totals = {}
+    for document in documents.values():
+        for stage, result in document["stages"].items():
+            total = totals.setdefault(stage, {"calls": 0, "seconds": 0.0})
+            total["calls"] += result["calls"]
+            total["seconds"] += result["seconds"]
+    for total in totals.values():
+        total["seconds"] = round(total["seconds"], 6)
+        total["ms_per_call"] = round(total["seconds"] / total["calls"] * 1000, 4) if total["calls"] else 0
+
+    results = {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                 "pymupdf": fitz.VersionBind, "opencv": cv2.__version__, "cpus": os.cpu_count(), "dpi": args.dpi, "repeat": args.repeat},
+        "documents": documents,
+        "totals": totals,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            compared = json.load(f)
+        baseline = compared["totals"]
+        if set(compared["documents"]) != set(documents) or compared["meta"]["dpi"] != args.dpi:
+            print(f"[WARNING] {args.compare} measured other documents or another dpi, the comparison is only indicative.")
+    print_table(totals, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
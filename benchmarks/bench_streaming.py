@@ -0,0 +1,65 @@
+"""
+Measures the peak RSS of summarizing documents of different lengths, with the whole summary
+held in a list versus streamed from `get_summary(..., stream=True)` into the writers.
+
+Usage:
+    python benchmarks/bench_streaming.py [format] [pages ...]
+
+Each run happens in a fresh child process so its peak RSS is not shared with the other runs.
+"""
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_child(mode, pdf_path, output_path):
+    """Summarizes `pdf_path` into `output_path` and prints the peak RSS in MiB and the wall time."""
+    from itertools import chain
+    import fitz
+    from main import get_summary
+    from utils import save_to_txt, save_to_pdf, save_to_docx
+
+    writers = {".txt": save_to_txt, ".pdf": save_to_pdf, ".docx": save_to_docx}
+    writer = writers[os.path.splitext(output_path)[1]]
+
+    start = time.perf_counter()
+    doc = fitz.open(pdf_path)
+    if mode == "stream":
+        writer(chain.from_iterable(get_summary(doc, show_progress=False, stream=True)), output_path)
+    else:
+        writer(get_summary(doc, show_progress=False), output_path)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    print(f"{peak:.1f} {elapsed:.1f}")
+
+
+def main():
+    from synth import build_highlighted_pdf
+
+    fmt = sys.argv[1] if len(sys.argv) > 1 else "pdf"
+    page_counts = [int(n) for n in sys.argv[2:]] or [100, 3000]
+
+    print(f"{'pages':>6}  {'mode':<6}  {'peak RSS MiB':>12}  {'seconds':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in page_counts:
+            pdf_path = build_highlighted_pdf(os.path.join(tmp, f"reference-{pages}.pdf"), pages=pages)
+            for mode in ("list", "stream"):
+                output_path = os.path.join(tmp, f"summary-{pages}-{mode}.{fmt}")
+                out = subprocess.run([sys.executable, __file__, "--child", mode, pdf_path, output_path], capture_output=True, text=True, check=True).stdout
+                peak, seconds = out.split()[-2:]
+                print(f"{pages:>6}  {mode:<6}  {float(peak):>12.1f}  {float(seconds):>8.1f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(*sys.argv[2:5])
+    else:
+        main()
@@ -0,0 +1,83 @@
+"""
+Compares reading the text of highlight boxes with one clipped extraction per box (`page.get_text("text", clip=...)`)
+with one extraction of the page's words into a `WordIndex` queried for every box, on pages with many boxes.
+
+Usage:
+    python benchmarks/bench_text.py [--pages 10] [--highlights 10 30 60] [--repeat 3]
+
+The boxes are the quads of the highlight annotations, one per highlighted line (the benchmark's sentences fit on a
+line, so there is a box per highlighted sentence). The time of the index includes extracting the page's text
+layout, which the summarize pipeline shares with the page text. Accuracy is measured on words against the words the annotations
+cover (see `bench_refine.py`); cut words are words read that are not words of the page, such as "summ".
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+from utils import *
+from synth import build_highlighted_pdf
+from bench_refine import page_words, truth_words, score
+
+
+def highlight_boxes(page):
+    """Returns the rectangles of the quads of a page's highlight annotations."""
+    boxes = []
+    for annot in page.annots(types=[fitz.PDF_ANNOT_HIGHLIGHT]):
+        points = annot.vertices or []
+        boxes += [tuple(fitz.Quad(points[i:i+4]).rect) for i in range(0, len(points) - 3, 4)]
+    return boxes
+
+
+def clipped_text(page, boxes):
+    """Reads each box with its own clipped extraction, as `get_text_from_bbox` did."""
+    return [page.get_text("text", clip=fitz.Rect(box)) for box in boxes]
+
+
+def indexed_text(page, boxes):
+    """Reads each box from a `WordIndex` of the page, as `get_text_from_bbox` does."""
+    words = WordIndex(page.get_text("words", textpage=page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)))
+    return [words.text(box) for box in boxes]
+
+
+def measure(read, pages, repeat):
+    """Returns the fastest seconds per page of a reader over the pages, and the texts read on each page."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        texts = [read(page, boxes) for page, boxes in pages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(pages), texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare clipped and indexed text reading of highlight boxes.")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document (default: 10).")
+    parser.add_argument("--highlights", type=int, nargs="+", default=[10, 30, 60], help="Highlighted sentences per page (default: 10 30 60).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per reader; the fastest is kept (default: 3).")
+    args = parser.parse_args()
+
+    print(f"{'highlights':>10}  {'boxes':>5}  {'reader':<7}  {'ms/page':>8}  {'precision':>9}  {'recall':>6}  {'cut words':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for highlights in args.highlights:
+            doc = fitz.open(build_highlighted_pdf(os.path.join(tmp, f"{highlights}.pdf"), pages=args.pages, sentences_per_page=max(60, highlights), highlights_per_page=highlights))
+            pages = [(page, highlight_boxes(page)) for page in doc]
+            truths = [truth_words(page) for page in doc]
+            vocabulary = set().union(*(page_words(page.get_text()) for page, _ in pages))
+            boxes = sum(len(page_boxes) for _, page_boxes in pages) / len(pages)
+            for label, read in (("clip", clipped_text), ("index", indexed_text)):
+                seconds, texts = measure(read, pages, args.repeat)
+                words = [page_words(" ".join(page_texts)) for page_texts in texts]
+                precision, recall = score(words, truths)
+                cut = sum(count for page in words for word, count in page.items() if word not in vocabulary)
+                print(f"{highlights:>10}  {boxes:>5.0f}  {label:<7}  {seconds * 1000:>8.2f}  {precision:>9.3f}  {recall:>6.3f}  {cut:>9}")
+            doc.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Builds deterministic synthetic PDFs with highlighted text, used by the benchmark scripts.
+
+Usage:
+    python benchmarks/synth.py [folder]
+
+builds the benchmark corpus (`CORPUS`) into `folder` (default: benchmarks/corpus).
+"""
+import os
+import sys
+import random
+import fitz
+import numpy as np
+
+
+WORDS = ("data model page text figure value result method system process image layer input output "
+         "signal network table summary section review detail sample vector matrix report").split()
+
+HIGHLIGHT_COLORS = {
+    "yellow": (1, 1, 0),
+    "green": (0.5, 1, 0.3),
+    "orange": (1, 0.7, 0.2),
+    "pink": (1, 0.5, 0.8),
+    "blue": (0.4, 0.8, 1),
+}
+
+
+def make_sentence(rng, min_words=8, max_words=16):
+    """
+    Builds one pseudo-random sentence.
+
+    Arguments:
+    + rng -- The `random.Random` instance to draw words from.
+    + min_words, max_words -- Bounds on the number of words in the sentence.
+
+    Returns:
+    + A capitalised sentence ending with a full stop.
+    """
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_image(seed, width=240, height=150):
+    """
+    Builds a deterministic RGB picture (a gradient with a few filled shapes) to embed in a page.
+
+    Arguments:
+    + seed -- Seed of the picture.
+    + width, height -- Size of the picture in pixels.
+
+    Returns:
+    + A `fitz.Pixmap` of the picture.
+    """
+    state = np.random.RandomState(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.stack([x * 255 // width, y * 255 // height, np.full_like(x, state.randint(0, 256))], axis=-1).astype(np.uint8)
+    for _ in range(4):
+        x0, y0 = state.randint(0, width - 40), state.randint(0, height - 30)
+        image[y0:y0 + state.randint(10, 30), x0:x0 + state.randint(10, 40)] = state.randint(0, 256, 3)
+    return fitz.Pixmap(fitz.csRGB, width, height, image.tobytes(), False)
+
+
+def paint_highlights(page, rects, color, zoom=2):
+    """
+    Paints highlight rectangles into a full-page background image, behind the text.
+
+    Arguments:
+    + page -- The `fitz.Page` to paint.
+    + rects -- The rectangles to highlight, in PDF points.
+    + color -- The highlight colour as an (r, g, b) tuple of floats.
+    + zoom -- Pixels per PDF point of the background image.
+
+    Returns:
+    None
+    """
+    width, height = int(page.rect.width * zoom), int(page.rect.height * zoom)
+    image = np.full((height, width, 3), 255, np.uint8)
+    for rect in rects:
+        image[int(rect.y0 * zoom):int(rect.y1 * zoom), int(rect.x0 * zoom):int(rect.x1 * zoom)] = [int(c * 255) for c in color]
+    page.insert_image(page.rect, pixmap=fitz.Pixmap(fitz.csRGB, width, height, image.tobytes(), False), overlay=False)
+
+
+def build_highlighted_pdf(path, pages=20, sentences_per_page=25, highlights_per_page=4, seed=0, highlight_style="annotation",
+                          highlight_color=(1, 1, 0), headings=True, images_per_page=0, captions=True, highlight_height=1):
+    """
+    Writes a PDF whose pages contain a numbered heading, plain sentences and highlights, and optionally figures.
+
+    The defaults give the same pages as before the figure and colour options existed, so benchmark 
+    numbers stay comparable.
+
+    Arguments:
+    + path -- Where to save the PDF.
+    + pages -- Number of pages to generate.
+    + sentences_per_page -- Number of sentences written on each page.
+    + highlights_per_page -- Number of sentences highlighted on each page.
+    + seed -- Seed for the random generator, so the same arguments always give the same file.
+    + highlight_style -- How the highlights are stored: "annotation" for highlight annotations (read by
+      `getAnnotationHighlights`), "drawing" for semi-transparent filled rectangles drawn behind the text
+      (read by `getDrawingHighlights`), or "raster" for rectangles painted into a background image,
+      which only the OpenCV detection in `getHighlightedText` can find.
+    + highlight_color -- The highlight colour as an (r, g, b) tuple of floats, see `HIGHLIGHT_COLORS`.
+    + headings -- Whether each page starts with a numbered heading such as "3.1 Data model".
+    + images_per_page -- Number of embedded pictures placed above the text of each page (at most 2).
+    + captions -- Whether each picture gets a "Figure <page>.<n>" caption below it.
+    + highlight_height -- The share of the line height covered by raster highlights, from the bottom of the line, 
+      e.g. 0.5 for thin marker strokes.
+
+    Returns:
+    + path -- The path of the saved PDF.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(1, pages + 1):
+        page = doc.new_page()
+        top = 50
+        if headings:
+            heading = f"{page_num}.1 {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}"
+            page.insert_textbox(fitz.Rect(50, top, 550, top + 30), heading, fontsize=14)
+        top += 40
+
+        figures = min(images_per_page, 2)
+        for figure in range(1, figures + 1):
+            left = 50 + (figure - 1) * 260
+            page.insert_image(fitz.Rect(left, top, left + 240, top + 150), pixmap=make_image(seed * 1000 + page_num * 10 + figure))
+            if captions:
+                page.insert_textbox(fitz.Rect(left, top + 155, left + 240, top + 190), f"Figure {page_num}.{figure}: {make_sentence(rng, 3, 6)}", fontsize=8)
+        top += 200 if figures else 0
+
+        body = " ".join(make_sentence(rng) for _ in range(sentences_per_page))
+        page.insert_textbox(fitz.Rect(50, top, 550, 800), body, fontsize=10)
+
+        sentences = [s.strip() + "." for s in body.split(". ") if s.strip()]
+        painted = []
+        for sentence in rng.sample(sentences, min(highlights_per_page, len(sentences))):
+            quads = page.search_for(sentence.rstrip(".")[:40], quads=True)
+            if quads and highlight_style == "annotation":
+                annot = page.add_highlight_annot(quads[0])
+                if highlight_color != (1, 1, 0):
+                    annot.set_colors(stroke=highlight_color)
+                    annot.update()
+            elif quads and highlight_style == "raster":
+                rect = quads[0].rect
+                painted.append(fitz.Rect(rect.x0, rect.y1 - rect.height * highlight_height, rect.x1, rect.y1))
+            elif quads:
+                page.draw_rect(quads[0].rect, color=None, fill=highlight_color, fill_opacity=0.5, overlay=False)
+        if painted:
+            paint_highlights(page, painted, highlight_color)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
+
+
+# The benchmark corpus: one document per variation of the generator, all small enough to build in seconds.
+CORPUS = {
+    "annotations": dict(pages=20),
+    "drawings": dict(pages=20, highlight_style="drawing"),
+    "raster": dict(pages=20, highlight_style="raster"),
+    "raster-dense": dict(pages=10, sentences_per_page=40, highlights_per_page=12, highlight_style="raster"),
+    "raster-green": dict(pages=10, highlight_style="raster", highlight_color=HIGHLIGHT_COLORS["green"]),
+    "raster-blue": dict(pages=10, highlight_style="raster", highlight_color=HIGHLIGHT_COLORS["blue"]),
+    "figures": dict(pages=10, sentences_per_page=12, images_per_page=2, highlight_style="raster"),
+    "no-headings": dict(pages=10, headings=False, highlight_style="drawing"),
+    "long": dict(pages=200, sentences_per_page=15, highlights_per_page=2),
+}
+
+
+def build_corpus(folder, corpus=CORPUS, seed=0):
+    """
+    Builds the documents of a corpus into a folder.
+
+    Arguments:
+    + folder -- The folder to write the documents to. It is created if needed.
+    + corpus -- A dict mapping document names to `build_highlighted_pdf` arguments (default: `CORPUS`).
+    + seed -- Seed of every document.
+
+    Returns:
+    + A dict mapping the document names to their paths.
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = {}
+    for name, spec in corpus.items():
+        paths[name] = build_highlighted_pdf(os.path.join(folder, f"{name}.pdf"), seed=seed, **spec)
+    return paths
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+    for name, path in build_corpus(folder).items():
+        print(f"{name:<14}  {path}")
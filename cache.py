@@ -0,0 +1,364 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from timings import timed
+
+
+# Bump when a cached stage changes what it produces, so entries written by older code are never read back.
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "ospdf")
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# Indirect references ("12 0 R") inside an object, and the keys holding back references to a parent page 
+# or page tree node, which would pull the whole document into every page's fingerprint.
+REFERENCE_PATTERN = re.compile(r"(\d+) (\d+) R")
+BACK_REFERENCE_KEYS = {"Parent", "P"}
+
+# The delimiters of PDF syntax that matter to split a dictionary into its entries, and PDF names.
+TOKEN_PATTERN = re.compile(r"<<|>>|[\[\]()]|\\.|/[^\s/<>\[\]()%{}]*")
+NAME_PATTERN = re.compile(r"/[^\s/<>\[\]()%{}]*")
+
+
+def dictionary_entries(source):
+    """
+    Splits the source of a PDF dictionary into its top-level entries.
+
+    Arguments:
+    + source (str) -- The compressed source of a PDF object, as returned by `Document.xref_object`.
+
+    Returns:
+    + A list of "/Key value" strings in the order they appear, or None if the object is not a dictionary.
+    """
+    if not source.startswith("<<"):
+        return None
+    depth, strings, entries = 0, 0, []
+    key_start = key_end = None
+    for match in TOKEN_PATTERN.finditer(source):
+        token = match.group()
+        if strings:
+            # Inside a literal string, only its (balanced) parentheses count
+            strings += token == "("
+            strings -= token == ")"
+            continue
+        # A name at the top level is a key, unless it directly follows a key, in which case it is that key's value
+        if depth == 1 and token[0] == "/" and not (key_end is not None and not source[key_end:match.start()].strip()):
+            entries.append(source[key_start:match.start()]) if key_start is not None else None
+            key_start, key_end = match.start(), match.end()
+            continue
+        if depth == 1:
+            key_end = None
+        if token == "(":
+            strings = 1
+        elif token in ("<<", "["):
+            depth += 1
+        elif token in (">>", "]"):
+            depth -= 1
+            if depth == 0 and key_start is not None:
+                entries.append(source[key_start:match.start()])
+    return entries
+
+
+def object_digest(doc, xref, memo, page_xrefs, skip_keys=BACK_REFERENCE_KEYS):
+    """
+    Hashes a PDF object together with every object it references.
+
+    References are replaced by the digest of the object they point to, so the result depends on the
+    content of the objects only, not on their object numbers or the order of their keys, and the same 
+    page gives the same digest in any file. Back references to parents and references to other pages 
+    (link destinations) are left out, so a page's digest does not change when another page does.
+
+    Arguments:
+    + doc -- The `fitz.Document` the object belongs to.
+    + xref (int) -- The object number.
+    + memo (dict) -- Digests already computed for this document, by object number.
+    + page_xrefs (set) -- The object numbers of the document's pages.
+    + skip_keys (set) -- Keys of the object (if it is a dictionary) to leave out (default: `BACK_REFERENCE_KEYS`).
+
+    Returns:
+    + The hex digest of the object.
+    """
+    if xref in memo:
+        # None marks an object whose digest is being computed, i.e. a reference cycle
+        return memo[xref] or "cycle"
+    memo[xref] = None
+
+    # Dictionaries are hashed with their entries in sorted order, as writers are free to reorder their keys
+    source = doc.xref_object(xref, compressed=True)
+    entries = dictionary_entries(source)
+    if entries is not None:
+        entries = [(NAME_PATTERN.match(entry).group()[1:], entry) for entry in entries]
+        source = "".join(entry for key, entry in sorted(entries) if key not in skip_keys)
+
+    digest = hashlib.sha256(value_digest(doc, source, memo, page_xrefs).encode())
+    if doc.xref_is_stream(xref):
+        digest.update(doc.xref_stream_raw(xref) or b"")
+    memo[xref] = digest.hexdigest()
+    return memo[xref]
+
+
+def value_digest(doc, value, memo, page_xrefs):
+    """
+    Replaces the references in the source of a PDF value by the digests of the objects they point to, see `object_digest`.
+
+    Arguments:
+    + doc, memo, page_xrefs -- See `object_digest`.
+    + value (str) -- The source of the value, e.g. as returned by `Document.xref_get_key`.
+
+    Returns:
+    + The value's source with its references resolved.
+    """
+    def resolve(match):
+        target = int(match.group(1))
+        if not 0 < target < doc.xref_length():
+            return match.group()  # Not a reference, e.g. text in a string
+        if target in page_xrefs:
+            return "page"
+        return object_digest(doc, target, memo, page_xrefs)
+
+    return REFERENCE_PATTERN.sub(resolve, value)
+
+
+@timed("fingerprint")
+def page_digests(doc, page, memo=None):
+    """
+    Computes the content fingerprint of a page, split into the page's content and its annotations.
+
+    The content part covers the page's content streams, resources (fonts, images, form XObjects), including 
+    those inherited from the page tree, and geometry; the annotations part covers its annotations and their 
+    appearance streams. Together they are everything the text, highlight and image stages read from the page.
+
+    Arguments:
+    + doc -- The `fitz.Document` the page belongs to.
+    + page -- The loaded `fitz.Page`.
+    + memo (dict) -- Digests of objects already hashed in this document, shared between its pages (default: None).
+
+    Returns:
+    + A dict with the hex digests of the page's `content` and `annotations`.
+    """
+    memo = {} if memo is None else memo
+    if "pages" not in memo:
+        memo["pages"] = {doc.page_xref(number) for number in range(doc.page_count)}
+    page_xrefs = memo["pages"]
+
+    content = hashlib.sha256()
+    content.update(object_digest(doc, page.xref, memo, page_xrefs, skip_keys=BACK_REFERENCE_KEYS | {"Annots"}).encode())
+    content.update(f"{tuple(page.mediabox)} {tuple(page.cropbox)} {page.rotation}".encode())
+
+    # Walk up the page tree for inherited resources
+    xref = page.xref
+    while doc.xref_get_key(xref, "Resources")[0] == "null":
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        if kind != "xref":
+            break
+        xref = int(parent.split()[0])
+        kind, resources = doc.xref_get_key(xref, "Resources")
+        if kind in ("xref", "dict"):
+            content.update(value_digest(doc, resources, memo, page_xrefs).encode())
+
+    annotations = hashlib.sha256(value_digest(doc, doc.xref_get_key(page.xref, "Annots")[1], memo, page_xrefs).encode())
+    return {"content": content.hexdigest(), "annotations": annotations.hexdigest()}
+
+
+def page_fingerprint(doc, page, memo=None):
+    """
+    Computes a content fingerprint of a page, covering its content and annotations (see `page_digests`).
+
+    Arguments:
+    + doc, page, memo -- See `page_digests`.
+
+    Returns:
+    + The hex digest of the page.
+    """
+    digests = page_digests(doc, page, memo)
+    return hashlib.sha256(f"{digests['content']} {digests['annotations']}".encode()).hexdigest()
+
+
+
+
+class SummaryCache:
+    """
+    A content-addressed on-disk cache of per-page summary intermediates.
+
+    Entries are keyed by a hash of the page's content (see `page_fingerprint`), the stage that produced
+    them and the parameters that affect that stage, so they are shared between runs and between files
+    containing the same page, and go stale by themselves when the page or a parameter changes. Each entry
+    is a small JSON file under `cache_dir`. Reading an entry refreshes its modification time, and once
+    the cache grows past `max_bytes` the least recently used entries are removed.
+
+    Errors reading or writing the cache are never fatal: an unreadable entry is a miss, and a failed
+    write leaves the cache as it was.
+
+    Attributes:
+        cache_dir (str): The directory holding the entries.
+        max_bytes (int): The size cap of the cache.
+        stats (Counter): `hits`, `misses`, `writes`, `evictions` and `errors` counted in this process.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+        self._size = None
+        self._memo_doc = None
+        self._memo = {}
+
+    def __getstate__(self):
+        # Workers receive the settings only; the size and the fingerprint memo are per process
+        return {"cache_dir": self.cache_dir, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["cache_dir"], state["max_bytes"])
+
+    def fingerprint(self, page_ctx):
+        """
+        Returns the content fingerprint of a page, reusing the object digests of earlier pages of the same document.
+
+        Arguments:
+        + page_ctx -- The `PageContext` of the page.
+
+        Returns:
+        + The hex digest of the page.
+        """
+        if self._memo_doc is not page_ctx.doc:
+            self._memo_doc, self._memo = page_ctx.doc, {}
+        return page_fingerprint(page_ctx.doc, page_ctx.page, self._memo)
+
+    def key(self, stage, fingerprint, params=None):
+        """
+        Builds the key of a stage's entry for a page.
+
+        Arguments:
+        + stage (str) -- The name of the stage, e.g. "text" or "highlights".
+        + fingerprint (str) -- The page fingerprint.
+        + params (dict) -- The parameters the stage's output depends on (default: None). They must be JSON serializable.
+
+        Returns:
+        + The hex key of the entry.
+        """
+        payload = json.dumps([CACHE_VERSION, stage, fingerprint, params], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    @timed("cache")
+    def get(self, key):
+        """
+        Reads an entry.
+
+        Arguments:
+        + key (str) -- The entry key, see `key`.
+
+        Returns:
+        + The cached value, or None on a miss.
+        """
+        path = self.path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return None
+        except (OSError, ValueError):
+            self.stats["misses"] += 1
+            self.stats["errors"] += 1
+            return None
+        self.stats["hits"] += 1
+        return value
+
+    @timed("cache")
+    def put(self, key, value):
+        """
+        Writes an entry, then evicts the least recently used entries if the cache is over its size cap.
+
+        Arguments:
+        + key (str) -- The entry key, see `key`.
+        + value -- The value to store. It must be JSON serializable.
+
+        Returns:
+        None
+        """
+        path = self.path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            # Renaming is atomic, so concurrent workers never read half-written entries
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            self.stats["errors"] += 1
+            return
+        self.stats["writes"] += 1
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self.entries())
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """
+        Lists the entries of the cache.
+
+        Returns:
+        + A list of (path, size, last use) tuples.
+        """
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for folder in os.scandir(self.cache_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is back under 90% of its size cap.
+
+        Returns:
+        None
+        """
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                self.stats["evictions"] += 1
+            except FileNotFoundError:
+                pass  # Already evicted by another worker
+            except OSError:
+                self.stats["errors"] += 1
+                continue
+            self._size -= size
+
+
+def format_cache_stats(stats):
+    """
+    Formats cache statistics for the progress output.
+
+    Arguments:
+    + stats -- A mapping with `hits`, `misses`, `writes` and `evictions` counts.
+
+    Returns:
+    + A one-line description of the statistics.
+    """
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    rate = stats.get("hits", 0) / lookups * 100 if lookups else 0
+    return f"{stats.get('hits', 0)} hit(s), {stats.get('misses', 0)} miss(es) ({rate:.0f}% hit rate), {stats.get('writes', 0)} write(s), {stats.get('evictions', 0)} eviction(s)"
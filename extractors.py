@@ -1,5 +1,6 @@
 from utils import *
 
+@timed("getHeadings")
 def getHeadings(paragraphs):
     """
     Extracts and returns a list of unique headings from a list of paragraphs.
@@ -47,7 +48,18 @@ def getImageCaption(paragraphs):
                 captions.append(splits[i][splits[i].index("Figure"):].replace("\n", " ") + " " + splits[i+1])
     return captions
 
-def getImages(image, images_folder, show_contours=True, show_result=True, save_result=True):
+def getImages(image, show_contours=True, show_result=True):
+    """
+    Detects the images on a rendered page, optionally showing them.
+
+    Args:
+        image (bytes or np.ndarray): The page as encoded image bytes or a BGR array.
+        show_contours (bool, optional): Whether to show the detected regions on the page. Default is True.
+        show_result (bool, optional): Whether to show each crop. Default is True.
+
+    Returns:
+        list: The cropped images, as BGR arrays.
+    """
 
     # Load the image
     if isinstance(image, bytes):
@@ -67,21 +79,333 @@ def getImages(image, images_folder, show_contours=True, show_result=True, save_r
     # Display contours on the original image
     cv2.imshow("Detected Images", imgContours) if show_contours else None
 
-    # Save or display each detected image region
+    # Display each detected image region
 
     for i, croppedImage in enumerate(images):
         cv2.imshow(f"Image {i+1}", croppedImage) if show_result else ""
-        cv2.imwrite(f"{images_folder}/extracted_image_{i+1}-{int(time.time())}.png", croppedImage)  if save_result else ""
     cv2.waitKey(0) if show_contours else None
     
     cv2.destroyAllWindows()
+    return images
+
+# Embedded images placed on less than this area, in square PDF points, are taken for icons or bullets and left out.
+EMBEDDED_IMAGE_MIN_AREA = 1000
+
+# Image formats whose stored bytes the PDF and DOCX writers can embed as they are.
+NATIVE_IMAGE_FORMATS = ("png", "jpeg", "jpg")
+
+@timed("embedded_images")
+def getEmbeddedImages(page_ctx, min_area=EMBEDDED_IMAGE_MIN_AREA):
+    """
+    Lists the image objects embedded in a page and where they are placed, without rendering the page.
+
+    Args:
+        page_ctx (PageContext): The page.
+        min_area (float, optional): The smallest placement area, in square points, of an image to keep.
+
+    Returns:
+        tuple: The images, as a list of dicts with the image `xref` and its placement `bbox` (a `fitz.Rect`,
+        the largest one when the image is placed several times), in reading order; and the images left out
+        as too small, as dicts with their `xref` and `bbox`.
+    """
+    images, small = [], []
+    for xref, *_ in page_ctx.page.get_images(full=True):
+        rects = [rect for rect in page_ctx.page.get_image_rects(xref) if rect.is_valid and not rect.is_empty]
+        if not rects:
+            continue
+        rect = max(rects, key=lambda rect: abs(rect))
+        (images if abs(rect) >= min_area else small).append({"xref": xref, "bbox": rect})
+    images.sort(key=lambda image: (image["bbox"].y0, image["bbox"].x0))
+    return images, small
+
+
+def extractEmbeddedImage(doc, xref, image_id=None):
+    """
+    Extracts an embedded image at its native resolution, for the summary.
+
+    PNG and JPEG images in RGB or grayscale without a soft mask are passed on as stored in the PDF, 
+    without decoding them. Other images (JPEG 2000, JBIG2, CMYK, with transparency, ...) are decoded 
+    once and encoded as PNG.
+
+    Args:
+        doc (fitz.Document): The document the image belongs to.
+        xref (int): The image's cross-reference number.
+        image_id (str, optional): The image's ID in the summary.
+
+    Returns:
+        ImageRecord: The image as encoded bytes.
+    """
+    info = doc.extract_image(xref)
+    if info and info["ext"] in NATIVE_IMAGE_FORMATS and not info.get("smask") and info.get("colorspace") in (1, 3):
+        return ImageRecord(data=info["image"], image_id=image_id, key=f"xref:{xref}")
+
+    pix = fitz.Pixmap(doc, xref)
+    if info and info.get("smask"):
+        pix = fitz.Pixmap(pix, fitz.Pixmap(doc, info["smask"]))
+    if pix.colorspace is not None and pix.colorspace.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return ImageRecord(data=pix.tobytes("png"), image_id=image_id, key=f"xref:{xref}")
+
+
+def embeddedImageArray(doc, xref):
+    """Decodes an embedded image into a BGR array, e.g. to show it in the interactive selection grid."""
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha or pix.colorspace is None or pix.colorspace.n != 3:
+        pix = fitz.Pixmap(fitz.csRGB, pix, 0)
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width * 3]
+    return cv2.cvtColor(samples.reshape(pix.height, pix.width, 3), cv2.COLOR_RGB2BGR)
+
+
+# Embedded images covering this share of the page are taken for page backgrounds, not figures.
+PAGE_BACKGROUND_COVER = 0.9
 
-def getHighlightedText(doc, page_number, image, show_process=False, show_result_image=True):
+# Automatic image selection: the farthest a caption may be from its image, in PDF points, and the share
+# of a candidate region that may be covered by text before it is taken for a text block.
+IMAGE_CAPTION_MAX_DISTANCE = 50
+IMAGE_MAX_TEXT_COVER = 0.5
+
+# The number following "Figure" at the start of a caption, e.g. "1.2" or "3.1.4:"
+CAPTION_NUMBER_PATTERN = re.compile(r"\d+\.\d+(\.\d+)?\b")
+
+def getImageCaptionBlocks(page_ctx):
+    """
+    Finds the "Figure x.y" captions of a page along with where they are.
+
+    A caption starts with "Figure x.y" at the beginning of a line and runs to the end of its text block, or
+    to the next caption in the block, so captions set side by side on the same line are told apart.
+
+    Args:
+        page_ctx (PageContext): The page to search.
+
+    Returns:
+        tuple: The captions, as a list of `(caption, fitz.Rect)` tuples, and the rectangles of the other
+        words of the page.
+    """
+    words = page_ctx.page.get_text("words", textpage=page_ctx.textpage)
+    captions, text_rects = [], []
+    current = None
+    for i, (x0, y0, x1, y1, word, block, _, _) in enumerate(words):
+        rect = fitz.Rect(x0, y0, x1, y1)
+        next_word = words[i + 1][4] if i + 1 < len(words) else ""
+        starts_line = i == 0 or words[i - 1][5:7] != (block, words[i][6])
+        if word == "Figure" and CAPTION_NUMBER_PATTERN.match(next_word) and (starts_line or current is not None):
+            current = [[word], rect, block]
+            captions.append(current)
+        elif current is not None and block == current[2]:
+            current[0].append(word)
+            current[1] |= rect
+        else:
+            current = None
+            text_rects.append(rect)
+    return [(" ".join(caption_words), rect) for caption_words, rect, _ in captions], text_rects
+
+
+def rect_distance(a, b):
+    """Returns the gap between two rectangles in points, 0 when they touch or overlap."""
+    dx = max(0, b.x0 - a.x1, a.x0 - b.x1)
+    dy = max(0, b.y0 - a.y1, a.y0 - b.y1)
+    return (dx * dx + dy * dy) ** 0.5
+
+
+@timed("auto_select_images")
+def autoSelectImages(page_ctx, image=None, zoom=1, max_distance=IMAGE_CAPTION_MAX_DISTANCE, max_text_cover=IMAGE_MAX_TEXT_COVER):
+    """
+    Chooses the images of a page and their captions from the page geometry, without user interaction.
+
+    The candidates are the images embedded in the page, at their placement boxes (see `getEmbeddedImages`), 
+    except page backgrounds and images mostly covered by words. 
+    When a rendered `image` of the page is given, the regions `detectImageRegions` finds on it are added 
+    for figures drawn as vector graphics: regions overlapping an embedded image or inside another region 
+    are dropped, and so are regions mostly covered by words, as text. The candidates are then paired one 
+    to one with the "Figure x.y" captions of the page, closest pairs first, a caption below its image 
+    winning a tie. Candidates left without a caption within `max_distance` are dropped, so only captioned 
+    figures make it into the summary.
+
+    Args:
+        page_ctx (PageContext): The page.
+        image (np.ndarray, optional): The page rendered in BGR format, to also look for vector figures. Default is None.
+        zoom (float, optional): Pixels per PDF point of `image`. Default is 1 (72 dpi).
+        max_distance (float, optional): The farthest a caption may be from its image, in points.
+        max_text_cover (float, optional): The share of a candidate that may be covered by words.
+
+    Returns:
+        tuple: The selected images, as a list of dicts with the image `source` ("embedded" with its `xref`, 
+        or "rendered" with its `crop`, a BGR array), its `bbox` and the `caption`, its `caption_bbox` and 
+        `distance`, in reading order; and the skipped candidates, as dicts with their `source`, `bbox` and 
+        the `reason` they were skipped ("small", "page background", "embedded image", "inside another image", 
+        "text" or "no caption"). Boxes are `[x0, y0, x1, y1]` lists in points.
+    """
+    def box(rect):
+        return [round(c, 1) for c in rect]
+
+    def text_cover(rect):
+        return sum(abs(rect & text_rect) for text_rect in text_rects) / max(abs(rect), 1e-6)
+
+    captions, text_rects = getImageCaptionBlocks(page_ctx)
+    embedded, small = getEmbeddedImages(page_ctx)
+    skipped = [{"source": "embedded", "xref": item["xref"], "bbox": box(item["bbox"]), "reason": "small"} for item in small]
+    candidates, figures = [], []
+    page_rect = page_ctx.page.rect
+    for item in embedded:
+        rect = item["bbox"]
+        # Page backgrounds (e.g. scans, or highlights painted into an image) sit behind the text
+        if abs(rect & page_rect) >= PAGE_BACKGROUND_COVER * abs(page_rect):
+            skipped.append({"source": "embedded", "xref": item["xref"], "bbox": box(rect), "reason": "page background"})
+        elif text_cover(rect) > max_text_cover:
+            skipped.append({"source": "embedded", "xref": item["xref"], "bbox": box(rect), "reason": "text"})
+        else:
+            candidates.append(({"source": "embedded", "xref": item["xref"]}, rect))
+            figures.append(rect)
+
+    if image is not None:
+        regions = detectImageRegions(image, minArea=1000 * zoom * zoom)
+        rects = [fitz.Rect(x / zoom, y / zoom, (x + w) / zoom, (y + h) / zoom) for x, y, w, h in regions]
+        for (x, y, w, h), rect in zip(regions, rects):
+            if any(rect.intersects(figure) for figure in figures):
+                reason = "embedded image"
+            elif any(other != rect and other.contains(rect) for other in rects):
+                reason = "inside another image"
+            elif text_cover(rect) > max_text_cover:
+                reason = "text"
+            else:
+                candidates.append(({"source": "rendered", "crop": image[y:y+h, x:x+w]}, rect))
+                continue
+            skipped.append({"source": "rendered", "bbox": box(rect), "reason": reason})
+
+    pairs = sorted((rect_distance(rect, caption_rect), caption_rect.y0 < rect.y1, i, j)
+                   for i, (_, rect) in enumerate(candidates) for j, (_, caption_rect) in enumerate(captions))
+    paired_images, paired_captions = {}, set()
+    for distance, _, i, j in pairs:
+        if distance <= max_distance and i not in paired_images and j not in paired_captions:
+            paired_images[i] = (j, distance)
+            paired_captions.add(j)
+
+    selected = []
+    for i, (item, rect) in enumerate(candidates):
+        if i not in paired_images:
+            skipped.append({**{key: value for key, value in item.items() if key != "crop"}, "bbox": box(rect), "reason": "no caption"})
+            continue
+        j, distance = paired_images[i]
+        selected.append({**item, "bbox": box(rect), "caption": captions[j][0], "caption_bbox": box(captions[j][1]), "distance": round(distance, 1)})
+    selected.sort(key=lambda item: (item["bbox"][1], item["bbox"][0]))
+    return selected, skipped
+
+@timed("annotation_highlights")
+def getAnnotationHighlights(page_ctx, classifier=None, with_colors=False, with_boxes=False):
+    """
+    Extracts the text under the highlight annotations of a page.
+
+    Highlight annotations store the highlighted areas as quad points, so their text can be read 
+    directly from the page's text layout without rendering the page or running any image processing.
+
+    Args:
+        page_ctx (PageContext): The shared context of the page.
+        classifier (HighlightClassifier, optional): The highlight colours the annotation colours are told apart 
+                                                    by. Default is None, `DEFAULT_HIGHLIGHT_COLORS`.
+        with_colors (bool, optional): If True, each highlight comes with the name of its annotation's colour, 
+                                      or None when it has none of the highlight colours. Default is False.
+        with_boxes (bool, optional): If True, each highlight comes as a (text, colour name, boxes) tuple, its boxes being 
+                                     the rectangles of its quads as (x1, y1, x2, y2) tuples in PDF points. Default is False.
+
+    Returns:
+        list: The highlighted text of each highlight annotation, in the order they are stored on the page, as 
+              (text, colour name) tuples with `with_colors`. The list is empty when the page has no highlight annotations.
+    """
+    highlightedText = []
+    for annot in page_ctx.page.annots(types=[fitz.PDF_ANNOT_HIGHLIGHT]):
+        points = annot.vertices or []
+        quads = [fitz.Quad(points[i:i+4]) for i in range(0, len(points) - 3, 4)] or [fitz.Quad(annot.rect)]
+        text = " ".join(get_text_from_bbox(page_ctx.doc, page_ctx.page_number, quad.rect, page_ctx=page_ctx).strip() for quad in quads)
+        if text.strip() and (with_colors or with_boxes):
+            stroke = annot.colors.get("stroke")
+            color = (classifier or highlight_classifier()).rgb_color(stroke) if stroke and len(stroke) == 3 else None
+            highlightedText.append((text, color, [tuple(quad.rect) for quad in quads]) if with_boxes else (text, color))
+        elif text.strip():
+            highlightedText.append(text)
+    return highlightedText
+
+@timed("drawing_highlights")
+def getDrawingHighlights(page_ctx, classifier=None, with_colors=False, with_boxes=False):
+    """
+    Extracts the text under highlights drawn as filled rectangles in the page's vector drawings.
+
+    This is a drop-in alternative to the raster pipeline of `getHighlightedText` for pages whose highlights 
+    are drawing commands: the rectangles are found by `detectDrawnHighlights`, already in PDF coordinates, 
+    so the page never needs to be rendered.
+
+    Args:
+        page_ctx (PageContext): The shared context of the page.
+        classifier (HighlightClassifier, optional): The highlight colours to look for. Default is None, 
+                                                    `DEFAULT_HIGHLIGHT_COLORS`.
+        with_colors (bool, optional): If True, each highlight comes with the name of its colour. Default is False.
+        with_boxes (bool, optional): If True, each highlight comes as a (text, colour name, boxes) tuple, its box being 
+                                     its rectangle as an (x1, y1, x2, y2) tuple in PDF points. Default is False.
+
+    Returns:
+        list: The highlighted text of each drawn highlight, from top to bottom, as (text, colour name) tuples 
+              with `with_colors`. The list is empty when the page has no drawn highlights.
+    """
+    highlightedText = []
+    for roi, color in detectDrawnHighlights(page_ctx.page, classifier=classifier or highlight_classifier()):
+        text = get_text_from_bbox(page_ctx.doc, page_ctx.page_number, roi, page_ctx=page_ctx)
+        if text.strip():
+            highlightedText.append((text, color, [tuple(roi)]) if with_boxes else (text, color) if with_colors else text)
+    return highlightedText
+
+# Coarse-to-fine highlight detection: the coarse pass keeps regions down to this share of the smallest highlight 
+# area, since small or thin highlights lose area at a low resolution, and the fine pass re-renders each of them with 
+# this margin in points around it, so highlights cut short on the coarse render are found whole.
+HIGHLIGHT_COARSE_AREA_SHARE = 0.5
+HIGHLIGHT_REFINE_MARGIN = 6
+
+@timed("refine_highlights")
+def refineHighlightBoxes(page, boxes, dpi, show_process=False, classifier=None):
+    """
+    Re-renders the regions found on a coarse render of a page at a higher resolution, for precise highlight boxes.
+
+    Each region is grown by `HIGHLIGHT_REFINE_MARGIN`, snapped to the pixel grid of `dpi` so that its pixels map 
+    exactly back to points, rendered on its own and run through the same colour and contour detection as the 
+    whole page. A coarse region can split into several highlights (e.g. the highlights of adjacent lines, which 
+    the closing of a low-resolution render merges) or hold none (a region kept only because of the relaxed 
+    coarse area filter). Highlights found from two overlapping regions are kept once.
+
+    Args:
+        page (fitz.Page): The page to render.
+        boxes (list): The coarse regions as (x1, y1, x2, y2) tuples of PDF points.
+        dpi (int): The resolution of the fine renders.
+        show_process (bool, optional): If True, each fine render is shown with its contours. Default is False.
+        classifier (HighlightClassifier, optional): The highlight colours to look for. Default is None, 
+                                                    `DEFAULT_HIGHLIGHT_COLORS`.
+
+    Returns:
+        list: The highlights as ((x1, y1, x2, y2) box in PDF points, colour name) tuples, sorted from top to bottom.
+    """
+    classifier = classifier or highlight_classifier()
+    zoom = dpi / 72
+    refined = []
+    for box in boxes:
+        clip = (fitz.Rect(box) + (-HIGHLIGHT_REFINE_MARGIN, -HIGHLIGHT_REFINE_MARGIN, HIGHLIGHT_REFINE_MARGIN, HIGHLIGHT_REFINE_MARGIN)) & page.rect
+        clip = fitz.Rect(math.floor(clip.x0 * zoom) / zoom, math.floor(clip.y0 * zoom) / zoom, math.ceil(clip.x1 * zoom) / zoom, math.ceil(clip.y1 * zoom) / zoom)
+        img = render_page(page, dpi=dpi, clip=clip)
+        labels, _ = classifier.labels(img)
+        mask = cv2.compare(labels, 0, cv2.CMP_GT)
+        rois = getMaskRegions(mask, minArea=HIGHLIGHT_MIN_AREA * zoom * zoom, closeSize=round(HIGHLIGHT_CLOSE_SIZE * zoom))
+        cv2.imshow("Refined", mask) if show_process else ""
+        for roi in rois:
+            color = classifier.region_color(labels, roi)
+            roi = pixel_box_to_points(roi, zoom, origin=clip.tl)
+            if not any(fitz.Rect(roi) in fitz.Rect(other) + (-1, -1, 1, 1) for other, _ in refined):
+                refined = [(other, other_color) for other, other_color in refined if not fitz.Rect(other) in fitz.Rect(roi) + (-1, -1, 1, 1)] + [(roi, color)]
+    return sorted(refined, key=lambda highlight: highlight[0][1])
+
+@timed("raster_highlights")
+def getHighlightedText(doc, page_number, image, show_process=False, show_result_image=True, page_ctx=None, zoom=1, refine_dpi=None, classifier=None, with_colors=False, with_boxes=False):
     """
     Processes an image to detect highlighted text regions and extracts text from those regions.
 
-    This function detects specific color regions in the image, finds contours, and extracts text from regions 
-    where highlights are detected. It can optionally display intermediate steps in the process.
+    This function labels the pixels of the image with their highlight colour (see `HighlightClassifier`), 
+    segments the highlighted pixels of every colour at once, tags each region with its main colour and 
+    extracts text from the regions. It can optionally display intermediate steps in the process.
 
     Args:
         doc (Document): The document object containing the page to extract text from.
@@ -89,11 +413,20 @@ def getHighlightedText(doc, page_number, image, show_process=False, show_result_
         image (bytes or np.ndarray): The image in which to detect highlighted text (either as a byte stream or a NumPy array).
         show_process (bool, optional): If True, intermediate images (such as the original and processed images) will be shown. Default is False.
         show_result_image (bool, optional): If True, the final stacked images will be shown. Default is True.
+        page_ctx (PageContext, optional): The shared context of the page, used to read the text of each region. Default is None.
+        zoom (float, optional): The pixels per PDF point of `image` (its dpi / 72), used to map regions back to page coordinates. Default is 1.
+        refine_dpi (int, optional): If given, `image` is only a coarse render used to find candidate regions, which are 
+                                    re-rendered at this resolution for precise boxes (see `refineHighlightBoxes`). Default is None.
+        classifier (HighlightClassifier, optional): The highlight colours to look for. Default is None, 
+                                                    `DEFAULT_HIGHLIGHT_COLORS`.
+        with_colors (bool, optional): If True, each highlight comes with the name of its colour. Default is False.
+        with_boxes (bool, optional): If True, each highlight comes as a (text, colour name, boxes) tuple, its box being 
+                                     its region as an (x1, y1, x2, y2) tuple in PDF points. Default is False.
 
     Returns:
-        list: A list of highlighted text extracted from the image regions.
+        list: A list of highlighted text extracted from the image regions, as (text, colour name) tuples with `with_colors`.
     """
-    hsv = [0, 65, 59, 255, 0, 255] 
+    classifier = classifier or highlight_classifier()
 
     # Step One
     if isinstance(image, bytes):
@@ -109,22 +442,37 @@ def getHighlightedText(doc, page_number, image, show_process=False, show_result_
     cv2.imshow("Original", img) if show_process else ""
 
     # Step Two
-    imgResult, imgHSV = detectColor(img, hsv, show_process=show_process)
+    labels, imgHSV = classifier.labels(img)
+    mask = cv2.compare(labels, 0, cv2.CMP_GT)
 
 
     # Step Three & Four
-    imgContours, contours = getContours(imgResult, img, showCanny=show_process, minArea=1000, filter=0, cThr=[100, 150], draw=True)
-    cv2.imshow("Contours", imgContours) if show_process else ""
+    minArea = HIGHLIGHT_MIN_AREA * zoom * zoom * (HIGHLIGHT_COARSE_AREA_SHARE if refine_dpi else 1)
+    roiList = getMaskRegions(mask, minArea=minArea, closeSize=round(HIGHLIGHT_CLOSE_SIZE * zoom))
+    if show_process or show_result_image:
+        imgResult = cv2.bitwise_and(img, img, mask=mask)
+        imgContours = img.copy()
+        for x1, y1, x2, y2 in roiList:
+            cv2.rectangle(imgContours, (x1, y1), (x2, y2), (255, 0, 255), 3)
+        cv2.imshow("Result", imgResult) if show_process else ""
+        cv2.imshow("Contours", imgContours) if show_process else ""
 
     # Step Five
-    roiList = getRoi(contours)
     roiDisplay(roiList, show_process=show_process)
+    colors = [classifier.region_color(labels, roi) for roi in roiList]
+    if zoom != 1:
+        # Map pixel boxes back to PDF points
+        roiList = [pixel_box_to_points(roi, zoom) for roi in roiList]
+    if refine_dpi:
+        page = page_ctx.page if page_ctx is not None else load_page(doc, page_number)
+        roiList, colors = [list(column) for column in zip(*refineHighlightBoxes(page, roiList, refine_dpi, show_process=show_process, classifier=classifier))] or ([], [])
 
 
     # Step Six
     highlightedText = []
-    for x, roi in enumerate(roiList):
-        highlightedText.append(get_text_from_bbox(doc, page_number, roi))
+    for roi, color in zip(roiList, colors):
+        text = get_text_from_bbox(doc, page_number, roi, page_ctx=page_ctx)
+        highlightedText.append((text, color, [tuple(roi)]) if with_boxes else (text, color) if with_colors else text)
 
     # Step Seven
     if show_result_image:
@@ -1,16 +1,245 @@
 from utils import *
 from extractors import *
-from thefuzz import fuzz, process
+from cache import *
+from manifest import *
+from profiling import *
 import argparse as ag
 import sys
-import pkg_resources
+import time
+import glob
+import json
+import functools
+from collections import deque
+from itertools import chain
 
 
 
 
 
  
-def get_summary(doc, print_results=False, include_images=False, images_folder="tmp-images", show_progress=True, threshold=50, show_image_process=False):
+def highlight_cache_params(dpi, refine_dpi=None, highlight_colors=None):
+    """
+    Returns the parameters the highlight extraction of a page depends on, for its cache key.
+
+    Arguments:
+    + dpi (int) -- The resolution at which pages are rendered for highlight detection.
+    + refine_dpi (int) -- The resolution highlight regions are re-rendered at, if any (default: None).
+    + highlight_colors (list) -- The highlight colours looked for (default: None, `DEFAULT_HIGHLIGHT_COLORS`).
+
+    Returns:
+    + A dict of the render resolutions, the highlight colour ranges, the segmentation settings and how region text is read.
+    """
+    colors = {name: HIGHLIGHT_CLASSES[name][0] for name in highlight_classifier(highlight_colors).names}
+    params = {"dpi": dpi, "colors": colors, "min_area": HIGHLIGHT_MIN_AREA, "close": HIGHLIGHT_CLOSE_SIZE, "segmentation": "components", "text": "words", "word_covered_share": [WORD_MIN_COVERED_WIDTH, WORD_MIN_COVERED_HEIGHT]}
+    if refine_dpi:
+        params.update(refine_dpi=refine_dpi, coarse_area_share=HIGHLIGHT_COARSE_AREA_SHARE, refine_margin=HIGHLIGHT_REFINE_MARGIN)
+    return params
+
+
+
+
+def summarize_page(doc, page_num, print_results=False, include_images=False, show_progress=True, threshold=None, show_image_process=False, dpi=72, cache=None, image_selection="interactive", image_buffer=None, refine_dpi=None, highlight_colors=None, match_mode="geometry"):
+    """
+    Summarizes a single page of a PDF document.
+
+    Arguments:
+    + doc -- The PDF document object to process.
+    + page_num (int) -- The page number (1-indexed) to summarize.
+    + print_results, include_images, show_progress, threshold, show_image_process, dpi, cache, image_selection, refine_dpi, highlight_colors, match_mode -- See `get_summary`.
+    + image_buffer (ImageBuffer) -- The crops of the earlier pages to offer along with this page's for interactive 
+      selection; the page's crops are added to it (default: None, only this page's crops).
+
+    Functionality:
+    - Runs the text, highlight, heading and (optional) image stages for one page.
+    - Reads highlights from the page's highlight annotations, or else from highlight-coloured filled rectangles 
+      in its vector drawings, and only renders the page and runs the OpenCV detection in `getHighlightedText` 
+      for pages with neither. Each highlighted sentence keeps the colour of the highlight that matched it best.
+    - With a `cache`, reads the page's sentences and headings, and its highlighted text, from the cache 
+      when the page was seen before with the same settings, and stores them otherwise. Matching against 
+      `threshold` (see `match_mode`) always runs, so changing the threshold or the output format reuses the cached stages.
+    - With `include_images`, lets the user pick an image and a caption in OpenCV windows, or with `image_selection` 
+      set to "auto", includes every picture that has a "Figure x.y" caption next to it (see `autoSelectImages`). 
+      Images embedded in the PDF are taken at their native resolution, as stored when possible (see `extractEmbeddedImage`); 
+      regions cropped from the rendered page are only used for figures drawn as vector graphics. Crops stay in memory and 
+      only the included ones are encoded, once, into their `ImageRecord`.
+    - Builds the page's part of the summary: page header, matches, images and footer.
+
+    Returns:
+    A tuple containing:
+    + page_results -- A list of summary records (see `records.py`): page header, headings, highlighted sentences, 
+      image and caption (if included) and page footer.
+    + page_report -- A dict describing how the page was processed: `page`, `highlight_path` ("annotations", "drawings" or "raster"), 
+      `highlights` (number of highlighted regions), `page_loads`, `seconds` (wall time), `cpu_seconds`, `cache` 
+      (the page's cache statistics, see `SummaryCache`) and `reused` (False; see `SummaryManifest.match` for reused pages). 
+      With automatic image selection, `images` also records the `selected` images and captions and the `skipped` candidates.
+    """
+    print(f"\n[INFO] Processing page {page_num} of {doc.page_count}...") if show_progress else None
+    start_time, start_cpu, start_loads = time.perf_counter(), time.process_time(), PAGE_LOADS[page_num]
+    start_cache = cache.stats.copy() if cache is not None else Counter()
+
+    page_results = []
+    original_count = 0
+    highlight_matches_count = 0
+
+    # Loading the page and its text layout once, for every stage below
+    page_ctx = PageContext(doc, page_num)
+
+    # Acquiring an image version of the page, only when a stage below needs it. Embedded images are read from the PDF, 
+    # so automatic image selection only needs a rendering to look for figures drawn as vector graphics
+    needs_render = include_images and (image_selection != "auto" or bool(page_ctx.page.get_cdrawings()))
+    img = pdf_page_to_image(doc, page_num, page_ctx=page_ctx, dpi=dpi) if needs_render else None
+
+    # Looking the page up in the cache. The highlight stage is not read from it when its images are to be shown
+    text_entry = highlight_entry = None
+    if cache is not None:
+        fingerprint = cache.fingerprint(page_ctx)
+        text_key = cache.key("text", fingerprint)
+        highlight_key = cache.key("highlights", fingerprint, highlight_cache_params(dpi, refine_dpi, highlight_colors))
+        text_entry = cache.get(text_key)
+        highlight_entry = cache.get(highlight_key) if not show_image_process else None
+
+    # Geting the main text and headings from the given page, for reference
+    if text_entry is not None:
+        actual_page_text, actual_page_text_for_headings, headings = text_entry["sentences"], text_entry["paragraphs"], text_entry["headings"]
+        actual_page_words = text_entry["sentence_words"]
+    else:
+        actual_page_text, actual_page_text_for_headings = getTextFromPDFAsParagraphs(doc, page_num, page_ctx=page_ctx)
+        actual_page_words = sentence_words(page_ctx.text, page_ctx.words.words)
+        headings = getHeadings(actual_page_text_for_headings)
+        cache.put(text_key, {"sentences": actual_page_text, "paragraphs": actual_page_text_for_headings, "headings": headings, "sentence_words": actual_page_words}) if cache is not None else None
+    original_count = get_count(actual_page_text, original_count)
+    displayResult("ORIGINAL TEXT", actual_page_text) if print_results else None
+
+    # Extracting highlighted text on the page, from its highlight annotations or drawn highlights when it has any
+    if highlight_entry is not None:
+        highlight_path, hText, hColors, hBoxes = highlight_entry["path"], highlight_entry["highlights"], highlight_entry["colors"], highlight_entry["boxes"]
+    else:
+        classifier = highlight_classifier(highlight_colors)
+        highlights = getAnnotationHighlights(page_ctx, classifier=classifier, with_boxes=True)
+        highlight_path = "annotations"
+        if not highlights:
+            highlights = getDrawingHighlights(page_ctx, classifier=classifier, with_boxes=True)
+            highlight_path = "drawings"
+        if not highlights:
+            highlight_path = "raster"
+            img = img if img is not None else pdf_page_to_image(doc, page_num, page_ctx=page_ctx, dpi=dpi)
+            highlights = getHighlightedText(doc, page_num, img, show_result_image=show_image_process, show_process=show_image_process, page_ctx=page_ctx, zoom=dpi / 72, refine_dpi=refine_dpi, classifier=classifier, with_boxes=True)
+        hText, hColors, hBoxes = [text for text, _, _ in highlights], [color for _, color, _ in highlights], [boxes for _, _, boxes in highlights]
+        cache.put(highlight_key, {"path": highlight_path, "highlights": hText, "colors": hColors, "boxes": hBoxes}) if cache is not None else None
+    displayResult("HIGHLIGHTED TEXT", hText) if print_results else None
+
+    # Mapping highlights to the sentences they cover, or fuzzy matching them with the actual text, keeping the matches in page order
+    highlight_matches, highlight_sources = map_highlights(hText, hBoxes, actual_page_text, actual_page_words, threshold=threshold, mode=match_mode)
+    displayResult("HIGHLIGHTED TEXT MATCHES", highlight_matches) if print_results else None
+
+
+
+
+    image_records = []
+    image_report = None
+    if include_images and image_selection == "auto":
+        selected, skipped = autoSelectImages(page_ctx, img, zoom=dpi / 72)
+        for index, item in enumerate(selected, start=1):
+            if item["source"] == "embedded":
+                item["image_id"] = f"page{page_num}-xref{item['xref']}"
+                record = extractEmbeddedImage(doc, item["xref"], item["image_id"])
+            else:
+                item["image_id"] = f"page{page_num}-figure{index}"
+                record = encode_image(item.pop("crop"), item["image_id"])
+            image_records.extend([record, Caption(item["caption"])])
+        image_report = {"selected": selected, "skipped": skipped}
+        print(f"[INFO] Page {page_num}: selected {len(selected)} captioned image(s), skipped {len(skipped)} candidate(s).") if show_progress else None
+    elif include_images:
+        while True:
+            cv2.imshow('Original Image', img)
+            key = cv2.waitKey(1) & 0xFF
+            if key == 27 or key in (ord('q'), ord('x')):  # Press ESC to close or click on an option
+                break
+        # The page's embedded images first, at their native resolution, then the regions found on the rendering
+        embedded = getEmbeddedImages(page_ctx)[0]
+        crops = getImages(img, show_contours=show_image_process, show_result=show_image_process)
+        image_buffer = image_buffer if image_buffer is not None else ImageBuffer()
+        image_buffer.add(page_num, [embeddedImageArray(doc, item["xref"]) for item in embedded], xrefs=[item["xref"] for item in embedded])
+        image_buffer.add(page_num, crops)
+        possible_captions = getImageCaption(actual_page_text_for_headings)
+        image_ids = list(image_buffer.images)
+        image_id_result = display_images_grid([image_buffer[image_id] for image_id in image_ids], image_ids, close_image_window=False, pdf_image_path='')
+        image_caption_result = display_strings(possible_captions, window_name="Select The Correct Caption: ", close_caption_window = False, pdf_caption_text = '')
+        if image_id_result and image_buffer.xrefs.get(image_id_result) is not None:
+            image_records.append(extractEmbeddedImage(doc, image_buffer.xrefs[image_id_result], image_id_result))
+        elif image_id_result:
+            image_records.append(encode_image(image_buffer[image_id_result], image_id_result))
+        image_records.append(Caption(image_caption_result)) if image_caption_result else None
+
+
+    # Match headings with the highlighted text
+    displayResult("PAGE HEADINGS", headings) if print_results else None
+
+    highlight_records = attach_headings(highlight_matches, headings, colors=[hColors[source] for source in highlight_sources])
+    highlight_matches_count = get_count(render_text(highlight_records), highlight_matches_count)
+
+    # Append page records to the page results list
+    page_results.append(PageHeader(page_num))
+    page_results.extend(highlight_records)
+    page_results.extend(image_records)
+
+    page_results.append(PageFooter(original_count, highlight_matches_count))
+
+    print(f"[INFO] Page {page_num} of {doc.page_count}: Extraction completed with {highlight_matches_count} highlights from {original_count} original text and {len(headings)} headings ({PAGE_LOADS[page_num] - start_loads} page load(s), highlights via {highlight_path}).\n") if show_progress else None
+    displayResult("RESULT", page_results) if print_results else None
+
+    cv2.destroyAllWindows()
+    page_report = {"page": page_num, "highlight_path": highlight_path, "highlights": len(hText), "page_loads": PAGE_LOADS[page_num] - start_loads, "seconds": time.perf_counter() - start_time, "cpu_seconds": time.process_time() - start_cpu, "cache": dict(cache.stats - start_cache) if cache is not None else {}, "reused": False}
+    page_report.update(images=image_report) if image_report is not None else None
+    return page_results, page_report
+
+
+
+
+# Each pool worker opens its own handle on the document; `fitz.Document` objects cannot be shared across processes.
+worker_doc = None
+worker_cache = None
+
+def init_summary_worker(pdf_path, cache=None, timings=False):
+    """
+    Initializes a summary pool worker by opening its own handle on the PDF document.
+
+    Arguments:
+    + pdf_path -- Path to the PDF document being summarized.
+    + cache -- The `SummaryCache` to use in the worker, if any. Workers share its directory (default: None).
+    + timings (bool) -- Whether to record stage timings in the worker, see `timings.py` (default: False).
+
+    Returns:
+    None
+    """
+    global worker_doc, worker_cache
+    worker_doc = fitz.open(pdf_path)
+    worker_cache = cache
+    enable_timings(timings)
+
+
+def summarize_page_worker(page_num, options):
+    """
+    Summarizes one page inside a pool worker, using the worker's own document handle.
+
+    Arguments:
+    + page_num (int) -- The page number (1-indexed) to summarize.
+    + options (dict) -- Keyword arguments forwarded to `summarize_page`.
+
+    Returns:
+    + The page results and page report produced by `summarize_page`. When timings are on, the report also 
+      carries the page's stage `timings`, for the main process to merge.
+    """
+    with stage("summarize_page", page=page_num):
+        page_results, page_report = summarize_page(worker_doc, page_num, cache=worker_cache, **options)
+    if get_timer() is not None:
+        page_report["timings"] = get_timer().take_page(page_num)
+    return page_results, page_report
+
+
+
+
+def get_summary(doc, print_results=False, include_images=False, show_progress=True, threshold=None, show_image_process=False, jobs=1, dpi=72, page_reports=None, stream=False, cache=None, manifest=None, image_selection="interactive", refine_dpi=None, highlight_colors=None, match_mode="geometry"):
     """
     Extracts a summarized view of a PDF document, including text highlights, headings, and optionally images.
 
@@ -18,16 +247,40 @@ def get_summary(doc, print_results=False, include_images=False, images_folder="t
     + doc -- The PDF document object to process.
     + print_results (bool) -- Whether to print intermediate results for debugging (default: False).
     + include_images (bool) -- Whether to include images from the PDF pages (default: False).
-    + images_folder (str) -- The folder to save extracted images (default: "tmp-images").
     + show_progress (bool) -- Whether to display progress messages for each page (default: True).
-    + threshold (int) -- Minimum similarity score for fuzzy matching between highlights and actual text (default: 50).
+    + threshold (int) -- Minimum share of a sentence's words the highlights must cover, or minimum similarity score for fuzzy 
+      matching between highlights and actual text, in percent (default: None, see `MATCH_THRESHOLDS`).
     + show_image_process (bool) -- Whether to display intermediate image processing results (default: False).
+    + jobs (int) -- Number of worker processes to spread the pages over (default: 1, i.e. serial).
+    + dpi (int) -- Resolution at which pages are rendered for highlight detection (default: 72, one pixel per PDF point).
+    + refine_dpi (int) -- If given, the `dpi` render only finds candidate highlight regions, which are re-rendered at 
+      this resolution for precise boxes: a coarse-to-fine alternative to rendering whole pages at a high `dpi` 
+      (default: None). See `refineHighlightBoxes`.
+    + highlight_colors (list) -- The names of the highlight colours to look for on rendered pages and drawings, see 
+      `HIGHLIGHT_CLASSES` (default: None, those of `DEFAULT_HIGHLIGHT_COLORS`). Each highlighted sentence is tagged with its colour.
+    + match_mode (str) -- How highlights are mapped to sentences: "geometry" by where their words lie on the page, "fuzzy" 
+      by fuzzy matching their text, or "auto", by geometry with fuzzy matching for the highlights that select no 
+      sentence that way (default: "geometry"). See `map_highlights`.
+    + page_reports (list) -- If given, receives one report per page from `summarize_page`, in page order (default: None).
+    + stream (bool) -- Whether to return a generator yielding each page's records as soon as the page is done, 
+      instead of one list for the whole document (default: False). See `iter_summary`.
+    + cache (SummaryCache) -- The cache of per-page intermediates to read and fill, or None to process every page from scratch (default: None).
+    + manifest (SummaryManifest) -- The manifest of the document's previous summary, to reuse the pages that did not change 
+      since and to update with this run, or None to summarize every page (default: None).
+    + image_selection (str) -- How `include_images` picks the images: "interactive" to click an image and a caption in 
+      OpenCV windows, or "auto" to include every picture paired with a nearby "Figure x.y" caption, without any window 
+      (default: "interactive"). The automatic choices are recorded in the page reports, see `save_image_selection_log`.
 
     Functionality:
     1. **Text Processing:**
     - Extracts the text from each page of the PDF.
-    - Identifies and extracts highlighted text from the page.
-    - Performs fuzzy matching to align the highlights with the main text, filtering matches based on a similarity threshold.
+    - Identifies and extracts highlighted text from the page, from its highlight annotations or drawn highlight 
+      rectangles when present, otherwise by detecting highlight colours on a rendered image of the page.
+    - Maps the highlights to the sentences they cover on the page, or aligns them with the main text by fuzzy matching, 
+      filtering matches based on a threshold (see `match_mode`).
+    - With a `cache`, pages seen before with the same settings skip the text and highlight extraction, see `summarize_page`.
+    - With a `manifest`, pages whose content and annotations did not change since the previous summary are not processed 
+      at all: their previous records are reused, see `SummaryManifest`.
 
     2. **Headings Processing:**
     - Extracts potential headings from the page.
@@ -35,8 +288,9 @@ def get_summary(doc, print_results=False, include_images=False, images_folder="t
 
     3. **Image Processing (Optional):**
     - Converts the page into an image and displays it.
-    - Extracts images from the page, saves them in the specified folder, and optionally displays contours and captions.
-    - Allows user interaction for selecting captions and managing images.
+    - Extracts images from the page, keeps them in memory, and optionally displays contours and captions.
+    - Allows user interaction for selecting captions and managing images, or selects them from the page geometry 
+      with `image_selection="auto"`.
 
     4. **Results Compilation:**
     - Constructs a structured summary for each page, including:
@@ -45,99 +299,413 @@ def get_summary(doc, print_results=False, include_images=False, images_folder="t
         - Original text and highlight counts
         - Extracted headings
         - Extracted images and captions (if enabled)
-    - Appends all results into a single list for the entire document.
+    - Appends all records into a single list for the entire document, or yields them page by page when `stream` is set.
+
+    5. **Parallel Processing (Optional):**
+    - With `jobs` > 1, pages are fanned out to a process pool; each worker opens its own handle on the document.
+    - Page results are reassembled in page order, so the output is identical to a serial run.
+    - Interactive runs (interactive `include_images` or `show_image_process`) and in-memory documents always run serially.
 
-    5. **Progress and Debugging:**
+    6. **Progress and Debugging:**
     - Prints progress messages and intermediate results (optional).
 
     Returns:
-    + results -- A list containing the summarized text, headings, and images (if included) for the entire document.
+    + results -- A list of summary records (see `records.py`) for the entire document. `render_text` turns them into 
+      the plain strings used for text output. With `stream`, a generator of per-page record lists instead.
 
     Notes:
     - Image and text extraction relies on helper functions such as `pdf_page_to_image`, `getTextFromPDFAsParagraphs`, `getHighlightedText`, `getImages`, `getHeadings`, and others.
-    - Requires the `cv2` library for image processing and the `fuzzywuzzy` library for text similarity scoring.
+    - Requires the `cv2` library for image processing and the `rapidfuzz` library for text similarity scoring.
     - Handles multi-page documents and includes functionality for user interaction in the image processing phase.
     """
 
+    pages = iter_summary(doc, print_results=print_results, include_images=include_images, show_progress=show_progress, threshold=threshold, show_image_process=show_image_process, jobs=jobs, dpi=dpi, page_reports=page_reports, cache=cache, manifest=manifest, image_selection=image_selection, refine_dpi=refine_dpi, highlight_colors=highlight_colors, match_mode=match_mode)
+    if stream:
+        return pages
+
     results = []
+    for page_results in pages:
+        results.extend(page_results)
+    return results
+
+
+
+
+def iter_summary(doc, print_results=False, include_images=False, show_progress=True, threshold=None, show_image_process=False, jobs=1, dpi=72, page_reports=None, cache=None, manifest=None, image_selection="interactive", refine_dpi=None, highlight_colors=None, match_mode="geometry"):
+    """
+    Summarizes a PDF document page by page, yielding each page's records as soon as they are ready.
+
+    Arguments:
+    + doc, print_results, include_images, show_progress, threshold, show_image_process, jobs, dpi, page_reports, cache, manifest, image_selection, refine_dpi, highlight_colors, match_mode -- See `get_summary`.
 
-    # Processing each page
-    for page_num in range(1, doc.page_count+1):
-        print(f"\n[INFO] Processing page {page_num} of {doc.page_count}...") if show_progress else None
+    Functionality:
+    - Summarizes the pages serially, or with `jobs` > 1 through a process pool whose workers each open 
+      their own handle on the document.
+    - Keeps at most two pages per worker in flight, so memory stays flat however long the document is, 
+      and yields the pages in page order whatever order they finish in.
+    - With a `manifest`, fingerprints every page first and only processes the pages not found in it, splicing the 
+      stored records of the others in between; the manifest is rewritten once all pages are yielded.
+    - With `include_images`, stores each distinct image once (see `utils.ImageDeduplicator`): a later occurrence of 
+      an embedded image or a near-identical crop is replaced by the first one's record, and noted as `duplicate_of` 
+      in the page's image report.
+    - Appends each page's report to `page_reports` (if given) as the page is yielded.
+    - When timings are on (see `timings.enable_timings`), records the stages of every page, including those run 
+      in the workers, in this process's timer.
+
+    Yields:
+    + page_results -- The list of summary records of one page, in page order.
+    """
+    options = dict(print_results=print_results, include_images=include_images, show_progress=show_progress, threshold=threshold, show_image_process=show_image_process, dpi=dpi, image_selection=image_selection, refine_dpi=refine_dpi, highlight_colors=highlight_colors, match_mode=match_mode)
+    page_numbers = range(1, doc.page_count+1)
+
+    if jobs > 1 and ((include_images and image_selection != "auto") or show_image_process or not doc.name):
+        print("[INFO] Interactive or in-memory documents cannot be processed in parallel, running serially.") if show_progress else None
+        jobs = 1
+    if include_images and image_selection != "auto":
+        # The crops of the earlier pages stay selectable too, up to the buffer's bounds
+        options["image_buffer"] = ImageBuffer()
+    if manifest is not None and include_images:
+        print("[INFO] Summaries with images are not kept in the manifest, summarizing every page.") if show_progress else None
+        manifest = None
+
+    reused = {}
+    if manifest is not None:
+        start_time = time.perf_counter()
+        manifest.load({"threshold": threshold, "match_mode": match_mode, **highlight_cache_params(dpi, refine_dpi, highlight_colors)})
+        with stage("manifest"):
+            reused = manifest.match(doc)
+        check_seconds = time.perf_counter() - start_time
+    process_numbers = [page_num for page_num in page_numbers if page_num not in reused]
+
+    timer = get_timer()
+
+    def parallel_pages():
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(max_workers=min(jobs, max(len(process_numbers), 1)), initializer=init_summary_worker, initargs=(doc.name, cache, timer is not None))
+        pending = deque()
+
+        def next_page():
+            with stage("wait_for_workers"):
+                page_results, page_report = pending.popleft().result()
+            timer.merge_page(page_report["page"], page_report.pop("timings")) if timer is not None else None
+            return page_results, page_report
 
+        try:
+            for page_num in process_numbers:
+                pending.append(executor.submit(summarize_page_worker, page_num, options))
+                if len(pending) >= 2 * jobs:
+                    yield next_page()
+            while pending:
+                yield next_page()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def serial_pages():
+        for page_num in process_numbers:
+            with stage("summarize_page", page=page_num):
+                page_results = summarize_page(doc, page_num, cache=cache, **options)
+            yield page_results
+
+    pages = parallel_pages() if jobs > 1 else serial_pages()
+
+    deduplicator = ImageDeduplicator() if include_images else None
+    reports = []
+    changed_highlights = 0
+    for page_num in page_numbers:
+        if page_num in reused:
+            page_results, page_report = reused[page_num]
+        else:
+            page_results, page_report = next(pages)
+            changed_highlights += manifest.update(page_num, page_results, page_report) if manifest is not None else 0
+        if deduplicator is not None:
+            page_results = deduplicate_images(deduplicator, page_results, page_report)
+        reports.append(page_report)
+        page_reports.append(page_report) if page_reports is not None else None
+        yield page_results
+
+    manifest.save() if manifest is not None else None
+
+    processed = [report for report in reports if not report["reused"]]
+    if show_progress and manifest is not None:
+        print(f"[INFO] Incremental: reused {len(reused)} of {len(reports)} page(s) from {manifest.path} and reprocessed {len(processed)} "
+              f"({changed_highlights} with changed highlights). Fingerprinting took {check_seconds:.2f}s and saved about "
+              f"{sum(report['saved_seconds'] for report in reports if report['reused']):.2f}s of processing.")
+    if show_progress and processed:
+        raster_pages = [report for report in processed if report["highlight_path"] == "raster"]
+        drawing_pages = [report for report in processed if report["highlight_path"] == "drawings"]
+        print(f"[INFO] Highlights read from annotations on {len(processed) - len(raster_pages) - len(drawing_pages)} page(s), from drawings on {len(drawing_pages)} page(s) "
+              f"and detected on rendered images on {len(raster_pages)} page(s), "
+              f"using {sum(report['cpu_seconds'] for report in raster_pages):.2f}s of CPU time on the raster path.")
+        if cache is not None:
+            print(f"[INFO] Cache ({cache.cache_dir}): {format_cache_stats(sum((Counter(report['cache']) for report in processed), Counter()))}.")
+    if show_progress and deduplicator is not None and deduplicator.duplicates:
+        print(f"[INFO] {deduplicator.duplicates} repeated image(s) stored once, saving {deduplicator.saved_bytes / 1024:.1f} KiB.")
+
+
+def deduplicate_images(deduplicator, page_results, page_report):
+    """
+    Replaces the images of a page seen earlier in the document by their first occurrence.
 
-        highlight_matches = []  # Reset for each page
-        original_count = 0
-        highlight_matches_count = 0
+    Arguments:
+    + deduplicator (ImageDeduplicator) -- The images seen so far in the document.
+    + page_results (list) -- The summary records of the page.
+    + page_report (dict) -- The page's report; its selected images get a `duplicate_of` entry when replaced.
 
-        # Acquiring an image version of the page
-        img = pdf_page_to_image(doc, page_num)
+    Returns:
+    + The page's records, with the repeated images replaced.
+    """
+    resolved = []
+    for record in page_results:
+        if isinstance(record, ImageRecord):
+            first = deduplicator.resolve(record)
+            if first is not record:
+                for item in (page_report.get("images") or {}).get("selected", []):
+                    if item.get("image_id") == record.image_id:
+                        item["duplicate_of"] = first.image_id
+            record = first
+        resolved.append(record)
+    return resolved
 
-        # Geting the main text from the given page, for reference
-        actual_page_text, actual_page_text_for_headings = getTextFromPDFAsParagraphs(doc, page_num)
-        original_count = get_count(actual_page_text, original_count)
-        displayResult("ORIGINAL TEXT", actual_page_text) if print_results else None
 
-        # Extracting highlighted text on the page
-        hText = getHighlightedText(doc, page_num, img, show_result_image=show_image_process, show_process=show_image_process)
-        displayResult("HIGHLIGHTED TEXT", hText) if print_results else None
 
-        # Performing fuzzy matching between highlights and actual text
-        for text in hText:
-            highlight_matches.extend(process.extract(text, actual_page_text, scorer=fuzz.token_sort_ratio))
 
-        # Filter and sort matches to allow the main txt to appear in order
-        highlight_matches = list(dict.fromkeys([match for match, score in highlight_matches if score >= threshold]))
-        highlight_matches = sorted(highlight_matches, key=lambda x: actual_page_text.index(x))
-        displayResult("HIGHLIGHTED TEXT MATCHES", highlight_matches) if print_results else None
 
 
-        
 
-        if include_images:
-            while True:
-                cv2.imshow('Original Image', img)
-                key = cv2.waitKey(1) & 0xFF
-                if key == 27 or key in (ord('q'), ord('x')):  # Press ESC to close or click on an option
-                    break
-            getImages(img, images_folder, show_contours=show_image_process, show_result=show_image_process)
-            possible_captions = getImageCaption(actual_page_text_for_headings)
-            images, paths = load_images_from_folder(images_folder)
-            image_path_result = display_images_grid(images, paths, close_image_window=False, pdf_image_path='')
-            image_caption_result = display_strings(possible_captions, window_name="Select The Correct Caption: ", close_caption_window = False, pdf_caption_text = '')
 
+def save_summary(results, output_path, output_format="pdf", color_tags=False):
+    """
+    Writes a summary with the writer of the given output format.
 
-        # Match headings with the highlighted text
-        headings = getHeadings(actual_page_text_for_headings)
-        displayResult("PAGE HEADINGS", headings) if print_results else None
-
-        for index, match in enumerate(highlight_matches):
-            for heading in headings:
-                if heading in match:
-                        highlight_matches[index] = match.replace(match[ match.find(heading) : match.find(heading)+len(heading) ], "") # Replace current Heading Sentence with sentence without heading.
-                        highlight_matches.insert(index, f"\n\n\n####### {heading} ##############\n\n\n") # Insert the New Heading
-        highlight_matches_count = get_count(highlight_matches, highlight_matches_count)
-
-        # Append page results to the main results list
-        results.append(f"Page {page_num}:\n")
-        results.extend(highlight_matches)
-        if include_images:
-            results.append(image_path_result)
-            results.append(image_caption_result)
-
-        results.append(f"\n\nOriginal Text Length {original_count}\n'      |      \nHighlighted Text Count: {highlight_matches_count}")
-        results.append("\n\n==============================================================\n\n")
-
-        print(f"[INFO] Page {page_num} of {doc.page_count}: Extraction completed with {highlight_matches_count} highlights from {original_count} original text and {len(headings)} headings.\n") if show_progress else None
-        displayResult("RESULT", results) if print_results else None
-    
-    
-    
-        cv2.destroyAllWindows()
-    return results
+    Arguments:
+    + results -- The summary records (or any iterable of them, e.g. a stream from `get_summary`).
+    + output_path (str) -- Path of the output file.
+    + output_format (str) -- "pdf", "txt" or "docx" (default: "pdf").
+    + color_tags (bool) -- Whether a text summary prefixes each highlighted sentence with its highlight colour (default: False). 
+      PDF and DOCX summaries always show the colour, on the sentence's bullet.
 
+    Returns:
+    None
+    """
+    if output_format == "docx":
+        save_to_docx(results, output_path)
+    elif output_format == "txt":
+        save_to_txt(results, output_path, color_tags=color_tags)
+    else:
+        save_to_pdf(results, output_path)
+
+
+
+
+def parse_highlight_colors(value):
+    """
+    Parses the `--highlight-colors` option.
+
+    Arguments:
+    + value (str) -- Comma-separated colour names, e.g. "yellow,green".
+
+    Returns:
+    + The list of colour names.
+    """
+    colors = [name.strip().lower() for name in value.split(",") if name.strip()]
+    unknown = [name for name in colors if name not in HIGHLIGHT_CLASSES]
+    if unknown or not colors:
+        raise ag.ArgumentTypeError(f"unknown highlight colour(s) {', '.join(unknown) or value!r}, choose among {', '.join(HIGHLIGHT_CLASSES)}")
+    return list(dict.fromkeys(colors))
+
+
+def save_image_selection_log(path, pdf_path, page_reports):
+    """
+    Writes the automatic image and caption choices of a summary to a JSON file, for review.
+
+    Arguments:
+    + path (str) -- Path of the log file.
+    + pdf_path (str) -- The summarized PDF document.
+    + page_reports (list) -- The page reports of the summary, see `get_summary` and `summarize_page`.
+
+    Returns:
+    None
+    """
+    pages = [{"page": report["page"], **report["images"]} for report in page_reports if report.get("images") is not None]
+    log = {"document": pdf_path, "selected": sum(len(page["selected"]) for page in pages), "pages": pages}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(log, f, indent=2)
+
+
+
+
+def find_pdfs(inputs, recursive=False):
+    """
+    Expands directories and glob patterns into the list of PDF files they contain.
+
+    Arguments:
+    + inputs (list) -- PDF files, directories and/or glob patterns (e.g. "reports/**/*.pdf").
+    + recursive (bool) -- Whether directories are searched recursively (default: False).
+
+    Returns:
+    + The paths of the PDF files found, without duplicates, in the order of the inputs.
+    """
+    pdf_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(glob.glob(os.path.join(item, "**", "*") if recursive else os.path.join(item, "*"), recursive=recursive))
+        elif glob.has_magic(item):
+            matches = sorted(glob.glob(item, recursive=True))
+        else:
+            matches = [item]
+        pdf_paths.extend(path for path in matches if path.lower().endswith(".pdf") and os.path.isfile(path))
+    return list(dict.fromkeys(pdf_paths))
+
+
+def batch_output_paths(pdf_paths, output_dir, output_format):
+    """
+    Chooses an output path in `output_dir` for each input PDF, named after the input.
+
+    Arguments:
+    + pdf_paths (list) -- The input PDF files.
+    + output_dir (str) -- The folder the summaries are written to.
+    + output_format (str) -- "pdf", "txt" or "docx".
 
+    Returns:
+    + A dict mapping each input path to its output path. Inputs with the same file name get numbered outputs.
+    """
+    output_paths, used = {}, set()
+    for pdf_path in pdf_paths:
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        name, number = f"{stem}.{output_format}", 1
+        while name.lower() in used:
+            number += 1
+            name = f"{stem}-{number}.{output_format}"
+        used.add(name.lower())
+        output_paths[pdf_path] = os.path.join(output_dir, name)
+    return output_paths
+
+
+def summarize_document(pdf_path, output_path, output_format="pdf", options=None, cache=None, incremental=False):
+    """
+    Summarizes one PDF document into one output file, reporting the outcome instead of raising.
+
+    This is the unit of work of `batch_summarize`; it runs inside a pool worker.
+
+    Arguments:
+    + pdf_path (str) -- Path to the PDF document.
+    + output_path (str) -- Path of the summary to write.
+    + output_format (str) -- "pdf", "txt" or "docx" (default: "pdf").
+    + options (dict) -- Keyword arguments forwarded to `get_summary`, e.g. `threshold` and `dpi` (default: None).
+      With `include_images`, the images are selected automatically and the choices logged next to the output, 
+      in `<output>.images.json`.
+    + cache (SummaryCache) -- The page cache, if any (default: None).
+    + incremental (bool) -- Whether to reuse unchanged pages from the document's sidecar manifest (default: False).
+
+    Returns:
+    + A dict with the document's `input`, `output`, `status` ("ok" or "failed"), `pages`, `seconds` and, on failure, `error`.
+    """
+    start_time = time.perf_counter()
+    report = {"input": pdf_path, "output": output_path, "status": "ok", "pages": None, "seconds": None}
+    options = dict(options or {})
+    options.update(image_selection="auto") if options.get("include_images") else None
+    color_tags = options.pop("color_tags", False)
+    page_reports = []
+    try:
+        with fitz.open(pdf_path) as doc:
+            report["pages"] = doc.page_count
+            manifest = SummaryManifest(default_manifest_path(pdf_path)) if incremental else None
+            pages = get_summary(doc, show_progress=False, stream=True, cache=cache, manifest=manifest, page_reports=page_reports, **options)
+            save_summary(chain.from_iterable(pages), output_path, output_format, color_tags=color_tags)
+        save_image_selection_log(f"{output_path}.images.json", pdf_path, page_reports) if options.get("include_images") else None
+    except Exception as e:
+        report.update(status="failed", error=f"{type(e).__name__}: {e}")
+        # Do not leave a truncated summary behind
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    report["seconds"] = round(time.perf_counter() - start_time, 3)
+    return report
+
+
+def batch_summarize(pdf_paths, output_dir, output_format="pdf", jobs=1, options=None, cache=None, incremental=False, manifest_path=None):
+    """
+    Summarizes many PDF documents, one output per input, spreading the documents over a process pool.
+
+    Arguments:
+    + pdf_paths (list) -- The PDF documents to summarize, see `find_pdfs`.
+    + output_dir (str) -- The folder the summaries are written to, see `batch_output_paths`.
+    + output_format (str) -- "pdf", "txt" or "docx" (default: "pdf").
+    + jobs (int) -- Number of documents summarized at the same time, each in its own worker process (default: 1).
+    + options, cache, incremental -- See `summarize_document`.
+    + manifest_path (str) -- Where to write the batch manifest (default: "ospdf-batch.json" in `output_dir`).
+
+    Functionality:
+    - Submits the documents largest first, so the longest ones do not start last and leave the other 
+      workers idle at the end of the batch.
+    - Pages within a document are processed serially; the workers import the libraries once for all 
+      the documents they summarize.
+    - A document that fails is recorded as failed and the batch carries on with the others. When a worker process 
+      dies, which breaks the pool and fails every document it still held, those documents are retried each in a 
+      pool of its own, so only the document that killed its worker is recorded as failed.
+    - Prints one line per finished document and writes the batch manifest: the options and, per document, 
+      its status, page count, duration and output path.
 
+    Returns:
+    + The list of document reports from `summarize_document`, in input order.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    manifest_path = manifest_path or os.path.join(output_dir, "ospdf-batch.json")
+    output_paths = batch_output_paths(pdf_paths, output_dir, output_format)
+    start_time = time.perf_counter()
+
+    reports = {}
+    def record(pdf_path, report):
+        reports[pdf_path] = report
+        detail = f"{report['pages']} page(s) in {report['seconds']}s -> {report['output']}" if report["status"] == "ok" else report["error"]
+        print(f"[INFO] [{len(reports)}/{len(pdf_paths)}] {report['status']}: {pdf_path} ({detail})")
+
+    def failed_report(pdf_path, error):
+        return {"input": pdf_path, "output": output_paths[pdf_path], "status": "failed", "pages": None, "seconds": None, "error": error}
+
+    def run_pool(paths, workers):
+        """Summarizes documents over a new pool, and returns those left unfinished if a worker died and broke it."""
+        unfinished = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(summarize_document, pdf_path, output_paths[pdf_path], output_format, options, cache, incremental): pdf_path for pdf_path in paths}
+            for future in as_completed(futures):
+                pdf_path = futures[future]
+                try:
+                    report = future.result()
+                except BrokenProcessPool:
+                    # A worker died (e.g. a crash inside a native library), failing every document the pool still held
+                    unfinished.append(pdf_path)
+                    continue
+                except Exception as e:
+                    report = failed_report(pdf_path, f"{type(e).__name__}: {e}")
+                record(pdf_path, report)
+        return unfinished
+
+    def run_alone(pdf_path):
+        """Summarizes one document in a pool of its own, so a dying worker can only be blamed on it."""
+        if run_pool([pdf_path], 1):
+            record(pdf_path, failed_report(pdf_path, "BrokenProcessPool: the worker process died while summarizing this document"))
+
+    # Largest first: with the long documents started early, the short ones fill in the gaps at the end
+    by_size = sorted(pdf_paths, key=lambda path: os.path.getsize(path), reverse=True)
+    workers = max(1, min(jobs, len(pdf_paths)))
+    unfinished = run_pool(by_size, workers)
+    if unfinished:
+        # Which document killed its worker is unknown, so each unfinished one is retried in its own pool, still in parallel
+        print(f"[WARNING] A worker process died; retrying {len(unfinished)} unfinished document(s) one per process.")
+        with ThreadPoolExecutor(max_workers=min(workers, len(unfinished))) as retries:
+            list(retries.map(run_alone, sorted(unfinished, key=by_size.index)))
+
+    reports = [reports[pdf_path] for pdf_path in pdf_paths]
+    failed = sum(report["status"] != "ok" for report in reports)
+    batch = {"output_dir": output_dir, "format": output_format, "jobs": jobs, "options": options or {}, "incremental": incremental, 
+             "seconds": round(time.perf_counter() - start_time, 3), "succeeded": len(reports) - failed, "failed": failed, "documents": reports}
+    with open(manifest_path, "w") as f:
+        json.dump(batch, f, indent=2)
+    print(f"[INFO] Summarized {len(reports) - failed} of {len(reports)} document(s) in {batch['seconds']:.2f}s, {failed} failed. Manifest: {manifest_path}")
+    return reports
 
 
 
@@ -208,71 +776,16 @@ Tips
 
 
 
-def main():
-
-    check_and_create_folder(".ospdf-tmp-images")
-
-    parser = ag.ArgumentParser(prog='ospdf', description='Manage and summarize PDF files effectively with custom commands.')
-
-    # parser.add_argument('-v', '--version', action='version', version=f"%{parser.prog}s {pkg_resources.get_distribution('ospdf').version}")0.0.1'
-    parser.add_argument('-v', '--version', action='version', version=f"{parser.prog} {'0.0.1'}")
-
-
-    sub_parser = parser.add_subparsers(dest='command', required=False, parser_class=ag.ArgumentParser)
-
-
-    init_parser = sub_parser.add_parser('init', help='Set up the tool with a specific PDF file and optionally adjust its state.')
-
-    init_parser.add_argument('pdf_file', nargs='?', default='', type=str, help='Path to the target PDF file to be used. Leave empty to use the current state.')
-    init_parser.add_argument('-d','--dont-persist-state', action='store_true', help='Specify if the current state should not be saved. By default, the state will persist.')
-    init_parser.add_argument('-r','--reset-state', action='store_true', help='Reset the saved state to start fresh with the specified or default PDF file.')
-
-
-    summariser_parser = sub_parser.add_parser('summarize', help='Summarize PDF content based on highlighted text.', description='Use this command to generate summaries from highlighted sections of a PDF. You can include images, customize the output format, and control various processing options.')
-
-    summariser_parser.add_argument('-i', '--include-images', action='store_true', help='Include images from the PDF in the summary output (PDF or DOCX formats).')
-    summariser_parser.add_argument('-o', '--output-path', type=str, help='Path to save the summary file. Supports PDF, DOCX, or TXT formats based on selected options.')
-    summariser_parser.add_argument('-u', '--input-path', type=str, help='Path to the input PDF file for summarization. Overrides any saved state.')
-    summariser_parser.add_argument('-p', '--print-results', action='store_true', help='Display the summarization results directly in the terminal.')
-    summariser_parser.add_argument('-s', '--show-progress', action='store_true', help='Display progress updates in the terminal during summarization.')
-    summariser_parser.add_argument('-a', '--show-image-process', action='store_true', help='Preview each image during processing. Use cautiously as it may slow down operations and clutter the screen.')
-    summariser_parser.add_argument('--pdf', action='store_true', help='Save the summary as a PDF file.')
-    summariser_parser.add_argument('--txt', action='store_true', help='Save the summary as a plain text file.')
-    summariser_parser.add_argument('--docx', action='store_true', help='Save the summary as a Word document.')
-    summariser_parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose mode to display all debug and status messages.')
-    summariser_parser.add_argument('-t', '--threshold', type=int, default=50, help='Set the summarization accuracy threshold (0-100). Higher values prioritize precision.')
-
-
-    split_parser = sub_parser.add_parser('split', help='Split a PDF to extract a single page or a range of pages.', description='Use this command to split a PDF file, extracting either a single page or a specified range of pages into a new file.')
-
-    split_parser.add_argument('input_pdf_file', nargs='?', type=str, help='Path to the input PDF file. Overrides any saved state if provided.')
-    split_parser.add_argument('output_pdf_file', type=str, help='Path to save the extracted pages as a new PDF file.')
-    split_parser.add_argument('-s', '--start-page', type=int, default=None, help='Specify the starting page number for extraction. Defaults to the first page.')
-    split_parser.add_argument('-e', '--end-page', type=int, default=None, help='Specify the ending page number for extraction. Defaults to the last page.')
-
-
-    merge_parser = sub_parser.add_parser('merge', help='Merge multiple PDF files into a single PDF.', description='Combine multiple PDF files into one. Specify the output file and input files to merge.')
-
-    merge_parser.add_argument('output_pdf_file', help="Path to save the merged PDF file.")
-    merge_parser.add_argument('input_pdf_files', nargs='*', help="Paths to the input PDF files to be merged. Provide two or more PDF file paths.")
-
-
-    pdf2img_parser = sub_parser.add_parser('pdf2img', help='Convert a single PDF page to an image.', description='Extract a specific page from a PDF and convert it into an image file.')
-  
-    pdf2img_parser.add_argument('input_pdf_file', nargs='?', type=str, help='Path to the input PDF file for page-to-image conversion. Overrides saved state if provided.')
-    pdf2img_parser.add_argument('output_img_path', type=str, help='Path to save the converted image file.')
-    pdf2img_parser.add_argument('page_number', type=int, default=None, help='The page number to extract and convert to an image.')
-
-
-
-    parser.set_defaults(func=home_screen)
-
-
-    args = parser.parse_args()
-
-
+def run_command(args):
+    """
+    Runs the subcommand selected on the command line.
 
+    Arguments:
+    + args -- The parsed command line arguments, see `main`.
 
+    Returns:
+    None
+    """
     if args.command == 'init':
         if args.reset_state:
             if not os.path.exists(STATE_FILE):
@@ -322,7 +835,7 @@ def main():
             docx = False
             if args.input_path:
                 pdf_path = args.input_path
-            if args.include_images:
+            if args.include_images or args.auto_images:
                 include_images = True
 
             output_path = args.output_path or output_path
@@ -353,6 +866,18 @@ def main():
                 if not  0<= args.threshold <= 100:
                     print(f"Error: {args.threshold} is invalid. Threshold must be between 0 and 100.")
                     sys.exit(1)
+            if args.dpi < 1:
+                print(f"Error: {args.dpi} is invalid. The DPI must be a positive integer.")
+                sys.exit(1)
+            if args.refine_dpi is not None and args.refine_dpi <= args.dpi:
+                print(f"Error: {args.refine_dpi} is invalid. The refine DPI must be higher than the DPI ({args.dpi}).")
+                sys.exit(1)
+            if args.jobs < 1:
+                print(f"Error: {args.jobs} is invalid. The number of jobs must be at least 1.")
+                sys.exit(1)
+            if args.cache_size < 1:
+                print(f"Error: {args.cache_size} is invalid. The cache size must be at least 1 MiB.")
+                sys.exit(1)
 
             if args.txt:
                 txt = True
@@ -367,14 +892,23 @@ def main():
 
             doc = fitz.open(pdf_path)
             print(pdf, txt, docx)
+            cache = None if args.no_cache else SummaryCache(args.cache_dir, args.cache_size * 1024 * 1024)
+            manifest = SummaryManifest(args.manifest or default_manifest_path(pdf_path)) if args.incremental else None
+            timer = (get_timer() or enable_timings()) if args.timings else None
             
-            results = get_summary(doc, include_images=include_images, images_folder=".ospdf-tmp-images", print_results=print_results, show_progress=show_progress, threshold=args.threshold, show_image_process=show_image_process)
-            if docx:
-                save_to_docx(results, output_path)
-            elif txt:
-                save_to_txt(results, output_path)
-            else:
-                save_to_pdf(results, output_path) 
+            page_reports = []
+            pages = get_summary(doc, include_images=include_images, print_results=print_results, show_progress=show_progress, threshold=args.threshold, show_image_process=show_image_process, jobs=args.jobs, dpi=args.dpi, page_reports=page_reports, stream=True, cache=cache, manifest=manifest, image_selection="auto" if args.auto_images else "interactive", refine_dpi=args.refine_dpi, highlight_colors=args.highlight_colors, match_mode=args.match_mode)
+            # The writers consume the records as the pages finish
+            results = chain.from_iterable(pages)
+            save_summary(results, output_path, "docx" if docx else "txt" if txt else "pdf", color_tags=args.color_tags)
+            if args.auto_images:
+                image_log = args.image_log or f"{output_path}.images.json"
+                save_image_selection_log(image_log, pdf_path, page_reports)
+                print(f"[INFO] Image selection saved to {image_log}")
+            if timer is not None:
+                timer.save(args.timings)
+                timer.print_table()
+                print(f"Stage timings saved to {args.timings}", file=sys.stderr)
             
             doc.close()
 
@@ -386,6 +920,39 @@ def main():
 
 
 
+    elif args.command == 'batch':
+        if args.threshold is not None and not 0 <= args.threshold <= 100:
+            print(f"Error: {args.threshold} is invalid. Threshold must be between 0 and 100.")
+            sys.exit(1)
+        if args.dpi < 1:
+            print(f"Error: {args.dpi} is invalid. The DPI must be a positive integer.")
+            sys.exit(1)
+        if args.refine_dpi is not None and args.refine_dpi <= args.dpi:
+            print(f"Error: {args.refine_dpi} is invalid. The refine DPI must be higher than the DPI ({args.dpi}).")
+            sys.exit(1)
+        if args.jobs < 1:
+            print(f"Error: {args.jobs} is invalid. The number of jobs must be at least 1.")
+            sys.exit(1)
+        if args.cache_size < 1:
+            print(f"Error: {args.cache_size} is invalid. The cache size must be at least 1 MiB.")
+            sys.exit(1)
+
+        # Summaries written as PDFs into a folder under the inputs must not be picked up as inputs next time
+        output_root = os.path.realpath(args.output_dir) + os.sep
+        pdf_paths = [path for path in find_pdfs(args.inputs, recursive=args.recursive) if not os.path.realpath(path).startswith(output_root)]
+        if not pdf_paths:
+            print("Error: No PDF files found in the given inputs.")
+            sys.exit(1)
+        os.makedirs(args.output_dir, exist_ok=True)
+
+        cache = None if args.no_cache else SummaryCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        reports = batch_summarize(pdf_paths, args.output_dir, args.format, jobs=args.jobs, options={"threshold": args.threshold, "dpi": args.dpi, "refine_dpi": args.refine_dpi, "highlight_colors": args.highlight_colors, "match_mode": args.match_mode, "color_tags": args.color_tags, "include_images": args.include_images}, cache=cache, incremental=args.incremental, manifest_path=args.manifest)
+        if any(report["status"] != "ok" for report in reports):
+            sys.exit(1)
+
+
+
+
     elif args.command == 'split':
         start_page = None
         end_page = None
@@ -549,7 +1116,11 @@ def main():
             print("Page Number must be greater than 1")
             sys.exit(1)
 
-        save_image(pdf_page_to_image(fitz.open(input_pdf_file), page_number), output_pdf_path)
+        if args.dpi < 1:
+            print(f"Error: {args.dpi} is invalid. The DPI must be a positive integer.")
+            sys.exit(1)
+
+        save_image(pdf_page_to_image(fitz.open(input_pdf_file), page_number, dpi=args.dpi, colorspace="gray" if args.gray else "rgb"), output_pdf_path)
         
 
         if not persist_state: 
@@ -562,5 +1133,119 @@ def main():
 
 
 
+def main():
+
+    parser = ag.ArgumentParser(prog='ospdf', description='Manage and summarize PDF files effectively with custom commands.')
+
+    # parser.add_argument('-v', '--version', action='version', version=f"%{parser.prog}s {pkg_resources.get_distribution('ospdf').version}")0.0.1'
+    parser.add_argument('-v', '--version', action='version', version=f"{parser.prog} {'0.0.1'}")
+    parser.add_argument('--profile', type=str, metavar='OUT.prof', default=None, help='Run the subcommand under the CPU profiler and save the profile to this file, in the pstats format (e.g. `python -m pstats OUT.prof`).')
+    parser.add_argument('--trace-memory', type=str, metavar='OUT.json', default=None, help='Trace the memory allocations of the subcommand and save the peak traced memory, the peak of each stage and the top allocation sites to this JSON file. Only this process is traced.')
+
+
+    sub_parser = parser.add_subparsers(dest='command', required=False, parser_class=ag.ArgumentParser)
+
+
+    init_parser = sub_parser.add_parser('init', help='Set up the tool with a specific PDF file and optionally adjust its state.')
+
+    init_parser.add_argument('pdf_file', nargs='?', default='', type=str, help='Path to the target PDF file to be used. Leave empty to use the current state.')
+    init_parser.add_argument('-d','--dont-persist-state', action='store_true', help='Specify if the current state should not be saved. By default, the state will persist.')
+    init_parser.add_argument('-r','--reset-state', action='store_true', help='Reset the saved state to start fresh with the specified or default PDF file.')
+
+
+    summariser_parser = sub_parser.add_parser('summarize', help='Summarize PDF content based on highlighted text.', description='Use this command to generate summaries from highlighted sections of a PDF. You can include images, customize the output format, and control various processing options.')
+
+    summariser_parser.add_argument('-i', '--include-images', action='store_true', help='Include images from the PDF in the summary output (PDF or DOCX formats).')
+    summariser_parser.add_argument('--auto-images', action='store_true', help='Include images without any window: every picture detected on a page is paired with the nearest "Figure x.y" caption, and only captioned pictures are kept. Implies --include-images.')
+    summariser_parser.add_argument('--image-log', type=str, default=None, help='Where --auto-images records the selected images and captions and the skipped candidates, as JSON. Defaults to <output path>.images.json.')
+    summariser_parser.add_argument('-o', '--output-path', type=str, help='Path to save the summary file. Supports PDF, DOCX, or TXT formats based on selected options.')
+    summariser_parser.add_argument('-u', '--input-path', type=str, help='Path to the input PDF file for summarization. Overrides any saved state.')
+    summariser_parser.add_argument('-p', '--print-results', action='store_true', help='Display the summarization results directly in the terminal.')
+    summariser_parser.add_argument('-s', '--show-progress', action='store_true', help='Display progress updates in the terminal during summarization.')
+    summariser_parser.add_argument('-a', '--show-image-process', action='store_true', help='Preview each image during processing. Use cautiously as it may slow down operations and clutter the screen.')
+    summariser_parser.add_argument('--pdf', action='store_true', help='Save the summary as a PDF file.')
+    summariser_parser.add_argument('--txt', action='store_true', help='Save the summary as a plain text file.')
+    summariser_parser.add_argument('--docx', action='store_true', help='Save the summary as a Word document.')
+    summariser_parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose mode to display all debug and status messages.')
+    summariser_parser.add_argument('-t', '--threshold', type=int, default=None, help='Set the summarization accuracy threshold (0-100): the share of a sentence its highlights must cover, or the fuzzy matching score with --match-mode fuzzy. Higher values prioritize precision. Defaults to 25 for the share and 50 for the score.')
+    summariser_parser.add_argument('--dpi', type=int, default=72, help='Resolution used to render pages for highlight detection. Defaults to 72.')
+    summariser_parser.add_argument('--highlight-colors', type=parse_highlight_colors, default=None, help=f'Comma-separated highlight colours to look for on rendered pages and in drawings, among {", ".join(HIGHLIGHT_CLASSES)}. Defaults to {", ".join(DEFAULT_HIGHLIGHT_COLORS)}; blue and pink, which also fill table cells and boxes, have to be asked for.')
+    summariser_parser.add_argument('--match-mode', choices=MATCH_MODES, default='geometry', help='How highlights are mapped to sentences: "geometry" selects the sentences whose words the highlights cover, "fuzzy" scores the highlighted text against the sentences, and "auto" uses geometry with fuzzy matching for the highlights that select no sentence. Defaults to geometry.')
+    summariser_parser.add_argument('--color-tags', action='store_true', help='Prefix each highlighted sentence of a text summary with its highlight colour, e.g. [green]. PDF and DOCX summaries always colour the bullet of each sentence.')
+    summariser_parser.add_argument('--refine-dpi', type=int, default=None, help='Render pages at --dpi only to find candidate highlight regions, and re-render those regions at this higher resolution for precise boxes. Cheaper than raising --dpi for the whole page. Off by default.')
+    summariser_parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes used to summarize pages in parallel. Defaults to 1 (serial).')
+    summariser_parser.add_argument('--timings', type=str, metavar='OUT.json', default=None, help='Record the wall time, CPU time and calls of each stage, overall and per page, save them to this JSON file and print a summary table on stderr.')
+    summariser_parser.add_argument('--incremental', action='store_true', help='Only reprocess the pages that changed since the last summary of this PDF, reusing the others from its manifest.')
+    summariser_parser.add_argument('--manifest', type=str, default=None, help='Path of the manifest used by --incremental. Defaults to <input PDF>.ospdf-manifest.json, next to the PDF.')
+    summariser_parser.add_argument('--no-cache', action='store_true', help='Process every page from scratch, without reading or filling the page cache.')
+    summariser_parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help=f'Directory of the page cache. Defaults to {DEFAULT_CACHE_DIR}.')
+    summariser_parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024), help=f'Size cap of the page cache in MiB; the least recently used entries are evicted beyond it. Defaults to {DEFAULT_CACHE_SIZE // (1024 * 1024)}.')
+
+
+    batch_parser = sub_parser.add_parser('batch', help='Summarize many PDFs at once, from directories or glob patterns.', description='Summarize every PDF found in the given directories or glob patterns, one output per input, spreading the documents over worker processes. A document that fails does not stop the batch.')
+
+    batch_parser.add_argument('inputs', nargs='+', type=str, help='PDF files, directories and/or glob patterns (quote them, e.g. "reports/**/*.pdf").')
+    batch_parser.add_argument('-o', '--output-dir', type=str, required=True, help='Folder the summaries are written to, one per input PDF. It is created if needed.')
+    batch_parser.add_argument('-f', '--format', choices=['pdf', 'txt', 'docx'], default='pdf', help='Output format of the summaries. Defaults to pdf.')
+    batch_parser.add_argument('-r', '--recursive', action='store_true', help='Search the given directories recursively.')
+    batch_parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Number of documents summarized in parallel. Defaults to the number of CPUs.')
+    batch_parser.add_argument('-i', '--include-images', action='store_true', help='Include the captioned pictures of each PDF, selected automatically as with `summarize --auto-images`. The choices are logged in <output>.images.json.')
+    batch_parser.add_argument('-t', '--threshold', type=int, default=None, help='Set the summarization accuracy threshold (0-100): the share of a sentence its highlights must cover, or the fuzzy matching score with --match-mode fuzzy. Higher values prioritize precision. Defaults to 25 for the share and 50 for the score.')
+    batch_parser.add_argument('--dpi', type=int, default=72, help='Resolution used to render pages for highlight detection. Defaults to 72.')
+    batch_parser.add_argument('--highlight-colors', type=parse_highlight_colors, default=None, help=f'Comma-separated highlight colours to look for on rendered pages and in drawings, among {", ".join(HIGHLIGHT_CLASSES)}. Defaults to {", ".join(DEFAULT_HIGHLIGHT_COLORS)}; blue and pink, which also fill table cells and boxes, have to be asked for.')
+    batch_parser.add_argument('--match-mode', choices=MATCH_MODES, default='geometry', help='How highlights are mapped to sentences, see `summarize --match-mode`.')
+    batch_parser.add_argument('--color-tags', action='store_true', help='Prefix each highlighted sentence of text summaries with its highlight colour, see `summarize --color-tags`.')
+    batch_parser.add_argument('--refine-dpi', type=int, default=None, help='Re-render the candidate highlight regions found at --dpi at this higher resolution, see `summarize --refine-dpi`.')
+    batch_parser.add_argument('--incremental', action='store_true', help='Only reprocess the pages that changed since the last summary of each PDF, see `summarize --incremental`.')
+    batch_parser.add_argument('--manifest', type=str, default=None, help='Path of the batch manifest (status, pages, duration and output of each document). Defaults to ospdf-batch.json in the output folder.')
+    batch_parser.add_argument('--no-cache', action='store_true', help='Process every page from scratch, without reading or filling the page cache.')
+    batch_parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help=f'Directory of the page cache. Defaults to {DEFAULT_CACHE_DIR}.')
+    batch_parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024), help=f'Size cap of the page cache in MiB. Defaults to {DEFAULT_CACHE_SIZE // (1024 * 1024)}.')
+
+
+    split_parser = sub_parser.add_parser('split', help='Split a PDF to extract a single page or a range of pages.', description='Use this command to split a PDF file, extracting either a single page or a specified range of pages into a new file.')
+
+    split_parser.add_argument('input_pdf_file', nargs='?', type=str, help='Path to the input PDF file. Overrides any saved state if provided.')
+    split_parser.add_argument('output_pdf_file', type=str, help='Path to save the extracted pages as a new PDF file.')
+    split_parser.add_argument('-s', '--start-page', type=int, default=None, help='Specify the starting page number for extraction. Defaults to the first page.')
+    split_parser.add_argument('-e', '--end-page', type=int, default=None, help='Specify the ending page number for extraction. Defaults to the last page.')
+
+
+    merge_parser = sub_parser.add_parser('merge', help='Merge multiple PDF files into a single PDF.', description='Combine multiple PDF files into one. Specify the output file and input files to merge.')
+
+    merge_parser.add_argument('output_pdf_file', help="Path to save the merged PDF file.")
+    merge_parser.add_argument('input_pdf_files', nargs='*', help="Paths to the input PDF files to be merged. Provide two or more PDF file paths.")
+
+
+    pdf2img_parser = sub_parser.add_parser('pdf2img', help='Convert a single PDF page to an image.', description='Extract a specific page from a PDF and convert it into an image file.')
+  
+    pdf2img_parser.add_argument('input_pdf_file', nargs='?', type=str, help='Path to the input PDF file for page-to-image conversion. Overrides saved state if provided.')
+    pdf2img_parser.add_argument('output_img_path', type=str, help='Path to save the converted image file.')
+    pdf2img_parser.add_argument('page_number', type=int, default=None, help='The page number to extract and convert to an image.')
+    pdf2img_parser.add_argument('--dpi', type=int, default=72, help='Resolution of the rendered image. Defaults to 72.')
+    pdf2img_parser.add_argument('-g', '--gray', action='store_true', help='Render the page in grayscale instead of color.')
+
+
+
+    parser.set_defaults(func=home_screen)
+
+
+    args = parser.parse_args()
+
+
+
+
+    if args.trace_memory and getattr(args, 'jobs', 1) > 1:
+        print("[WARNING] --trace-memory only traces this process, not the worker processes. Use --jobs 1 to trace the page processing.", file=sys.stderr)
+
+    command = run_command
+    if args.trace_memory:
+        command = functools.partial(trace_memory_call, args.trace_memory, args.command or 'ospdf', command)
+    if args.profile:
+        command = functools.partial(profile_call, args.profile, command)
+    command(args)
+
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
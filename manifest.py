@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+from cache import page_digests
+from records import *
+from utils import load_page
+
+
+# Bump when the manifest layout or the page results change, so older manifests are ignored.
+MANIFEST_VERSION = 1
+
+
+def default_manifest_path(pdf_path):
+    """
+    Returns the path of the sidecar manifest of a PDF document, next to the document.
+
+    Arguments:
+    + pdf_path -- Path to the PDF document.
+
+    Returns:
+    + The path of the manifest.
+    """
+    return f"{pdf_path}.ospdf-manifest.json"
+
+
+class SummaryManifest:
+    """
+    A sidecar manifest of the last summary of a document, used to re-summarize it incrementally.
+
+    The manifest stores, for each page, its fingerprints (see `cache.page_digests`): a hash of its content
+    (content streams, resources and geometry), a hash of its annotations, and a hash of the highlighted text
+    the page produced, along with the page's summary records and how long it took. On the next run, pages
+    whose content and annotation hashes are found in the manifest are not processed again: their stored
+    records are spliced into the summary. Pages are matched by fingerprint rather than by number, so
+    inserting, deleting or moving pages only reprocesses the pages that actually changed.
+
+    The stored records are only valid for the settings they were produced with (`threshold`, `match_mode`, `dpi`,
+    the highlight colours and the segmentation settings); when these change, every page is processed again.
+
+    Attributes:
+        path (str): The path of the manifest file.
+        pages (dict): The entries of the current run, by page number.
+        previous (dict): The entries of the previous run, by page number.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+        self.previous = {}
+        self._options = None
+        self._entries = {}
+
+    @staticmethod
+    def key(digests):
+        return f"{digests['content']}:{digests['annotations']}"
+
+    def load(self, options):
+        """
+        Reads the manifest, keeping its entries only if they were produced with the same settings.
+
+        Arguments:
+        + options (dict) -- The JSON serializable settings the page results depend on.
+
+        Returns:
+        + True if the manifest was loaded and its entries can be reused.
+        """
+        # Compared as stored, so tuples and lists in the settings do not tell them apart
+        self._options = options = json.loads(json.dumps(options))
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Ignoring the unreadable manifest '{self.path}': {e}")
+            return False
+        if data.get("version") != MANIFEST_VERSION or data.get("options") != options:
+            return False
+        self.previous = {entry["page"]: entry for entry in data.get("pages", [])}
+        self._entries = {self.key(entry): entry for entry in data.get("pages", [])}
+        return True
+
+    def match(self, doc):
+        """
+        Fingerprints every page of a document and finds the pages that can be reused from the manifest.
+
+        Arguments:
+        + doc -- The `fitz.Document` being summarized.
+
+        Returns:
+        + A dict mapping the number of each reusable page to a tuple of its stored records and a page report
+          (see `summarize_page`) with `reused` set and `saved_seconds`, the time the page took when it was
+          last processed.
+        """
+        memo = {}
+        reused = {}
+        for page_num in range(1, doc.page_count + 1):
+            digests = page_digests(doc, load_page(doc, page_num), memo)
+            self.pages[page_num] = dict(page=page_num, **digests)
+            entry = self._entries.get(self.key(digests))
+            if entry is None:
+                continue
+            # The page may have moved, so its header is renumbered
+            records = [PageHeader(page_num) if isinstance(record, PageHeader) else record for record in load_records(entry["records"])]
+            self.pages[page_num].update(records=entry["records"], highlights=entry["highlights"], highlight_path=entry["highlight_path"], highlight_count=entry["highlight_count"], seconds=entry["seconds"])
+            reused[page_num] = (records, {"page": page_num, "highlight_path": entry["highlight_path"], "highlights": entry["highlight_count"], "page_loads": 0, "seconds": 0.0, "cpu_seconds": 0.0, "cache": {}, "reused": True, "saved_seconds": entry["seconds"]})
+        return reused
+
+    def update(self, page_num, page_results, page_report):
+        """
+        Stores the results of a processed page.
+
+        Arguments:
+        + page_num (int) -- The page number (1-indexed).
+        + page_results -- The page's summary records.
+        + page_report -- The page's report from `summarize_page`.
+
+        Returns:
+        + True if the page's highlighted text differs from the one stored for the same page number in the previous run.
+        """
+        highlights = hashlib.sha256("\n".join(render_text(record for record in page_results if isinstance(record, (Heading, Bullet)))).encode()).hexdigest()
+        self.pages[page_num].update(records=dump_records(page_results), highlights=highlights, highlight_path=page_report["highlight_path"], highlight_count=page_report["highlights"], seconds=page_report["seconds"])
+        return self.previous.get(page_num, {}).get("highlights") != highlights
+
+    def save(self):
+        """
+        Writes the entries of the current run to the manifest file, replacing the previous run's.
+
+        Returns:
+        None
+        """
+        data = {"version": MANIFEST_VERSION, "options": self._options, "pages": [self.pages[page_num] for page_num in sorted(self.pages) if "records" in self.pages[page_num]]}
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"[WARNING] Could not write the manifest '{self.path}': {e}")
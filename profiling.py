@@ -0,0 +1,113 @@
+import sys
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+from timings import *
+
+
+def profile_call(path, function, *args, **kwargs):
+    """
+    Calls a function under the CPU profiler and writes the profile to disk, even if the call fails or exits.
+
+    Arguments:
+    + path (str) -- Where to write the profile, in the `pstats` format (open it with `python -m pstats <path>`,
+      snakeviz or any other pstats viewer).
+    + function -- The function to profile, followed by its arguments.
+
+    Returns:
+    + What the function returns.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+        print(f"CPU profile saved to {path}", file=sys.stderr)
+
+
+class PeakSnapshots(threading.Thread):
+    """
+    Watches the memory traced by `tracemalloc` and takes a snapshot each time it grows past the largest one
+    seen so far, so the allocation sites can be reported as they were near the peak of a run rather than at
+    its end, when most of the memory has been freed again.
+
+    Attributes:
+        snapshot (tracemalloc.Snapshot): The snapshot of the highest traced memory seen, or None.
+        size (int): The traced memory when it was taken, in bytes.
+    """
+
+    def __init__(self, interval=0.01, growth=1.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.growth = growth
+        self.snapshot = None
+        self.size = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.check()
+
+    def check(self):
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self.size * self.growth:
+            self.snapshot, self.size = tracemalloc.take_snapshot(), current
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.check()
+
+
+def trace_memory_call(path, name, function, *args, top=25, **kwargs):
+    """
+    Calls a function while tracing memory allocations, and writes a report of the run to disk, even if the
+    call fails or exits.
+
+    The report holds the peak traced memory of the run, the peak of each stage (see `timings.StageTimer`)
+    and the top allocation sites near the peak. Only the memory allocated by Python in this process is
+    traced: worker processes are not.
+
+    Arguments:
+    + path (str) -- Where to write the JSON report.
+    + name (str) -- Name of the stage covering the whole call, e.g. the subcommand.
+    + function -- The function to trace, followed by its arguments.
+    + top (int) -- Number of allocation sites to report (default: 25).
+
+    Returns:
+    + What the function returns.
+    """
+    tracemalloc.start()
+    timer = enable_timings(memory=True)
+    snapshots = PeakSnapshots()
+    snapshots.start()
+    started = time.perf_counter()
+    try:
+        with stage(name):
+            return function(*args, **kwargs)
+    finally:
+        snapshots.stop()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        enable_timings(False)
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"), tracemalloc.Filter(False, "<unknown>")]
+        statistics = snapshots.snapshot.filter_traces(filters).statistics("lineno")[:top] if snapshots.snapshot else []
+        report = {
+            "command": name,
+            "seconds": round(time.perf_counter() - started, 6),
+            "peak_bytes": max([peak] + [stage_peak for stage_peak, _ in timer.memory.values()]),
+            "snapshot_bytes": snapshots.size,
+            "top_allocations": [{"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "size_bytes": stat.size, "count": stat.count} for stat in statistics],
+            "stages": timer.to_dict()["memory"],
+        }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        timer.print_memory_table()
+        print(f"Top allocation sites near the peak ({snapshots.size / 2 ** 20:.2f} MiB traced):", file=sys.stderr)
+        for allocation in report["top_allocations"][:10]:
+            print(f"  {allocation['size_bytes'] / 2 ** 20:>8.2f} MiB  {allocation['count']:>8} blocks  {allocation['site']}", file=sys.stderr)
+        print(f"Peak traced memory: {report['peak_bytes'] / 2 ** 20:.2f} MiB. Memory trace saved to {path}", file=sys.stderr)
@@ -0,0 +1,205 @@
+import io
+import os
+import re
+
+
+PAGE_SEPARATOR = "\n\n==============================================================\n\n"
+
+
+class SummaryRecord:
+    """
+    Base class of the items that make up a summary.
+
+    `get_summary` returns a list of records and the writers dispatch on their type, instead of
+    rediscovering what each item is from its text. `to_text` renders a record the way the summary
+    has always been written to text files, which is also what `str()` returns.
+    """
+    __slots__ = ()
+
+    def to_text(self):
+        raise NotImplementedError
+
+    def __str__(self):
+        return self.to_text()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class PageHeader(SummaryRecord):
+    """The header opening the summary of a page."""
+    __slots__ = ("page",)
+
+    def __init__(self, page):
+        self.page = page
+
+    def to_text(self):
+        return f"Page {self.page}:\n"
+
+
+class Heading(SummaryRecord):
+    """A heading found in the highlighted text."""
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def to_text(self):
+        return f"\n\n\n####### {self.text} ##############\n\n\n"
+
+
+class Bullet(SummaryRecord):
+    """A highlighted sentence, with the name of its highlight colour when known (see `HIGHLIGHT_CLASSES`)."""
+    __slots__ = ("text", "color")
+
+    def __init__(self, text, color=None):
+        self.text = text
+        self.color = color
+
+    def to_text(self):
+        return self.text
+
+
+class ImageRecord(SummaryRecord):
+    """
+    An image to embed in the summary, given by its file path or held in memory as encoded (PNG) bytes.
+
+    Images extracted from the pages are kept in memory under a stable `image_id` (see `ImageBuffer`), 
+    and only encoded when they make it into the summary, so they never go through a temporary folder. 
+    `key` tells copies of the same image apart from other images: "xref:<number>" for images embedded 
+    in the PDF, or "dhash:<hash>:<width>x<height>" for regions cropped from a rendered page (see 
+    `ImageDeduplicator`).
+    """
+    __slots__ = ("path", "data", "image_id", "key")
+
+    def __init__(self, path=None, data=None, image_id=None, key=None):
+        self.path = path
+        self.data = data
+        self.image_id = image_id
+        self.key = key
+
+    @property
+    def source(self):
+        """What the writers open: the encoded image as a file object, or the image path."""
+        return io.BytesIO(self.data) if self.data is not None else self.path
+
+    def to_text(self):
+        return self.path if self.path is not None else f"[image {self.image_id}]"
+
+    def __repr__(self):
+        data = f"<{len(self.data)} bytes>" if self.data is not None else None
+        return f"ImageRecord(path={self.path!r}, data={data}, image_id={self.image_id!r}, key={self.key!r})"
+
+
+class Caption(SummaryRecord):
+    """The caption of the image before it."""
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def to_text(self):
+        return self.text
+
+
+class PageFooter(SummaryRecord):
+    """The footer closing the summary of a page, with its text counts and the page separator."""
+    __slots__ = ("original_count", "highlight_count")
+
+    def __init__(self, original_count, highlight_count):
+        self.original_count = original_count
+        self.highlight_count = highlight_count
+
+    @property
+    def counts_text(self):
+        return f"\n\nOriginal Text Length {self.original_count}\n'      |      \nHighlighted Text Count: {self.highlight_count}"
+
+    def to_text(self):
+        return f"{self.counts_text}\n{PAGE_SEPARATOR}"
+
+
+
+RECORD_TYPES = {record_type.__name__: record_type for record_type in (PageHeader, Heading, Bullet, ImageRecord, Caption, PageFooter)}
+
+
+def dump_records(records):
+    """
+    Converts summary records into JSON serializable lists, e.g. to store them in a manifest.
+
+    Arguments:
+    + records -- An iterable of `SummaryRecord` objects.
+
+    Returns:
+    + A list with one `[type name, *fields]` list per record. `load_records` converts it back. Images held in 
+      memory are not JSON serializable, which is why summaries with images are not kept in manifests.
+    """
+    return [[type(record).__name__] + [getattr(record, name) for name in record.__slots__] for record in records]
+
+
+def load_records(items):
+    """
+    Converts the lists produced by `dump_records` back into summary records.
+
+    Arguments:
+    + items -- A list of `[type name, *fields]` lists.
+
+    Returns:
+    + A list of `SummaryRecord` objects.
+    """
+    return [RECORD_TYPES[name](*fields) for name, *fields in items]
+
+
+
+
+def render_text(records):
+    """
+    Renders summary records as the plain strings `get_summary` used to return.
+
+    Arguments:
+    + records -- An iterable of `SummaryRecord` objects.
+
+    Returns:
+    + A list of strings, one per record.
+    """
+    return [record.to_text() for record in records]
+
+
+def from_legacy(items):
+    """
+    Converts an old string-based summary list into records.
+
+    Summaries used to be lists of strings whose type was recognised from their text. This keeps such 
+    lists usable with the writers; records already in the list are passed through unchanged. Items are 
+    converted one at a time as they are consumed, so streams of records pass through lazily.
+
+    Arguments:
+    + items -- An iterable of strings (and/or records) in the old summary format.
+
+    Yields:
+    + `SummaryRecord` objects. The page separators are dropped, as `PageFooter` now renders them.
+    """
+    previous = None
+    for item in items:
+        if isinstance(item, SummaryRecord):
+            record = item
+        elif "#######" in item:
+            record = Heading(item.split("#######")[1].split("##############")[0].strip())
+        elif item == PAGE_SEPARATOR:
+            continue
+        elif re.match(r"^Page \d+:$", item):
+            record = PageHeader(int(re.match(r"^Page (\d+):$", item).group(1)))
+        elif re.match(r"\n\nOriginal Text Length \d+\n' {6}\| {6}\nHighlighted Text Count: \d+", item):
+            counts = re.findall(r"\d+", item)
+            record = PageFooter(int(counts[0]), int(counts[1]))
+        elif os.path.isfile(item):
+            record = ImageRecord(item)
+        elif isinstance(previous, ImageRecord) and "Figure" in item:
+            record = Caption(item)
+        else:
+            record = Bullet(item)
+        previous = record
+        yield record
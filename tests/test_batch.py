@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+import main
+
+
+summarize_document = main.summarize_document
+
+
+def crashing_summarize_document(pdf_path, *args, **kwargs):
+    """Kills the worker process on documents named crash*.pdf, like a crash inside a native library."""
+    if os.path.basename(pdf_path).startswith("crash"):
+        os._exit(1)
+    return summarize_document(pdf_path, *args, **kwargs)
+
+
+def make_pdf(path, text):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(50, 50, 550, 200), text, fontsize=11)
+    page.add_highlight_annot(page.search_for(text[:20])[0])
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_dead_worker_only_fails_its_document(tmp_path, monkeypatch):
+    # The workers are forked after the patch, so they run it too
+    monkeypatch.setattr(main, "summarize_document", crashing_summarize_document)
+    pdf_paths = [make_pdf(str(tmp_path / name), "This sentence is highlighted for the test. Then it goes on.") for name in ("a.pdf", "crash.pdf", "b.pdf", "c.pdf")]
+
+    (tmp_path / "out").mkdir()
+    reports = main.batch_summarize(pdf_paths, str(tmp_path / "out"), "txt", jobs=2, options={"include_images": False})
+
+    statuses = {os.path.basename(report["input"]): report["status"] for report in reports}
+    assert statuses == {"a.pdf": "ok", "crash.pdf": "failed", "b.pdf": "ok", "c.pdf": "ok"}
+    assert "BrokenProcessPool" in reports[1]["error"]
+    assert all(os.path.exists(report["output"]) for report in reports if report["status"] == "ok")
@@ -0,0 +1,83 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+import cache
+from cache import SummaryCache, page_fingerprint
+from records import PageHeader, Heading, Bullet, Caption, PageFooter, dump_records, load_records
+
+
+def make_doc(*texts):
+    """Returns a document with one page per text."""
+    doc = fitz.open()
+    for text in texts:
+        page = doc.new_page()
+        page.insert_text((72, 100), text, fontsize=12)
+    return doc
+
+
+def test_keys_are_stable_and_depend_on_every_part(tmp_path):
+    first, second = SummaryCache(str(tmp_path / "a")), SummaryCache(str(tmp_path / "b"))
+    key = first.key("highlights", "f" * 64, {"dpi": 72, "colors": ["yellow"]})
+
+    # Not tied to the instance, its directory or the order of the parameters
+    assert second.key("highlights", "f" * 64, {"colors": ["yellow"], "dpi": 72}) == key
+    assert first.key("text", "f" * 64, {"dpi": 72, "colors": ["yellow"]}) != key
+    assert first.key("highlights", "e" * 64, {"dpi": 72, "colors": ["yellow"]}) != key
+    assert first.key("highlights", "f" * 64, {"dpi": 150, "colors": ["yellow"]}) != key
+
+
+def test_fingerprints_follow_the_page_content():
+    doc, other = make_doc("The same page."), make_doc("Another page first.", "The same page.")
+    fingerprint = page_fingerprint(doc, doc[0])
+
+    # The same page in another file shares its entries; an edit makes new ones
+    assert page_fingerprint(other, other[1]) == fingerprint
+    assert page_fingerprint(other, other[0]) != fingerprint
+    doc[0].add_highlight_annot(doc[0].search_for("same")[0])
+    assert page_fingerprint(doc, doc[0]) != fingerprint
+
+
+def test_version_bump_makes_new_keys(tmp_path, monkeypatch):
+    summary_cache = SummaryCache(str(tmp_path))
+    key = summary_cache.key("text", "f" * 64)
+    summary_cache.put(key, {"sentences": ["Old."]})
+
+    monkeypatch.setattr(cache, "CACHE_VERSION", cache.CACHE_VERSION + 1)
+    new_key = summary_cache.key("text", "f" * 64)
+
+    assert new_key != key
+    assert summary_cache.get(new_key) is None
+
+
+def test_records_round_trip(tmp_path):
+    records = [PageHeader(3), Heading("Results"), Bullet("A highlighted sentence.", "green"), Bullet("Another one."),
+               Caption("Figure 1: A figure."), PageFooter(12, 2)]
+    key = SummaryCache(str(tmp_path)).key("records", "f" * 64)
+    SummaryCache(str(tmp_path)).put(key, dump_records(records))
+
+    # Read back by another instance, as by a later run
+    loaded = load_records(SummaryCache(str(tmp_path)).get(key))
+
+    assert loaded == records
+    assert [type(record) for record in loaded] == [type(record) for record in records]
+
+
+def test_eviction_removes_the_least_recently_used(tmp_path):
+    value = "x" * 100
+    entry_size = len(f'"{value}"')
+    # Room for three entries: a fourth brings the cache back under 90% of the cap by removing one
+    summary_cache = SummaryCache(str(tmp_path), max_bytes=3 * entry_size + entry_size // 2)
+    keys = [summary_cache.key("text", name * 64) for name in "abcd"]
+    for key, last_use in zip(keys[:3], (1000, 2000, 3000)):
+        summary_cache.put(key, value)
+        os.utime(summary_cache.path(key), (last_use, last_use))
+
+    # Reading the oldest entry makes it the most recently used
+    assert summary_cache.get(keys[0]) == value
+    summary_cache.put(keys[3], value)
+
+    assert [os.path.exists(summary_cache.path(key)) for key in keys] == [True, False, True, True]
+    assert summary_cache.stats["evictions"] == 1
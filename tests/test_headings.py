@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import HeadingMatcher, attach_headings
+from records import Heading, Bullet
+
+
+def naive_occurrences(headings, text):
+    """Every occurrence of the headings in a text, found one heading and position at a time."""
+    found = [(start, start + len(heading), heading) for heading in set(headings)
+             for start in range(len(text)) if text.startswith(heading, start)]
+    return sorted(found, key=lambda occurrence: (occurrence[0], -occurrence[1]))
+
+
+def test_occurrences_match_a_naive_search():
+    headings = ["he", "she", "his", "hers", "Results", "Results and Discussion", "and"]
+    for text in ["ushers", "ahishers", "Results and Discussion", "shehe hers his and Results", ""]:
+        assert HeadingMatcher(headings).occurrences(text) == naive_occurrences(headings, text)
+
+
+def test_heading_that_ends_another_is_found_inside_it():
+    # "Methods" is only reached through the failure link of "Research Methods"
+    matcher = HeadingMatcher(["Research Methods", "Methods"])
+
+    assert matcher.occurrences("2 Research Methods") == [(2, 18, "Research Methods"), (11, 18, "Methods")]
+    assert matcher.spans("2 Research Methods") == [(2, 18, "Research Methods")]
+    assert matcher.spans("Methods of Research Methods") == [(0, 7, "Methods"), (11, 27, "Research Methods")]
+
+
+def test_overlapping_headings_keep_the_first():
+    matcher = HeadingMatcher(["Data Collection", "Collection Methods"])
+
+    assert [heading for *_, heading in matcher.occurrences("Data Collection Methods")] == ["Data Collection", "Collection Methods"]
+    assert matcher.spans("Data Collection Methods") == [(0, 15, "Data Collection")]
+
+
+def test_repeated_headings():
+    matcher = HeadingMatcher(["Results", "Results"])
+
+    assert matcher.spans("Results, then Results again") == [(0, 7, "Results"), (14, 21, "Results")]
+    assert attach_headings(["Results, then Results again."], ["Results"]) == [Heading("Results"), Bullet(", then  again.")]
+
+
+def test_attach_headings_emits_only_the_outermost_heading():
+    attached = attach_headings(["Research Methods We ran a survey.", "Methods were compared."], ["Methods", "Research Methods"], colors=["yellow", "green"])
+
+    assert attached == [Heading("Research Methods"), Bullet(" We ran a survey.", "yellow"), Heading("Methods"), Bullet(" were compared.", "green")]
+
+
+def test_attach_headings_without_headings():
+    assert attach_headings(["A sentence."], []) == [Bullet("A sentence.")]
+    assert attach_headings(["A sentence."], ["Introduction"]) == [Bullet("A sentence.")]
@@ -0,0 +1,72 @@
+import os
+import sys
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+import pytest
+from main import get_summary
+from manifest import SummaryManifest
+
+
+SENTENCES = ["The first sentence of page {} is highlighted.", "The second sentence of page {} is not.", "The third sentence of page {} is highlighted too."]
+
+
+def make_pdf(path, pages=4):
+    """Writes a document whose pages each have three sentences, the first and last highlighted."""
+    doc = fitz.open()
+    for page_num in range(1, pages + 1):
+        page = doc.new_page()
+        for i, sentence in enumerate(SENTENCES):
+            page.insert_text((72, 100 + 20 * i), sentence.format(page_num), fontsize=11)
+        for sentence in (SENTENCES[0], SENTENCES[2]):
+            page.add_highlight_annot(page.search_for(sentence.format(page_num))[0])
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def summarize(pdf_path, manifest_path=None, **options):
+    """Summarizes a document, with a manifest if a path is given, and returns its records and the reused page numbers."""
+    reports = []
+    with fitz.open(pdf_path) as doc:
+        manifest = SummaryManifest(manifest_path) if manifest_path else None
+        records = get_summary(doc, show_progress=False, manifest=manifest, page_reports=reports, **options)
+    return records, [report["page"] for report in reports if report["reused"]]
+
+
+def test_only_the_edited_page_is_summarized_again(tmp_path):
+    pdf_path, manifest_path = make_pdf(str(tmp_path / "doc.pdf")), str(tmp_path / "doc.json")
+    _, reused = summarize(pdf_path, manifest_path)
+    assert reused == []
+
+    # Highlight the second sentence of page 2 as well
+    with fitz.open(pdf_path) as doc:
+        page = doc[1]
+        page.add_highlight_annot(page.search_for(SENTENCES[1].format(2))[0])
+        doc.save(str(tmp_path / "edited.pdf"))
+    os.replace(tmp_path / "edited.pdf", pdf_path)
+
+    records, reused = summarize(pdf_path, manifest_path)
+    full_records, _ = summarize(pdf_path)
+
+    assert reused == [1, 3, 4]
+    assert records == full_records
+    assert any(SENTENCES[1].format(2) in record.to_text() for record in records)
+
+
+@pytest.mark.parametrize("options", [{"threshold": 80}, {"match_mode": "fuzzy"}, {"highlight_colors": ["yellow"]}])
+def test_changed_settings_invalidate_the_manifest(tmp_path, options):
+    pdf_path, manifest_path = make_pdf(str(tmp_path / "doc.pdf")), str(tmp_path / "doc.json")
+    summarize(pdf_path, manifest_path)
+    shutil.copy(manifest_path, tmp_path / "first.json")
+    _, reused = summarize(pdf_path, manifest_path)
+    assert reused == [1, 2, 3, 4]
+
+    shutil.copy(tmp_path / "first.json", manifest_path)
+    records, reused = summarize(pdf_path, manifest_path, **options)
+    full_records, _ = summarize(pdf_path, **options)
+
+    assert reused == []
+    assert records == full_records
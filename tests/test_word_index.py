@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+from utils import WordIndex
+
+
+def make_page(lines):
+    """Returns a page with one line of text per string, and its words as `page.get_text("words")` gives them."""
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, line in enumerate(lines):
+        page.insert_text((72, 100 + 20 * i), line, fontsize=12)
+    return page, page.get_text("words")
+
+
+def word_rect(words, text):
+    return fitz.Rect(next(word[:4] for word in words if word[4] == text))
+
+
+def test_partly_covered_words_are_read_whole_in_reading_order():
+    _, words = make_page(["alpha bravo charlie", "delta echo foxtrot"])
+    alpha, charlie, foxtrot = word_rect(words, "alpha"), word_rect(words, "charlie"), word_rect(words, "foxtrot")
+    # From the last 60% of "alpha" to the first 60% of "charlie", over both lines
+    box = (alpha.x1 - 0.6 * alpha.width, alpha.y0, charlie.x0 + 0.6 * charlie.width, foxtrot.y1)
+
+    assert WordIndex(words).text(box) == "alpha bravo charlie\ndelta echo foxtrot\n"
+
+
+def test_words_mostly_outside_the_box_are_left_out():
+    _, words = make_page(["alpha bravo charlie"])
+    bravo = word_rect(words, "bravo")
+    box = (bravo.x0 - 1, bravo.y0, bravo.x0 + 0.4 * bravo.width, bravo.y1)
+
+    assert WordIndex(words).text(box) == ""
+
+
+def test_half_height_marker_box_reads_its_words():
+    _, words = make_page(["alpha bravo charlie", "delta echo foxtrot"])
+    alpha, charlie = word_rect(words, "alpha"), word_rect(words, "charlie")
+    # A marker stroke over the lower half of the first line, measured a little short of it
+    box = (alpha.x0, alpha.y0 + 0.55 * alpha.height, charlie.x1, alpha.y1)
+
+    assert WordIndex(words).text(box) == "alpha bravo charlie\n"
+
+
+def test_words_in_several_cells_are_read_once():
+    _, words = make_page(["alpha bravo charlie", "delta echo foxtrot"])
+    # Cells much smaller than the words, so every word is listed in many of them
+    index = WordIndex(words, cell_size=3)
+    box = (0, 0, 612, 792)
+
+    assert [word[4] for word in index.query(box)] == ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot"]
+    assert index.text(box) == "alpha bravo charlie\ndelta echo foxtrot\n"
@@ -0,0 +1,201 @@
+import sys
+import json
+import time
+import functools
+import tracemalloc
+from contextlib import nullcontext
+
+
+class StageTimer:
+    """
+    Records the wall time, CPU time and number of calls of each stage of a run, overall and per page.
+
+    Stages nest: the time a stage spends in the stages it calls is counted for those stages only, so
+    the times of all stages add up to the time of the run. For instance a writer consuming a stream of
+    pages is only charged for the writing, not for summarizing the pages it pulls.
+
+    With `memory` on, the timer also records the peak of the memory traced by `tracemalloc` while each
+    stage runs (children included, unlike the times), and how far that peak rose above the memory in use
+    when the stage started. `tracemalloc` must be tracing, and only this process is traced.
+
+    Attributes:
+        stages (dict): `[calls, wall seconds, cpu seconds]` by stage name.
+        pages (dict): The same, by page number and then stage name.
+        page (int): The page the stages being run belong to, if any.
+        memory (dict): `[peak bytes, peak increase bytes]` by stage name, the highest of all calls, when `memory` is on.
+    """
+
+    def __init__(self, memory=False):
+        self.stages = {}
+        self.pages = {}
+        self.page = None
+        self.memory = {} if memory else None
+        self.started = time.perf_counter()
+        self._stack = []
+
+    def start(self, name, page=None):
+        """Starts timing a stage, inside the current one if any."""
+        entry = [name, self.page, time.perf_counter(), time.process_time(), 0.0, 0.0]
+        if self.memory is not None:
+            # The traced peak is global: keep the peak the outer stage reached so far before resetting it
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][7] = max(self._stack[-1][7], peak)
+            tracemalloc.reset_peak()
+            entry += [current, current]
+        self._stack.append(entry)
+        if page is not None:
+            self.page = page
+
+    def stop(self):
+        """Stops timing the innermost stage and records it."""
+        name, outer_page, start_wall, start_cpu, child_wall, child_cpu, *memory = self._stack.pop()
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        self.add(name, 1, wall - child_wall, cpu - child_cpu, self.page)
+        self.page = outer_page
+        if self._stack:
+            self._stack[-1][4] += wall
+            self._stack[-1][5] += cpu
+        if memory:
+            start_memory, peak = memory
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            recorded = self.memory.setdefault(name, [0, 0])
+            recorded[0] = max(recorded[0], peak)
+            recorded[1] = max(recorded[1], peak - start_memory)
+            if self._stack:
+                self._stack[-1][7] = max(self._stack[-1][7], peak)
+
+    def add(self, name, calls, wall, cpu, page=None):
+        """Adds calls and times to a stage, and to the stage of a page if given."""
+        targets = [self.stages] if page is None else [self.stages, self.pages.setdefault(page, {})]
+        for stages in targets:
+            entry = stages.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += calls
+            entry[1] += wall
+            entry[2] += cpu
+
+    def take_page(self, page):
+        """Removes and returns the stages recorded for a page, e.g. to send them from a worker to the main process."""
+        return self.pages.pop(page, {})
+
+    def merge_page(self, page, stages):
+        """Adds the stages of a page recorded elsewhere, see `take_page`."""
+        for name, (calls, wall, cpu) in stages.items():
+            self.add(name, calls, wall, cpu, page)
+
+    def slowest_pages(self, count=5):
+        """Returns the `count` pages with the most wall time, as (page, wall seconds, slowest stage) tuples."""
+        totals = [(page, sum(entry[1] for entry in stages.values()), max(stages, key=lambda name: stages[name][1])) for page, stages in self.pages.items() if stages]
+        return sorted(totals, key=lambda total: total[1], reverse=True)[:count]
+
+    def to_dict(self):
+        """Returns the recorded timings as a JSON serializable dict."""
+        def stage_dict(stages):
+            return {name: {"calls": calls, "wall_seconds": round(wall, 6), "cpu_seconds": round(cpu, 6)} for name, (calls, wall, cpu) in sorted(stages.items(), key=lambda item: -item[1][1])}
+
+        page_walls = sorted(sum(entry[1] for entry in stages.values()) for stages in self.pages.values())
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "stages": stage_dict(self.stages),
+            "pages": {page: stage_dict(stages) for page, stages in sorted(self.pages.items())},
+            "page_seconds": {"median": round(page_walls[len(page_walls) // 2], 6), "max": round(page_walls[-1], 6)} if page_walls else {},
+            "slowest_pages": [{"page": page, "wall_seconds": round(wall, 6), "slowest_stage": name} for page, wall, name in self.slowest_pages()],
+            **({"memory": {name: {"peak_bytes": peak, "peak_increase_bytes": increase} for name, (peak, increase) in sorted(self.memory.items(), key=lambda item: -item[1][1])}} if self.memory is not None else {}),
+        }
+
+    def save(self, path):
+        """Writes the timings to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def print_table(self, file=sys.stderr):
+        """Prints the per-stage totals and the slowest pages."""
+        data = self.to_dict()
+        total = sum(stage["wall_seconds"] for stage in data["stages"].values()) or 1
+        print(f"\n{'stage':<24}  {'calls':>7}  {'wall s':>9}  {'cpu s':>9}  {'ms/call':>9}  {'wall %':>6}", file=file)
+        for name, stage in data["stages"].items():
+            print(f"{name:<24}  {stage['calls']:>7}  {stage['wall_seconds']:>9.3f}  {stage['cpu_seconds']:>9.3f}  "
+                  f"{stage['wall_seconds'] / stage['calls'] * 1000:>9.2f}  {stage['wall_seconds'] / total * 100:>5.1f}%", file=file)
+        if data["slowest_pages"]:
+            print(f"Median page: {data['page_seconds']['median']:.3f}s. Slowest pages: " +
+                  ", ".join(f"{page['page']} ({page['wall_seconds']:.3f}s, mostly {page['slowest_stage']})" for page in data["slowest_pages"]), file=file)
+
+    def print_memory_table(self, file=sys.stderr):
+        """Prints the traced memory peak of each stage, highest increase first."""
+        print(f"\n{'stage':<24}  {'calls':>7}  {'peak MiB':>9}  {'rise MiB':>9}", file=file)
+        for name, (peak, increase) in sorted((self.memory or {}).items(), key=lambda item: -item[1][1]):
+            print(f"{name:<24}  {self.stages.get(name, [0])[0]:>7}  {peak / 2 ** 20:>9.2f}  {increase / 2 ** 20:>9.2f}", file=file)
+
+
+# The timer of this process, or None when timings are off (the default), in which case timing costs one check per call.
+_timer = None
+_null_stage = nullcontext()
+
+
+def enable_timings(enabled=True, memory=False):
+    """
+    Turns the recording of stage timings on (with a fresh `StageTimer`) or off in this process.
+
+    Arguments:
+    + enabled (bool) -- Whether to record timings (default: True).
+    + memory (bool) -- Whether to also record the traced memory peak of each stage, see `StageTimer` (default: False).
+
+    Returns:
+    + The new timer, or None.
+    """
+    global _timer
+    _timer = StageTimer(memory) if enabled else None
+    return _timer
+
+
+def get_timer():
+    """Returns the timer of this process, or None when timings are off."""
+    return _timer
+
+
+class _Stage:
+    __slots__ = ("name", "page")
+
+    def __init__(self, name, page):
+        self.name, self.page = name, page
+
+    def __enter__(self):
+        _timer.start(self.name, self.page)
+
+    def __exit__(self, *exc):
+        _timer.stop()
+
+
+def stage(name, page=None):
+    """
+    Times a block of code as a stage.
+
+    Arguments:
+    + name (str) -- The stage name.
+    + page (int) -- The page the block works on, which the stages inside it are attributed to (default: None).
+
+    Returns:
+    + A context manager; a shared no-op one when timings are off.
+    """
+    return _Stage(name, page) if _timer is not None else _null_stage
+
+
+def timed(name):
+    """
+    Decorator timing every call of a function as a stage, see `stage`.
+
+    Arguments:
+    + name (str) -- The stage name.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _timer is None:
+                return function(*args, **kwargs)
+            _timer.start(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _timer.stop()
+        return wrapper
+    return decorate
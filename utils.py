@@ -1,25 +1,45 @@
-import cv2
 import os
-import numpy as np
 import re
-import fitz
-from PIL import Image
-import io
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, HRFlowable
-from reportlab.platypus import Image as Img
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
 import time
-import shutil
+import math
+import bisect
 import threading
-from docx import Document
-from docx.shared import Pt, RGBColor
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+import importlib
+import hashlib
 import json
+from records import *
+from timings import *
+from collections import Counter, OrderedDict
+
+
+class LazyModule:
+    """
+    Stands in for a module until one of its attributes is used, and only then imports it.
+
+    The heavy dependencies (OpenCV, NumPy, PyMuPDF) take a large part of a second to import, which commands
+    such as `--version`, `split` or `merge` should not pay for what they do not use. Each attribute is
+    cached on first use, so later lookups cost the same as on the module itself. The writer and matching
+    libraries (reportlab, python-docx, PIL, RapidFuzz) are imported inside the functions that use them.
+
+    Attributes:
+        _lazy_name (str): The name of the module to import.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_lazy_name"] = name
+
+    def __getattr__(self, attribute):
+        value = getattr(importlib.import_module(self.__dict__["_lazy_name"]), attribute)
+        self.__dict__[attribute] = value
+        return value
+
+    def __repr__(self):
+        return f"<lazy module '{self.__dict__['_lazy_name']}'>"
+
+
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+fitz = LazyModule("fitz")
 
 
 
@@ -92,6 +112,233 @@ def clear_state():
         os.remove(STATE_FILE)
         print("\nCurrent State Cleared\n")
 
+# Number of `load_page` calls made per page (1-indexed) in this process, see `load_page`.
+PAGE_LOADS = Counter()
+
+@timed("load_page")
+def load_page(doc, page_number):
+    """
+    Loads a page of a PDF document and counts the load in `PAGE_LOADS`.
+
+    Args:
+        doc (fitz.Document): The PDF document object.
+        page_number (int): The page number (1-based).
+
+    Returns:
+        fitz.Page: The loaded page.
+    """
+    PAGE_LOADS[page_number] += 1
+    return doc.load_page(page_number - 1)
+
+
+class PageContext:
+    """
+    Holds a loaded page and its text layout so every summarize stage can share them.
+
+    The page is loaded once, when the context is created, and its `TextPage` is built once, on 
+    first use (pages whose stages are all read from the cache never need it). Stages that receive 
+    a context read from these instead of loading the page again, which keeps a page down to a 
+    single load however many highlight regions it has. The words of the page are also extracted 
+    once, on first use, into a `WordIndex` the text of every highlight region is read from, see 
+    `get_text_from_bbox`.
+
+    Attributes:
+        doc (fitz.Document): The PDF document object.
+        page_number (int): The page number (1-based).
+        page (fitz.Page): The loaded page.
+        textpage (fitz.TextPage): The text layout of the page, built with the default text flags.
+        words (WordIndex): The positioned words of the page.
+    """
+
+    def __init__(self, doc, page_number):
+        self.doc = doc
+        self.page_number = page_number
+        self.page = load_page(doc, page_number)
+        self._textpage = None
+        self._text = None
+        self._words = None
+
+    @property
+    def textpage(self):
+        """The text layout of the page, built on first use."""
+        if self._textpage is None:
+            with stage("textpage"):
+                self._textpage = self.page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+        return self._textpage
+
+    @property
+    def text(self):
+        """The plain text of the page, extracted from the cached text layout on first use."""
+        if self._text is None:
+            self._text = self.page.get_text(textpage=self.textpage)
+        return self._text
+
+    @property
+    def words(self):
+        """The words of the page in a spatial index, extracted from the cached text layout on first use."""
+        if self._words is None:
+            with stage("word_index"):
+                self._words = WordIndex(self.page.get_text("words", textpage=self.textpage))
+        return self._words
+
+
+# Word lookup: the side of the square cells of a `WordIndex`, in points (about two lines of body text, so a 
+# highlight box covers a handful of cells), and the shares of a word's width and height a box must cover for the 
+# word to be read. The height share is low because marker highlights only cover the lower half of a line.
+WORD_INDEX_CELL_SIZE = 24
+WORD_MIN_COVERED_WIDTH = 0.5
+WORD_MIN_COVERED_HEIGHT = 0.25
+
+
+class WordIndex:
+    """
+    The words of a page in a uniform grid, to read the text under any number of boxes from a single extraction.
+
+    Each word is listed in every grid cell its rectangle touches, so the words under a box are found by 
+    looking up only the cells the box covers instead of extracting the text of the box from the page. A word 
+    is read whole when the box covers at least `WORD_MIN_COVERED_WIDTH` of its width and `WORD_MIN_COVERED_HEIGHT` 
+    of its height, and not at all otherwise, where a clipped extraction would keep the characters inside the box 
+    and cut the word.
+
+    Attributes:
+        words (list): The words of the page, as returned by `page.get_text("words")`: (x0, y0, x1, y1, word, 
+                      block, line, word number) tuples.
+        cell_size (float): The side of the grid cells in points.
+    """
+
+    def __init__(self, words, cell_size=WORD_INDEX_CELL_SIZE):
+        self.words = words
+        self.cell_size = cell_size
+        self._cells = {}
+        for i, word in enumerate(words):
+            for cell in self._cells_of(word[:4]):
+                self._cells.setdefault(cell, []).append(i)
+
+    def _cells_of(self, rect):
+        x0, y0, x1, y1 = (math.floor(value / self.cell_size) for value in rect)
+        return ((column, row) for row in range(y0, y1 + 1) for column in range(x0, x1 + 1))
+
+    def query(self, bbox):
+        """Returns the words under a box (x1, y1, x2, y2) in PDF points, in reading order."""
+        x0, y0, x1, y1 = bbox
+        found = set()
+        for cell in self._cells_of(bbox):
+            for i in self._cells.get(cell, ()):
+                wx0, wy0, wx1, wy1 = self.words[i][:4]
+                if min(x1, wx1) - max(x0, wx0) >= WORD_MIN_COVERED_WIDTH * (wx1 - wx0) and \
+                   min(y1, wy1) - max(y0, wy0) >= WORD_MIN_COVERED_HEIGHT * (wy1 - wy0):
+                    found.add(i)
+        # The word numbers of `get_text("words")` follow the reading order of the text layout
+        return [self.words[i] for i in sorted(found, key=lambda i: self.words[i][5:8])]
+
+    def text(self, bbox):
+        """Returns the text under a box like `page.get_text("text", clip=...)` does: one line per text line."""
+        lines, last = [], None
+        for word in self.query(bbox):
+            if word[5:7] != last:
+                lines.append([])
+                last = word[5:7]
+            lines[-1].append(word[4])
+        return "".join(" ".join(line) + "\n" for line in lines)
+
+
+# The highlight colours told apart (see `HighlightClassifier`), each with its HSV range as [H_min, H_max, S_min, 
+# S_max, V_min, V_max] on OpenCV's scale (H 0-179, S and V 0-255) and the RGB colour it is shown with in the 
+# summaries. Orange, yellow and green split the single hue band 0-65 highlights were detected in before; blue and 
+# pink only take light colours, so that links and coloured text are not read as highlights.
+HIGHLIGHT_CLASSES = {
+    "orange": ([0, 23, 59, 255, 0, 255], (255, 165, 0)),
+    "yellow": ([24, 35, 59, 255, 0, 255], (255, 215, 0)),
+    "green": ([36, 65, 59, 255, 0, 255], (50, 205, 50)),
+    "blue": ([86, 130, 59, 230, 150, 255], (30, 144, 255)),
+    "pink": ([131, 179, 59, 230, 150, 255], (255, 105, 180)),
+}
+
+# The colours looked for unless others are asked for: those of the former hue band. Blue and pink are opt-in, since 
+# light blue and pink also fill table cells, boxes and shading that are not highlights.
+DEFAULT_HIGHLIGHT_COLORS = ("orange", "yellow", "green")
+
+
+class HighlightClassifier:
+    """
+    Labels every pixel of an image with its highlight colour in one pass, whatever the number of colours.
+
+    Each colour is a box in HSV space, so a pixel belongs to a colour when its hue, saturation and value 
+    each fall in the colour's range. Three 256-entry lookup tables map each channel value to the bit mask 
+    of the colours whose range holds it; the bitwise AND of the three masks gives the colours of the pixel, 
+    and a fourth table maps that to the label of the first one. Labelling an image costs a colour conversion, 
+    four table lookups and two ANDs per pixel for up to 8 colours, instead of one `detectColor` pass per colour 
+    (a single colour takes one range check).
+
+    Attributes:
+        names (list): The colour names; label `i` is `names[i - 1]`, and 0 is no highlight.
+    """
+
+    def __init__(self, colors=None):
+        colors = list(colors or DEFAULT_HIGHLIGHT_COLORS)
+        unknown = [name for name in colors if name not in HIGHLIGHT_CLASSES]
+        if unknown or not 1 <= len(colors) <= 8:
+            raise ValueError(f"Highlight colours must be 1 to 8 of {', '.join(HIGHLIGHT_CLASSES)}, not {', '.join(colors)}.")
+        self.names = colors
+
+        values = np.arange(256)
+        self._channel_luts = [np.zeros(256, np.uint8) for _ in range(3)]
+        for bit, name in enumerate(colors):
+            hsv = HIGHLIGHT_CLASSES[name][0]
+            for channel, lut in enumerate(self._channel_luts):
+                lut[(values >= hsv[2 * channel]) & (values <= hsv[2 * channel + 1])] |= 1 << bit
+        # The label of a bit mask is its lowest set bit, plus one
+        self._label_lut = np.array([(mask & -mask).bit_length() for mask in range(256)], np.uint8)
+
+    @timed("highlightLabels")
+    def labels(self, img):
+        """
+        Labels the pixels of a BGR image.
+
+        Returns:
+            tuple: The label image (uint8, see `names`) and the HSV image (imgHSV).
+        """
+        imgHSV = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        if len(self.names) == 1:
+            # One range check is cheaper than the tables for a single colour
+            hsv = HIGHLIGHT_CLASSES[self.names[0]][0]
+            return cv2.min(cv2.inRange(imgHSV, np.array(hsv[0::2]), np.array(hsv[1::2])), 1), imgHSV
+        hue, saturation, value = cv2.split(imgHSV)
+        masks = cv2.bitwise_and(cv2.LUT(hue, self._channel_luts[0]), cv2.LUT(saturation, self._channel_luts[1]))
+        masks = cv2.bitwise_and(masks, cv2.LUT(value, self._channel_luts[2]))
+        return cv2.LUT(masks, self._label_lut), imgHSV
+
+    def region_color(self, labels, box):
+        """Returns the name of the most frequent colour inside a box (x1, y1, x2, y2) of a label image, or None."""
+        x1, y1, x2, y2 = box
+        counts = np.bincount(labels[y1:y2, x1:x2].ravel(), minlength=len(self.names) + 1)[1:]
+        return self.names[int(counts.argmax())] if counts.any() else None
+
+    def rgb_color(self, rgb):
+        """Returns the name of the colour of an (r, g, b) tuple of floats in [0, 1], e.g. an annotation's colour, or None."""
+        pixel = np.uint8([[[round(255 * rgb[2]), round(255 * rgb[1]), round(255 * rgb[0])]]])
+        label = int(self.labels(pixel)[0][0, 0])
+        return self.names[label - 1] if label else None
+
+
+_highlight_classifiers = {}
+
+def highlight_classifier(colors=None):
+    """
+    Returns the `HighlightClassifier` of the given colour names (default: `DEFAULT_HIGHLIGHT_COLORS`), built once per process.
+    """
+    key = tuple(colors or DEFAULT_HIGHLIGHT_COLORS)
+    if key not in _highlight_classifiers:
+        _highlight_classifiers[key] = HighlightClassifier(key)
+    return _highlight_classifiers[key]
+
+# Segmentation of the highlight masks in `getHighlightedText` (see `getMaskRegions`): the smallest bounding box 
+# of a highlight in square points, and the size in points of the closing that fills the glyphs printed over it.
+HIGHLIGHT_MIN_AREA = 300
+HIGHLIGHT_CLOSE_SIZE = 3
+
+
+@timed("detectColor")
 def detectColor(img, hsv, show_process=False):
     """
     Detects a specific color range in the provided image and returns the result.
@@ -119,6 +366,7 @@ def detectColor(img, hsv, show_process=False):
     return imgResult, imgHSV
 
 
+@timed("getContours")
 def getContours(img, imgDraw, showCanny=False, minArea=1000, filter=0, cThr=[100, 100], draw=True):
     """
     Detects contours in an image and optionally draws bounding boxes around them.
@@ -177,6 +425,71 @@ def getContours(img, imgDraw, showCanny=False, minArea=1000, filter=0, cThr=[100
 
 
 
+@timed("detectDrawnHighlights")
+def detectDrawnHighlights(page, hsv=None, minArea=50, maxAreaRatio=0.5, classifier=None):
+    """
+    Detects highlights drawn as filled rectangles in a page's vector drawings.
+
+    Some authoring tools draw highlights as (semi-transparent) filled rectangles instead of annotations. 
+    This function reads the page's drawing commands and keeps the filled rectangles whose colour, as seen 
+    over a white page, falls inside the given HSV range, or in one of the colours of a `HighlightClassifier`. 
+    The boxes are already in PDF coordinates, so they can be passed to `get_text_from_bbox` without any 
+    pixel to point mapping.
+
+    Args:
+        page (fitz.Page): The page whose drawings are read.
+        hsv (list, optional): A list of six integers representing the HSV color range: 
+                    [H_min, H_max, S_min, S_max, V_min, V_max]. Not used with a `classifier`. Default is None.
+        minArea (int, optional): The minimum area, in square points, of a rectangle to consider. Default is 50.
+        maxAreaRatio (float, optional): Rectangles covering more than this fraction of the page are treated 
+                                        as backgrounds, not highlights. Default is 0.5.
+        classifier (HighlightClassifier, optional): If given, the rectangles of any of its colours are kept, each 
+                                        with the name of its colour. Default is None.
+
+    Returns:
+        list: A list of tuples, where each tuple represents the coordinates of a bounding box (x1, y1, x2, y2), 
+              sorted from top to bottom like the output of `getContours`. With a `classifier`, a list of 
+              (bounding box, colour name) tuples instead.
+    """
+    if classifier is None:
+        lower = np.array([hsv[0], hsv[2], hsv[4]])
+        upper = np.array([hsv[1], hsv[3], hsv[5]])
+    maxArea = page.rect.get_area() * maxAreaRatio
+
+    roiList = []
+    for drawing in page.get_drawings():
+        fill = drawing.get("fill")
+        if not fill or len(fill) != 3:
+            continue
+
+        # Blend the fill with the white page, as it would appear on a rendered image
+        opacity = drawing.get("fill_opacity")
+        opacity = 1 if opacity is None else opacity
+        rgb = [opacity * c + (1 - opacity) for c in fill]
+        if classifier is not None:
+            color = classifier.rgb_color(rgb)
+            if color is None:
+                continue
+        else:
+            pixel = np.uint8([[[round(255 * rgb[2]), round(255 * rgb[1]), round(255 * rgb[0])]]])
+            pixelHSV = cv2.cvtColor(pixel, cv2.COLOR_BGR2HSV)[0, 0]
+            if not (np.all(pixelHSV >= lower) and np.all(pixelHSV <= upper)):
+                continue
+
+        for item in drawing["items"]:
+            if item[0] == "re":
+                rect = fitz.Rect(item[1])
+            elif item[0] == "qu":
+                rect = fitz.Quad(item[1]).rect
+            else:
+                continue
+            if minArea <= rect.get_area() <= maxArea:
+                roi = (rect.x0, rect.y0, rect.x1, rect.y1)
+                roiList.append((roi, color) if classifier is not None else roi)
+
+    return sorted(roiList, key=lambda roi: roi[0][1] if classifier is not None else roi[1])
+
+
 def getRoi(contours):
     """
     Extracts the regions of interest (ROIs) from the given contours.
@@ -198,26 +511,82 @@ def getRoi(contours):
     return roiList
 
 
-def get_text_from_bbox(doc, page_number, bbox):
+@timed("highlightMask")
+def highlightMask(img, hsv):
+    """
+    Computes the binary mask of the pixels of an image inside a colour range.
+
+    Unlike `detectColor`, the masked colour image is not built, as `getMaskRegions` works on the mask itself.
+
+    Args:
+        img (np.ndarray): The input image in BGR color space (NumPy array).
+        hsv (list): A list of six integers representing the HSV color range: 
+                    [H_min, H_max, S_min, S_max, V_min, V_max].
+
+    Returns:
+        tuple: A tuple containing the mask (255 inside the range, 0 elsewhere) and the HSV image (imgHSV).
+    """
+    imgHSV = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(imgHSV, np.array([hsv[0], hsv[2], hsv[4]]), np.array([hsv[1], hsv[3], hsv[5]]))
+    return mask, imgHSV
+
+
+@timed("getMaskRegions")
+def getMaskRegions(mask, minArea=HIGHLIGHT_MIN_AREA, closeSize=HIGHLIGHT_CLOSE_SIZE):
+    """
+    Finds the boxes of the regions of a binary mask, e.g. the highlights found by `highlightMask`.
+
+    One morphological closing fills the holes the text printed over a highlight leaves in its mask, and 
+    the connected components of the result give the boxes with their statistics in a single pass, where 
+    `getContours` needs a blur, Canny edges, a dilation, a closing and a polygon fit per contour. The boxes 
+    are those of the highlighted pixels, not grown by the edge dilation.
+
+    Args:
+        mask (np.ndarray): The binary mask (single channel, nonzero inside the regions).
+        minArea (int, optional): The smallest bounding box area, in pixels, of a region to keep. Default is `HIGHLIGHT_MIN_AREA`.
+        closeSize (int, optional): The side, in pixels, of the square closing kernel; 1 or less skips the closing. Default is `HIGHLIGHT_CLOSE_SIZE`.
+
+    Returns:
+        list: A list of tuples, where each tuple represents the coordinates of a bounding box (x1, y1, x2, y2), 
+              sorted from top to bottom like the output of `getRoi`.
+    """
+    if closeSize > 1:
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((closeSize, closeSize), np.uint8))
+    try:
+        # 16-bit labels take a third of the time of 32-bit ones on a page, and a page's highlights never come near 65,535
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8, ltype=cv2.CV_16U)
+    except cv2.error:
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8, ltype=cv2.CV_32S)
+
+    # Row 0 is the background
+    roiList = [(int(x), int(y), int(x + w), int(y + h)) for x, y, w, h, _ in stats[1:] if w * h >= minArea]
+    return sorted(roiList, key=lambda roi: roi[1])
+
+
+@timed("get_text_from_bbox")
+def get_text_from_bbox(doc, page_number, bbox, page_ctx=None):
     """
     Extracts text from a specific region of a page within a PDF document.
 
-    This function extracts the text from the area defined by a bounding box (`bbox`) on a specific page 
-    of the PDF document.
+    This function reads the text from the area defined by a bounding box (`bbox`) on a specific page 
+    of the PDF document, as the whole words the box covers, from the `WordIndex` of the page. When a 
+    `PageContext` is given, its index is reused, so the words of a page are extracted once however many 
+    boxes are read from it.
 
     Args:
         doc (fitz.Document): The PDF document object.
         page_number (int): The page number (1-based).
         bbox (tuple): The bounding box coordinates (x1, y1, x2, y2) from which text will be extracted.
+        page_ctx (PageContext, optional): The shared context of the page. Default is None.
 
     Returns:
         str: The extracted text from the specified bounding box.
     """
-    # Load the specified page (note: page_number is 1-based)
-    page = doc.load_page(page_number - 1)
+    # Load the specified page (note: page_number is 1-based), unless it is already loaded
+    page_ctx = page_ctx if page_ctx is not None else PageContext(doc, page_number)
     
-    # Get text from the specified bounding box area
-    text = page.get_text("text", clip=fitz.Rect(bbox))
+    # Get the words under the specified bounding box area
+    text = page_ctx.words.text(tuple(bbox))
     return text
 
 
@@ -240,28 +609,32 @@ def roiDisplay(roiList, show_process=False):
         cv2.imshow(f"Cropped Image {x}", roi) if show_process else ""
 
 
-def save_to_txt(highlightedText, result_name, clear_after_wards=True, images_folder_path='tmp-images'):
+@timed("save_to_txt")
+def save_to_txt(highlightedText, result_name, color_tags=False):
     """
-    Saves a list of highlighted text to a specified text file and optionally clears the images folder.
+    Saves a list of highlighted text to a specified text file.
 
     Arguments:
-    highlightedText -- A list of strings representing the highlighted text to be saved.
+    highlightedText -- A list of summary records (or strings) representing the highlighted text to be saved. Records are written with their text rendering.
     result_name -- The name of the output text file. Defaults to "Result.txt" if not provided.
-    clear_after_wards -- A boolean flag indicating whether to clear the images folder after saving. Defaults to True.
-    images_folder_path -- Path to the images folder to clear, if applicable. Defaults to 'tmp-images'.
+    color_tags -- A boolean flag to prefix each highlighted sentence with its highlight colour, e.g. "[green] ...". Defaults to False.
 
     Functionality:
-    - Writes each entry of `highlightedText` to a new line in the specified file.
-    - Clears the images folder if `clear_after_wards` is True.
+    - Writes each entry of `highlightedText` to a new line in the specified file, as the entries arrive, 
+      so `highlightedText` can be a stream of records from `get_summary(..., stream=True)`.
+    - Flushes the file at the end of every page, so a failed run keeps the pages written before it.
 
     Returns:
     None
     """
     with open(result_name or "Result.txt", 'w') as f:
         for text in highlightedText:
-            f.writelines(f'\n{text}')
-    if clear_after_wards:
-        clear_images_folder(images_folder_path)
+            if color_tags and isinstance(text, Bullet) and text.color:
+                f.writelines(f'\n[{text.color}] {text}')
+            else:
+                f.writelines(f'\n{text}')
+            if isinstance(text, PageFooter):
+                f.flush()
 
 
 def stackImages(scale, imgArray):
@@ -366,17 +739,72 @@ def split_pdf(input_pdf, output_path, start_page=None, end_page=None):
         return 
 
 
-def pdf_page_to_image(doc, page_number):    
+@timed("render")
+def render_page(page, dpi=72, colorspace="rgb", clip=None):
+    """
+    Renders a loaded PDF page straight into a NumPy array.
+
+    Arguments:
+    page -- The `fitz.Page` to render.
+    dpi -- The rendering resolution. 72 dpi maps one pixel to one PDF point. Defaults to 72.
+    colorspace -- "rgb" for a 3-channel BGR image or "gray" for a single-channel image. Defaults to "rgb".
+    clip -- The part of the page to render, as a rectangle in PDF points, or None for the whole page. 
+            Pixel (0, 0) is then its top-left corner, see `pixel_box_to_points`. Defaults to None.
+
+    Functionality:
+    - Renders the page (or the clip) to a pixmap at the requested zoom (`dpi / 72`) and colorspace.
+    - Wraps the pixmap's sample buffer as a NumPy array in place, without a PNG encode/decode round-trip.
+    - Makes exactly one copy: the RGB to BGR conversion, or a plain copy for gray images, 
+      so the returned array does not outlive the pixmap's buffer.
+
+    Returns:
+    A NumPy array of shape (height, width, 3) in BGR order, or (height, width) for gray images.
+    """
+    if colorspace not in ("rgb", "gray"):
+        raise ValueError(f"Unsupported colorspace '{colorspace}'. Use 'rgb' or 'gray'.")
+
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY if colorspace == "gray" else fitz.csRGB, alpha=False, clip=clip)
+
+    # View the samples in place; rows may be padded to `stride` bytes
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width * pix.n]
+
+    if colorspace == "gray":
+        return samples.copy()
+
+    # Convert RGB to BGR (OpenCV uses BGR format)
+    return cv2.cvtColor(samples.reshape(pix.height, pix.width, pix.n), cv2.COLOR_RGB2BGR)
+
+
+def pixel_box_to_points(box, zoom, origin=(0, 0)):
+    """
+    Maps a box from the pixels of a rendered page (or clip) back to PDF points.
+
+    Arguments:
+    box -- The box as (x1, y1, x2, y2) pixels.
+    zoom -- The pixels per PDF point of the rendering (its dpi / 72).
+    origin -- The top-left corner of the rendered clip in PDF points, or (0, 0) for a whole page. Defaults to (0, 0).
+
+    Returns:
+    The box as an (x1, y1, x2, y2) tuple of PDF points.
+    """
+    x1, y1, x2, y2 = box
+    return (origin[0] + x1 / zoom, origin[1] + y1 / zoom, origin[0] + x2 / zoom, origin[1] + y2 / zoom)
+
+
+def pdf_page_to_image(doc, page_number, page_ctx=None, dpi=72, colorspace="rgb"):    
     """
     Converts a specific page of a PDF document to an OpenCV-compatible image.
 
     Arguments:
     doc -- The `fitz.Document` object representing the PDF.
     page_number -- The page number (1-indexed) to convert to an image.
+    page_ctx -- The shared `PageContext` of the page, if one is available. Defaults to None.
+    dpi -- The rendering resolution. Defaults to 72 (one pixel per PDF point).
+    colorspace -- "rgb" for a BGR image or "gray" for a single-channel image. Defaults to "rgb".
 
     Functionality:
-    - Loads the specified page and converts it to a pixmap.
-    - Converts the pixmap to a NumPy array in BGR format for OpenCV.
+    - Loads the specified page and renders it with `render_page`.
 
     Returns:
     A NumPy array representing the page as an image, or None if the page number is invalid.
@@ -386,20 +814,10 @@ def pdf_page_to_image(doc, page_number):
         print("Invalid page number!")
         return None
     
-    # Get the specified page (0-indexed, so subtract 1)
-    page = doc.load_page(page_number - 1)
-    
-    # Convert the page to a pixmap (image)
-    pix = page.get_pixmap()
-    
-    # Convert the pixmap to a PIL image
-    pil_image = Image.open(io.BytesIO(pix.tobytes()))
-    rgb_array = np.array(pil_image)
+    # Reuse the already loaded page when possible
+    page = page_ctx.page if page_ctx is not None else load_page(doc, page_number)
 
-    # Convert RGB to BGR (OpenCV uses BGR format)
-    bgr_image = cv2.cvtColor(rgb_array, cv2.COLOR_RGB2BGR)
-
-    return bgr_image
+    return render_page(page, dpi=dpi, colorspace=colorspace)
 
 
 def save_image(image, output_image_path):
@@ -417,9 +835,13 @@ def save_image(image, output_image_path):
     Returns:
     None
     """
+    from PIL import Image
+
     if image is not None:
         # Convert numpy array (OpenCV format) to PIL.Image if needed
-        if isinstance(image, np.ndarray):
+        if isinstance(image, np.ndarray) and image.ndim == 2:
+            image = Image.fromarray(image)  # Gray images need no channel swap
+        elif isinstance(image, np.ndarray):
             image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))  # Convert BGR to RGB
         image.save(output_image_path)
         print(f"Image saved to {output_image_path}")
@@ -428,27 +850,65 @@ def save_image(image, output_image_path):
 
 
 
-def save_to_pdf(results, filename, images_folder_path='tmp-images', clear_after_wards=True):
+class StreamingFlowables(list):
+    """
+    A list of reportlab flowables that refills itself from an iterator while a document is built.
+
+    `BaseDocTemplate.build` consumes its flowables from the front of the list, checking `len()` before 
+    each one. This list keeps at most `chunk_size` flowables and tops itself up from `flowables` 
+    whenever that check finds it at half of that or less, so a long document never has all its 
+    flowables in memory at once.
+
+    Attributes:
+        chunk_size (int): The most flowables held at a time.
+    """
+
+    def __init__(self, flowables, chunk_size=200):
+        super().__init__()
+        self.chunk_size = chunk_size
+        self._source = iter(flowables)
+        self._exhausted = False
+        self._refill()
+
+    def _refill(self):
+        while not self._exhausted and list.__len__(self) < self.chunk_size:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._exhausted = True
+
+    def __len__(self):
+        if list.__len__(self) <= self.chunk_size // 2:
+            self._refill()
+        return list.__len__(self)
+
+
+@timed("save_to_pdf")
+def save_to_pdf(results, filename):
     """
     Saves text and images as a formatted PDF document.
 
     Arguments:
-    results -- A list containing text, headings, and image file paths to include in the PDF.
+    results -- A list of summary records (see `records.py`) to include in the PDF. Old string-based lists are converted with `from_legacy`.
     filename -- The name of the output PDF file.
-    images_folder_path -- Path to the folder containing images, if applicable. Defaults to 'tmp-images'.
-    clear_after_wards -- A boolean flag to clear the images folder after saving. Defaults to True.
 
     Functionality:
-    - Formats text and images into a styled PDF.
-    - Handles headings, bullet points, and image captions.
-    - Clears the images folder if `clear_after_wards` is True.
+    - Formats text and images into a styled PDF, choosing the element for each record from its type.
+    - Consumes `results` lazily through `StreamingFlowables`, so it can be a stream of records from 
+      `get_summary(..., stream=True)` and only a bounded chunk of flowables is held at any time.
+    - Handles headings, bullet points, images, image captions, page headers and footers.
 
     Returns:
     None
     """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, HRFlowable
+    from reportlab.platypus import Image as Img
+
     # Create the PDF document
     doc = SimpleDocTemplate(filename, pagesize=letter)
-    elements = []
 
     # Get default styles
     styles = getSampleStyleSheet()
@@ -478,74 +938,56 @@ def save_to_pdf(results, filename, images_folder_path='tmp-images', clear_after_
         bulletSymbol="◉",
     )
 
-    # Iterate over the results and add them as paragraphs
-    i = 0
-    while i < len(results):
-        item = results[i]
-
-        # Check if the item is a heading or normal text
-        if "#######" in item:
-            heading = item.split("#######")[1].split("##############")[0].strip()
-            elements.append(Paragraph(heading, heading_style))
-        else:
-            # Handle Image Embedding
-            if os.path.isfile(item):
+    def record_elements(records):
+        """Yields the flowables of each record, as the records arrive."""
+        for item in records:
+            elements = []
+            if isinstance(item, Heading):
+                elements.append(Paragraph(item.text, heading_style))
+            elif isinstance(item, Bullet):
+                # The bullet takes the colour of the highlight
+                symbol = f'<font color="#{bytes(HIGHLIGHT_CLASSES[item.color][1]).hex()}">◉</font>' if item.color in HIGHLIGHT_CLASSES else "◉"
+                elements.append(Paragraph(f"{symbol}   {item.text}", bullet_style))
+            elif isinstance(item, ImageRecord):
                 # Embed the image
-                img_path = item
                 img_width = 200
                 img_height = 200
-                img = Img(img_path, width=img_width, height=img_height)  # Correct way to instantiate Image class
-                elements.append(img)
-
-                # Check if the next line is a caption for the image
-                if i + 1 < len(results) and "Figure" in results[i + 1]:
-                    caption = results[i + 1]
-                    caption_style = getSampleStyleSheet()["Normal"]
-                    elements.append(Paragraph(f"<i>{caption}</i>", caption_style))
-                    i += 1  # Skip the next item since it's the caption
-
-            elif item == "\n\n==============================================================\n\n":
+                elements.append(Img(item.source, width=img_width, height=img_height))  # Correct way to instantiate Image class
+            elif isinstance(item, Caption):
+                caption_style = getSampleStyleSheet()["Normal"]
+                elements.append(Paragraph(f"<i>{item.text}</i>", caption_style))
+            elif isinstance(item, PageHeader):
+                create_header_footer(elements, item.to_text())
+            elif isinstance(item, PageFooter):
+                create_header_footer(elements, item.counts_text, is_footer=True)
                 elements.append(Spacer(1, 12))  # Adds space before the line
 
                 # Add a horizontal line
                 line = HRFlowable(width="100%", color=colors.black, thickness=1)
                 elements.append(line)
                 elements.append(Spacer(1, 12))  # Add space after the line
-            elif re.match(r"^Page \d+:$", item):
-                create_header_footer(elements, item)
-            elif re.match(r"\n\nOriginal Text Length \d+\n' {6}\| {6}\nHighlighted Text Count: \d+", item):
-                create_header_footer(elements, item, is_footer=True)
-            else:
-                # Add bullet points or other text
-                elements.append(Paragraph(f"◉   {item}", bullet_style))
-
-        i += 1
+            yield from elements
 
-    # Build the PDF
-    doc.build(elements)
+    # Build the PDF, pulling the flowables from the records in bounded chunks
+    doc.build(StreamingFlowables(record_elements(from_legacy(results))))
 
-    # Optional: Clear the images folder if specified
-    if clear_after_wards:
-        clear_images_folder(images_folder_path)
 
-
-def detectImages(img):
+@timed("detectImageRegions")
+def detectImageRegions(img, minArea=1000):
     """
-    Detects and highlights regions of interest (e.g., objects) in an image.
+    Finds the bounding boxes of the regions of interest (e.g., pictures) in an image.
 
     Arguments:
     img -- The input image in BGR format.
+    minArea -- The smallest contour area, in pixels, of a region. Defaults to 1000.
 
     Functionality:
     - Converts the image to grayscale.
     - Detects edges and contours.
     - Filters contours by area and aspect ratio to identify regions of interest.
-    - Draws rectangles around detected regions and returns cropped regions.
 
     Returns:
-    A tuple containing:
-    - The original image with rectangles drawn around detected regions.
-    - A list of cropped image regions.
+    A list of `(x, y, w, h)` bounding boxes, in pixels.
     """
     # Convert to grayscale
     imgGray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
@@ -560,19 +1002,42 @@ def detectImages(img):
     # Find contours
     contours, _ = cv2.findContours(imgDilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-    imgContours = img.copy()
-    imageRegions = []
-
+    regions = []
     for contour in contours:
         area = cv2.contourArea(contour)
-        if area > 1000:  # Adjust the area threshold based on your use case
+        if area > minArea:  # Adjust the area threshold based on your use case
             x, y, w, h = cv2.boundingRect(contour)
             aspectRatio = w / float(h)
 
             # Filter based on aspect ratio or size if needed
             if 0.5 < aspectRatio < 3:  # Adjust aspect ratio range
-                cv2.rectangle(imgContours, (x, y), (x + w, y + h), (255, 0, 255), 2)
-                imageRegions.append(img[y:y+h, x:x+w])  # Crop image regions
+                regions.append((x, y, w, h))
+
+    return regions
+
+
+def detectImages(img):
+    """
+    Detects and highlights regions of interest (e.g., objects) in an image.
+
+    Arguments:
+    img -- The input image in BGR format.
+
+    Functionality:
+    - Finds the regions with `detectImageRegions`.
+    - Draws rectangles around detected regions and returns cropped regions.
+
+    Returns:
+    A tuple containing:
+    - The original image with rectangles drawn around detected regions.
+    - A list of cropped image regions.
+    """
+    imgContours = img.copy()
+    imageRegions = []
+
+    for x, y, w, h in detectImageRegions(img):
+        cv2.rectangle(imgContours, (x, y), (x + w, y + h), (255, 0, 255), 2)
+        imageRegions.append(img[y:y+h, x:x+w])  # Crop image regions
 
     return imgContours, imageRegions
 
@@ -613,16 +1078,18 @@ def contains_number_pattern(string, caption=False):
 
 
 
-def getTextFromPDFAsParagraphs(doc, page_number):
+@timed("page_text")
+def getTextFromPDFAsParagraphs(doc, page_number, page_ctx=None):
     """
     Extracts text from a specific page of a PDF document and splits it into paragraphs.
 
     Arguments:
     doc -- The `fitz.Document` object representing the PDF.
     page_number -- The page number (1-indexed) from which to extract text.
+    page_ctx -- The shared `PageContext` of the page, if one is available. Defaults to None.
 
     Functionality:
-    - Loads the specified page and extracts its text.
+    - Loads the specified page and extracts its text, or reads it from `page_ctx`.
     - Splits the text into two forms of paragraphs:
       - `paragraphsForNormal`: Normalized by replacing newlines with spaces.
       - `paragraphsForHeadings`: Retains newline characters for accurate heading extraction.
@@ -632,13 +1099,348 @@ def getTextFromPDFAsParagraphs(doc, page_number):
     - `paragraphsForNormal`: A list of cleaned paragraphs.
     - `paragraphsForHeadings`: A list of raw paragraphs for heading analysis.
     """
-    text = doc.load_page(page_number-1).get_text()
+    text = page_ctx.text if page_ctx is not None else load_page(doc, page_number).get_text()
     paragraphsForNormal = [i.replace("\n", " ").strip() for i in text.split('. ') if i.replace("\n", " ").strip()]
     paragraphsForHeadings = [i.strip() for i in text.split('. ') if i.strip()]
     return paragraphsForNormal, paragraphsForHeadings
 
 
 
+# Characters 128-255 are dropped before matching, as `thefuzz` does with `force_ascii`.
+NON_ASCII_TABLE = {i: None for i in range(128, 256)}
+
+@timed("match_highlights")
+def match_highlights(highlights, sentences, threshold=50, limit=5, return_sources=False):
+    """
+    Matches highlighted text against the sentences of a page with one vectorized score matrix.
+
+    This computes the same matches as calling `thefuzz.process.extract(highlight, sentences, 
+    scorer=fuzz.token_sort_ratio)` for every highlight and keeping the matches scoring at least 
+    `threshold`, but scores all highlights against all sentences in a single RapidFuzz `cdist` call. 
+    Every string is preprocessed once, and scores that cannot reach the threshold are cut off early.
+
+    Arguments:
+    highlights -- A list of highlighted text fragments.
+    sentences -- A list of the page's sentences to match against.
+    threshold -- Minimum similarity score (0-100) a match needs. Defaults to 50.
+    limit -- Number of best matches considered per highlight, as in `thefuzz.process.extract`. Defaults to 5.
+    return_sources -- Whether to also return, for each match, the index of the highlight that matched it best. Defaults to False.
+
+    Functionality:
+    - Preprocesses highlights and sentences the way `thefuzz` does (lowercase, alphanumerics only, ASCII only).
+    - Builds the highlights x sentences `token_sort_ratio` matrix with `rapidfuzz.process.cdist`.
+    - Keeps each highlight's `limit` best sentences (ties resolved by sentence order), 
+      rounds their scores and drops those below `threshold`.
+
+    Returns:
+    The matched sentences without duplicates, in the order they appear in `sentences`. With `return_sources`, 
+    a tuple of that list and the list of the index in `highlights` of each match's best scoring highlight.
+    """
+    from rapidfuzz import fuzz, process
+    from rapidfuzz.utils import default_process
+
+    if not highlights or not sentences:
+        return ([], []) if return_sources else []
+
+    queries = [default_process(default_process(h).translate(NON_ASCII_TABLE)) for h in highlights]
+    choices = [default_process(str(s).translate(NON_ASCII_TABLE)) for s in sentences]
+
+    # Scores are rounded before the threshold test, so anything from `threshold - 0.5` may still pass
+    scores = process.cdist(queries, choices, scorer=fuzz.token_sort_ratio, processor=None, score_cutoff=max(threshold - 0.5, 0))
+
+    best = np.argsort(-scores, axis=1, kind="stable")[:, :limit]
+    best_scores = np.rint(np.take_along_axis(scores, best, axis=1))
+    matched = {sentences[i] for i in best[best_scores >= threshold].tolist()}
+
+    first_index = {}
+    for index, sentence in enumerate(sentences):
+        first_index.setdefault(sentence, index)
+    matches = sorted(matched, key=first_index.__getitem__)
+    if not return_sources:
+        return matches
+
+    # The best highlight of a sentence among those that selected it, the first one on ties
+    sources = {}
+    for highlight, rank in zip(*np.nonzero(best_scores >= threshold)):
+        index = int(best[highlight, rank])
+        score = scores[highlight, index]
+        sentence = sentences[index]
+        if sentence not in sources or score > sources[sentence][0] or (score == sources[sentence][0] and highlight < sources[sentence][1]):
+            sources[sentence] = (score, int(highlight))
+    return matches, [sources[match][1] for match in matches]
+
+
+# Geometry matching: a word of the page is looked for in its text at most this many characters after the previous 
+# one, so a word the text does not hold is skipped without losing the place of the next ones.
+SENTENCE_WORD_MAX_GAP = 32
+
+# How highlights are mapped to the sentences of a page: by where their words lie, by fuzzy matching their text, or 
+# by their words with fuzzy matching for the highlights that select no sentence that way.
+MATCH_MODES = ("geometry", "auto", "fuzzy")
+
+# The default threshold of each way of matching: the share of a sentence's word area highlights must cover, and the 
+# fuzzy matching score. Highlights often cover a phrase rather than a whole sentence, hence the lower share.
+MATCH_THRESHOLDS = {"geometry": 25, "fuzzy": 50}
+
+
+@timed("sentence_words")
+def sentence_words(text, words):
+    """
+    Assigns each word of a page to its sentence, with its character offset and box.
+
+    The sentences are those of `getTextFromPDFAsParagraphs` (`paragraphsForNormal`), found by the same split 
+    of the page text, so they come in the same order. Each word of the text layout is located in the text 
+    from where the previous one ended, which gives its offset and so its sentence, in one pass over the text.
+
+    Args:
+        text (str): The plain text of the page, e.g. `PageContext.text`.
+        words (list): The words of the same text layout, as returned by `page.get_text("words")`.
+
+    Returns:
+        list: For each sentence, its words as [character offset in `text`, x0, y0, x1, y1] lists.
+    """
+    starts, ends = [], []
+    position = 0
+    for part in text.split('. '):
+        if part.replace("\n", " ").strip():
+            starts.append(position)
+            ends.append(position + len(part))
+        position += len(part) + 2
+
+    sentences = [[] for _ in starts]
+    cursor = 0
+    for x0, y0, x1, y1, word, *_ in words:
+        offset = text.find(word, cursor, cursor + SENTENCE_WORD_MAX_GAP + len(word))
+        if offset < 0:
+            continue
+        cursor = offset + len(word)
+        index = bisect.bisect_right(starts, offset) - 1
+        if index >= 0 and offset < ends[index]:
+            sentences[index].append([offset, x0, y0, x1, y1])
+    return sentences
+
+
+@timed("match_sentence_boxes")
+def match_sentence_boxes(highlight_boxes, sentence_words, threshold=50):
+    """
+    Selects the sentences of a page that highlights cover, from where their words lie on the page.
+
+    A word is covered by a box when the box covers at least `WORD_MIN_COVERED_WIDTH` of its width and 
+    `WORD_MIN_COVERED_HEIGHT` of its height, as in `WordIndex`, and a sentence is selected when the words covered 
+    by any highlight make up at least `threshold` percent of the area of its words. No text is compared, so the 
+    selection does not depend on how well the text under a box reads. The middle of a covered word lies within 
+    the box's height widened by that share of the tallest word, so the words are sorted by the height of their 
+    middle once, and each box is only compared with the words whose middle lies in that band, all boxes at once 
+    with NumPy.
+
+    Args:
+        highlight_boxes (list): The boxes of each highlight, as lists of (x1, y1, x2, y2) tuples in PDF points.
+        sentence_words (list): The words of each sentence, see `sentence_words`.
+        threshold (int, optional): The share of a sentence's word area highlights must cover, in percent. Default is 50.
+
+    Returns:
+        tuple: The indices of the selected sentences in page order, the index of the highlight covering the 
+               most of each one, and the indices of the highlights that cover no word of a selected sentence.
+    """
+    highlight_count, sentence_count = len(highlight_boxes), len(sentence_words)
+    words = np.array([box for words in sentence_words for _, *box in words], float).reshape(-1, 4)
+    boxes = np.array([box for boxes in highlight_boxes for box in boxes], float).reshape(-1, 4)
+    if not len(words) or not len(boxes):
+        return [], [], list(range(highlight_count))
+    sentences = np.repeat(np.arange(sentence_count), [len(words) for words in sentence_words])
+    highlights = np.repeat(np.arange(highlight_count), [len(boxes) for boxes in highlight_boxes])
+
+    middles = (words[:, 1] + words[:, 3]) / 2
+    order = np.argsort(middles, kind="stable")
+    words, sentences, middles = words[order], sentences[order], middles[order]
+    areas = (words[:, 2] - words[:, 0]) * (words[:, 3] - words[:, 1])
+
+    # Every (box, word) pair whose word's middle lies within the box's height, widened so a box covering only the 
+    # bottom or top of the words still meets them
+    margin = (0.5 - WORD_MIN_COVERED_HEIGHT) * (words[:, 3] - words[:, 1]).max()
+    first, last = np.searchsorted(middles, boxes[:, 1] - margin, "left"), np.searchsorted(middles, boxes[:, 3] + margin, "right")
+    counts = np.maximum(last - first, 0)
+    pair_boxes = np.repeat(np.arange(len(boxes)), counts)
+    pair_words = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - first, counts)
+    box, word = boxes[pair_boxes], words[pair_words]
+    hits = (np.minimum(box[:, 2], word[:, 2]) - np.maximum(box[:, 0], word[:, 0]) >= WORD_MIN_COVERED_WIDTH * (word[:, 2] - word[:, 0])) & \
+           (np.minimum(box[:, 3], word[:, 3]) - np.maximum(box[:, 1], word[:, 1]) >= WORD_MIN_COVERED_HEIGHT * (word[:, 3] - word[:, 1]))
+
+    # Each covered word once per highlight covering it, and once for the share of its sentence
+    pairs = np.unique(pair_words[hits] * highlight_count + highlights[pair_boxes[hits]])
+    hit_words, hit_highlights = pairs // highlight_count, pairs % highlight_count
+    covered_by = np.bincount(sentences[hit_words] * highlight_count + hit_highlights, weights=areas[hit_words], 
+                             minlength=sentence_count * highlight_count).reshape(sentence_count, highlight_count)
+    hit_words = np.unique(hit_words)
+    covered = np.bincount(sentences[hit_words], weights=areas[hit_words], minlength=sentence_count)
+    totals = np.bincount(sentences, weights=areas, minlength=sentence_count)
+
+    selected = np.nonzero((covered > 0) & (covered >= threshold / 100 * totals))[0]
+    # The first highlight on ties, as in `match_highlights`
+    sources = covered_by[selected].argmax(axis=1)
+    used = covered_by[selected].sum(axis=0) > 0
+    return selected.tolist(), sources.tolist(), np.nonzero(~used)[0].tolist()
+
+
+def map_highlights(highlights, highlight_boxes, sentences, sentence_words, threshold=None, mode="geometry"):
+    """
+    Maps the highlights of a page to its sentences, by geometry, fuzzy matching or both (see `MATCH_MODES`).
+
+    Args:
+        highlights (list): The highlighted text of each highlight.
+        highlight_boxes (list): The boxes of each highlight, see `match_sentence_boxes`.
+        sentences (list): The sentences of the page, from `getTextFromPDFAsParagraphs`.
+        sentence_words (list): The words of each sentence, see `sentence_words`.
+        threshold (int, optional): The covered share of a sentence (geometry) or the similarity score (fuzzy) a 
+                                   match needs, in percent. Default is None, that of `MATCH_THRESHOLDS` for each.
+        mode (str, optional): "geometry" selects the sentences the highlights cover (`match_sentence_boxes`), "fuzzy" 
+                              scores the highlighted text against the sentences (`match_highlights`), and "auto" 
+                              does the former and fuzzy matches the highlights that select no sentence. Default is "geometry".
+
+    Returns:
+        tuple: The matched sentences without duplicates, in page order, and the index of the highlight each one 
+               was matched by, as `match_highlights` returns with `return_sources`.
+    """
+    geometry_threshold, fuzzy_threshold = (MATCH_THRESHOLDS[name] if threshold is None else threshold for name in ("geometry", "fuzzy"))
+    if mode == "fuzzy":
+        return match_highlights(highlights, sentences, threshold=fuzzy_threshold, return_sources=True)
+
+    selected, sources, unmatched = match_sentence_boxes(highlight_boxes, sentence_words, threshold=geometry_threshold)
+    matched = {}
+    for sentence, source in zip(selected, sources):
+        matched.setdefault(sentences[sentence], source)
+    if mode == "auto" and unmatched:
+        fuzzy_matches, fuzzy_sources = match_highlights([highlights[i] for i in unmatched], sentences, threshold=fuzzy_threshold, return_sources=True)
+        for sentence, source in zip(fuzzy_matches, fuzzy_sources):
+            matched.setdefault(sentence, unmatched[source])
+
+    first_index = {}
+    for index, sentence in enumerate(sentences):
+        first_index.setdefault(sentence, index)
+    matches = sorted(matched, key=first_index.__getitem__)
+    return matches, [matched[match] for match in matches]
+
+
+class HeadingMatcher:
+    """
+    An Aho-Corasick automaton over a page's headings.
+
+    The automaton is built once per page and finds every heading occurring in a piece of text 
+    in a single scan of that text, however many headings the page has.
+
+    Attributes:
+        headings (list): The headings the automaton was built from.
+    """
+
+    def __init__(self, headings):
+        self.headings = [heading for heading in headings if heading]
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        # Build the trie of headings
+        for index, heading in enumerate(self.headings):
+            state = 0
+            for char in heading:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append(index)
+
+        # Add failure links breadth first, so each state's suffix state is done before it
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def occurrences(self, text):
+        """
+        Finds every occurrence of the headings in a text, overlapping or not.
+
+        Args:
+            text (str): The text to scan.
+
+        Returns:
+            list: (start, end, heading) tuples, ordered by start and, at the same start, longest first.
+        """
+        found = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for index in self._output[state]:
+                found.append((position - len(self.headings[index]) + 1, position + 1, self.headings[index]))
+        return sorted(found, key=lambda occurrence: (occurrence[0], -occurrence[1]))
+
+    def spans(self, text):
+        """
+        Finds the outermost occurrences of the headings in a text, without overlaps.
+
+        Where occurrences overlap, the one starting first is kept, the longest at the same start, so a heading 
+        inside another one, e.g. "Methods" in "Research Methods", is not found on its own there.
+
+        Args:
+            text (str): The text to scan.
+
+        Returns:
+            list: (start, end, heading) tuples in text order.
+        """
+        spans, end = [], 0
+        for start, stop, heading in self.occurrences(text):
+            if start >= end:
+                spans.append((start, stop, heading))
+                end = stop
+        return spans
+
+
+@timed("attach_headings")
+def attach_headings(matches, headings, colors=None):
+    """
+    Pulls the page headings out of the matched sentences and places them before the sentences they start.
+
+    Arguments:
+    matches -- The matched sentences of a page, in page order.
+    headings -- The headings found on the page.
+    colors -- The highlight colour of each match, given to its `Bullet`. Defaults to None (no colours).
+
+    Functionality:
+    - Builds one `HeadingMatcher` over the headings and scans each match once.
+    - For a match containing headings, emits a `Heading` record for each of them (in order of appearance) 
+      followed by the match with the headings removed; other matches become plain `Bullet` records. Only the 
+      outermost, non-overlapping occurrences count (see `HeadingMatcher.spans`), so a heading inside another 
+      one is not emitted twice.
+    - Builds a new list instead of inserting into `matches` while iterating over it.
+
+    Returns:
+    A new list of `Heading` and `Bullet` records.
+    """
+    colors = colors or [None] * len(matches)
+    if not headings:
+        return [Bullet(match, color) for match, color in zip(matches, colors)]
+
+    matcher = HeadingMatcher(headings)
+    attached = []
+    for match, color in zip(matches, colors):
+        spans = matcher.spans(match)
+        attached += [Heading(heading) for heading in dict.fromkeys(heading for _, _, heading in spans)]
+        # The sentence without its headings
+        parts, end = [], 0
+        for start, stop, _ in spans:
+            parts.append(match[end:start])
+            end = stop
+        attached.append(Bullet("".join(parts) + match[end:], color))
+    return attached
+
+
 def displayResult(title, iterable):
     """
     Displays the content of an iterable with a given title.
@@ -681,7 +1483,7 @@ def get_count(iterable, counter):
 
 
 
-def create_header_footer(elements, item, is_footer=False, page_width=letter[0], page_height=letter[1]):
+def create_header_footer(elements, item, is_footer=False, page_width=None, page_height=None):
     """
     Adds a header or footer to a PDF document.
 
@@ -690,8 +1492,8 @@ def create_header_footer(elements, item, is_footer=False, page_width=letter[0],
     item -- The text content for the header or footer.
     is_footer -- A boolean indicating whether the element is a footer (True) or a header (False).
                  Defaults to False.
-    page_width -- The width of the page in points. Defaults to `letter[0]`.
-    page_height -- The height of the page in points. Defaults to `letter[1]`.
+    page_width -- The width of the page in points. Defaults to None, the letter page width.
+    page_height -- The height of the page in points. Defaults to None, the letter page height.
 
     Functionality:
     - Styles the header or footer with predefined `ParagraphStyle`.
@@ -701,6 +1503,10 @@ def create_header_footer(elements, item, is_footer=False, page_width=letter[0],
     Returns:
     None
     """
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import Paragraph, Spacer
+
     # If it's a header or a footer
     header_style = ParagraphStyle(
         name="Header",
@@ -736,37 +1542,179 @@ def create_header_footer(elements, item, is_footer=False, page_width=letter[0],
 
 
 
-def load_images_from_folder(folder):
+class ImageBuffer:
     """
-    Loads images from a specified folder and returns them as a list.
+    Holds the images cropped from the pages in memory, under stable IDs, up to a size bound.
+
+    Crops are added page by page as NumPy arrays and named after their page and position 
+    ("page3-image2"), or their page and cross-reference number for images embedded in the PDF 
+    ("page3-xref12"), so names never collide and the same crop gets the same name on every run. 
+    When the buffer holds more than `max_images` crops or `max_bytes` of pixels, the oldest crops 
+    are dropped, so the cost of a document stays linear in its number of crops.
+
+    Attributes:
+        max_images (int): The most crops held.
+        max_bytes (int): The most pixel bytes held.
+        images (OrderedDict): The crops by ID, oldest first.
+        xrefs (dict): The cross-reference number of the embedded images, by ID.
+    """
+
+    def __init__(self, max_images=64, max_bytes=64 * 1024 * 1024):
+        self.max_images = max_images
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()
+        self.xrefs = {}
+        self._bytes = 0
+
+    def add(self, page_number, crops, xrefs=None):
+        """
+        Adds the crops of a page and returns their IDs, evicting the oldest crops beyond the bounds.
+
+        `xrefs`, if given, are the cross-reference numbers of embedded images the crops were decoded from.
+        """
+        ids = []
+        for index, crop in enumerate(crops, start=1):
+            image_id = f"page{page_number}-image{index}" if xrefs is None else f"page{page_number}-xref{xrefs[index - 1]}"
+            self.discard(image_id)
+            self.images[image_id] = crop
+            self._bytes += crop.nbytes
+            self.xrefs[image_id] = xrefs[index - 1] if xrefs is not None else None
+            ids.append(image_id)
+        while self.images and (len(self.images) > self.max_images or self._bytes > self.max_bytes):
+            self.discard(next(iter(self.images)))
+        return [image_id for image_id in ids if image_id in self.images]
+
+    def discard(self, image_id):
+        crop = self.images.pop(image_id, None)
+        self.xrefs.pop(image_id, None)
+        self._bytes -= crop.nbytes if crop is not None else 0
+
+    def __getitem__(self, image_id):
+        return self.images[image_id]
+
+    def __contains__(self, image_id):
+        return image_id in self.images
+
+    def __len__(self):
+        return len(self.images)
+
+
+def encode_image(image, image_id=None):
+    """
+    Encodes an image once, for the summary.
 
     Arguments:
-    + folder -- Path to the folder containing image files.
+    + image -- The image as a BGR (or grayscale) NumPy array.
+    + image_id -- The image's ID, see `ImageBuffer` (default: None).
+
+    Returns:
+    + An `ImageRecord` holding the image as PNG bytes, keyed by its perceptual hash and size.
+    """
+    ok, encoded = cv2.imencode(".png", image)
+    if not ok:
+        raise ValueError(f"Could not encode image {image_id}")
+    return ImageRecord(data=encoded.tobytes(), image_id=image_id, key=f"dhash:{dhash(image):016x}:{image.shape[1]}x{image.shape[0]}")
 
-    Functionality:
-    - Iterates through files in the folder.
-    - Filters files by image extensions (e.g., .png, .jpg, .jpeg).
-    - Reads valid image files into OpenCV format and stores their paths.
+
+def dhash(image, size=8):
+    """
+    Computes the difference hash of an image: one bit per pair of horizontally adjacent pixels of a 
+    `size + 1` by `size` thumbnail, set when the left pixel is brighter. Near-identical images, e.g. the 
+    same figure cropped a pixel apart or re-encoded, get hashes a few bits apart.
+
+    Arguments:
+    + image -- The image as a BGR (or grayscale) NumPy array.
+    + size -- The hash has `size * size` bits (default: 8).
 
     Returns:
-    A tuple containing:
-    - `images`: A list of loaded images in OpenCV format.
-    - `paths`: A list of corresponding file paths for the loaded images.
+    + The hash as an int.
     """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    thumbnail = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, :-1] > thumbnail[:, 1:]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
 
-    images = []
-    paths = []
-    for filename in os.listdir(folder):
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-            img_path = os.path.join(folder, filename)
-            img = cv2.imread(img_path)
-            if img is not None:
-                images.append(img)
-                paths.append(img_path)
-    return images, paths
 
+# Perceptual hashes of rendered crops at most this many bits apart make them candidate copies of each other.
+DHASH_MAX_DISTANCE = 4
 
+# Rendered crops whose width and height differ by more than this share are different images, whatever their hashes.
+DHASH_MAX_SIZE_CHANGE = 0.1
 
+# Candidate copies are confirmed on 32x32 grayscale thumbnails, which may differ by at most this much in any pixel. 
+# A crop shifted by a pixel or re-encoded stays well under it; a chart with one bar changed goes well over.
+THUMBNAIL_SIZE = 32
+THUMBNAIL_MAX_DIFFERENCE = 32
+
+class ImageDeduplicator:
+    """
+    Keeps one copy of each distinct image of a summary, so repeated images are stored once in the output.
+
+    Records resolved through it are replaced by the first record of the same image: images with the same 
+    key (the same embedded object) or the same bytes, and regions cropped from rendered pages that look 
+    the same. The latter are looked up by perceptual hash (see `dhash`), which a flat chart shares with 
+    many others, so each candidate is confirmed by comparing thumbnails of the two images. Since the 
+    duplicates then share their bytes, the PDF and DOCX writers embed the image once and refer to it from 
+    every place it appears.
+
+    Attributes:
+        max_distance (int): The most bits the perceptual hashes of two copies may differ by.
+        duplicates (int): The number of records replaced so far.
+        saved_bytes (int): The encoded size of the images replaced so far.
+    """
+
+    def __init__(self, max_distance=DHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.duplicates = 0
+        self.saved_bytes = 0
+        self._by_key = {}
+        self._by_digest = {}
+        self._rendered = []
+        self._thumbnails = {}
+
+    def resolve(self, record):
+        """
+        Returns the first record of the same image, or `record` itself when the image was not seen before.
+        """
+        if record.data is None:
+            return record
+        digest = hashlib.sha1(record.data).digest()
+        rendered = bool(record.key) and record.key.startswith("dhash:")
+        first = self._by_digest.get(digest) or (self._near(record) if rendered else self._by_key.get(record.key))
+        if first is not None and first is not record:
+            self.duplicates += 1
+            self.saved_bytes += len(record.data)
+            return first
+        self._by_digest.setdefault(digest, record)
+        if rendered:
+            self._rendered.append(record)
+        elif record.key:
+            self._by_key.setdefault(record.key, record)
+        return record
+
+    def _near(self, record):
+        _, value, size = record.key.split(":")
+        value, (width, height) = int(value, 16), map(int, size.split("x"))
+        thumbnail = None
+        for other in self._rendered:
+            _, other_value, other_size = other.key.split(":")
+            other_width, other_height = map(int, other_size.split("x"))
+            if (abs(width - other_width) > DHASH_MAX_SIZE_CHANGE * max(width, other_width)
+                    or abs(height - other_height) > DHASH_MAX_SIZE_CHANGE * max(height, other_height)
+                    or bin(value ^ int(other_value, 16)).count("1") > self.max_distance):
+                continue
+            thumbnail = thumbnail if thumbnail is not None else image_thumbnail(record.data)
+            if id(other) not in self._thumbnails:
+                self._thumbnails[id(other)] = image_thumbnail(other.data)
+            if int(np.abs(thumbnail - self._thumbnails[id(other)]).max()) <= THUMBNAIL_MAX_DIFFERENCE:
+                return other
+        return None
+
+
+def image_thumbnail(data, size=THUMBNAIL_SIZE):
+    """Decodes encoded image bytes into a `size` by `size` grayscale thumbnail, as an int16 array."""
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.int16)
 
 
 def mouse_callback(event, x, y, flags, param):
@@ -816,7 +1764,7 @@ def display_images_grid(images, paths, window_name="Image Grid", cell_size=(200,
 
     Arguments:
     + images -- A list of image objects (numpy arrays) to display.
-    + paths -- A list of file paths corresponding to the images.
+    + paths -- A list of file paths or IDs (see `ImageBuffer`) identifying the images.
     + window_name -- Name of the window (default: "Image Grid").
     + cell_size -- A tuple (width, height) specifying the size of each grid cell (default: (200, 200)).
     + padding -- Spacing between grid cells (default: 10 pixels).
@@ -830,7 +1778,7 @@ def display_images_grid(images, paths, window_name="Image Grid", cell_size=(200,
     - Dynamically determines grid dimensions based on the number of images.
 
     Returns:
-    + A string containing the path of the selected image or an empty string if no selection is made.
+    + A string containing the path or ID of the selected image or an empty string if no selection is made.
     """
 
     if not images:
@@ -986,39 +1934,6 @@ def display_strings(strings, window_name="Strings List", close_caption_window =
     return param["pdf_caption_text"]
 
 
-def clear_images_folder(folder_path):
-    """
-    Deletes all contents of a specified folder, including subdirectories and files.
-
-    Arguments:
-    + folder_path -- The path to the folder to be cleared.
-
-    Functionality:
-    - Checks if the folder exists.
-    - Deletes all files and subdirectories within the folder.
-    - Prints a confirmation message upon successful deletion or a warning if the folder does not exist.
-
-    Returns:
-    None
-    """
-
-    # Check if folder exists
-    if os.path.exists(folder_path):
-        # Loop through all files and subdirectories
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            
-            # If it's a directory, remove it recursively
-            if os.path.isdir(file_path):
-                shutil.rmtree(file_path)
-            else:
-                # If it's a file, remove it
-                os.remove(file_path)
-        print(f"All contents of {folder_path} have been deleted.")
-    else:
-        print(f"The folder {folder_path} does not exist.")
-
-
 def merge_pdfs(output_pdf_file, *input_pdf_files):
     """
     Merges multiple PDF files into a single output PDF.
@@ -1073,6 +1988,8 @@ def create_header_footer_for_docx(doc, item, is_footer=False):
     Returns:
     None
     """
+    from docx.shared import Pt, RGBColor
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 
     header_footer_style = {
         "font_name": "Courier",
@@ -1098,29 +2015,29 @@ def create_header_footer_for_docx(doc, item, is_footer=False):
 
 
 
-def save_to_docx(results, filename, images_folder_path='tmp-images', clear_after_wards=True):
+@timed("save_to_docx")
+def save_to_docx(results, filename):
     """
     Saves a list of results into a Word document with formatting and optional images.
 
     Arguments:
-    + results -- A list of strings or file paths to add to the document. Supports headings, text, images, and captions.
+    + results -- A list of summary records (see `records.py`) to add to the document. Old string-based lists are converted with `from_legacy`.
     + filename -- The path to save the resulting Word document.
-    + images_folder_path -- The path to the folder containing images to embed (default: 'tmp-images').
-    + clear_after_wards -- Boolean flag to delete the contents of `images_folder_path` after saving the document (default: True).
 
     Functionality:
     - Creates a Word document with custom styles for headings, bullet points, and embedded images.
-    - Iterates over the `results` list, identifying and formatting different types of content:
-    - Headings: Recognized by delimiters `#######` and `##############`.
-    - Images: Embedded with specified dimensions and optional captions.
-    - Horizontal lines: Rendered for specific markers.
-    - Headers and footers: Added for specific patterns.
-    - Bullet points: Applied to regular text items.
-    - Optionally clears the images folder after saving the document.
+    - Iterates over `results` (a list, or a stream of records from `get_summary(..., stream=True)`), formatting each record according to its type:
+    - Headings: `Heading` records.
+    - Images: `ImageRecord` records, embedded with specified dimensions, and `Caption` records.
+    - Headers and footers: `PageHeader` and `PageFooter` records, the footer followed by a horizontal line.
+    - Bullet points: `Bullet` records.
 
     Returns:
     None
     """
+    from docx import Document
+    from docx.shared import Pt, RGBColor
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 
     # Create the Word document
     doc = Document()
@@ -1141,63 +2058,50 @@ def save_to_docx(results, filename, images_folder_path='tmp-images', clear_after
         "symbol": "◉",
     }
 
-    # Iterate over the results and add them to the document
-    i = 0
-    while i < len(results):
-        item = results[i]
-
-        # Check if the item is a heading or normal text
-        if "#######" in item:
-            heading = item.split("#######")[1].split("##############")[0].strip()
+    # Add each record with the formatting matching its type
+    for item in from_legacy(results):
+        if isinstance(item, Heading):
             paragraph = doc.add_paragraph()
-            run = paragraph.add_run(heading)
+            run = paragraph.add_run(item.text)
             run.font.size = Pt(heading_style["font_size"])
             run.bold = heading_style["bold"]
             run.font.color.rgb = heading_style["color"]
             paragraph.alignment = heading_style["alignment"]
-        else:
-            # Handle Image Embedding
-            if os.path.isfile(item):
-                # Embed the image
-                img_path = item
-                doc.add_picture(img_path, width=Pt(200), height=Pt(200))
-
-                # Check if the next line is a caption for the image
-                if i + 1 < len(results) and "Figure" in results[i + 1]:
-                    caption = results[i + 1]
-                    paragraph = doc.add_paragraph()
-                    run = paragraph.add_run(caption)
-                    run.font.size = Pt(12)
-                    run.italic = True
-                    i += 1  # Skip the next item since it's the caption
-
-            elif item == "\n\n==============================================================\n\n":
-                # Add a horizontal line
-                paragraph = doc.add_paragraph()
-                run = paragraph.add_run("=" * 50)
-                run.font.size = Pt(12)
-                paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            elif re.match(r"^Page \d+:$", item):
-                create_header_footer_for_docx(doc, item)
-            elif re.match(r"\n\nOriginal Text Length \d+\n' {6}\| {6}\nHighlighted Text Count: \d+", item):
-                create_header_footer_for_docx(doc, item, is_footer=True)
+        elif isinstance(item, Bullet):
+            paragraph = doc.add_paragraph()
+            if item.color in HIGHLIGHT_CLASSES:
+                # The bullet takes the colour of the highlight
+                symbol = paragraph.add_run(bullet_style["symbol"])
+                symbol.font.size = Pt(bullet_style["font_size"])
+                symbol.font.color.rgb = RGBColor(*HIGHLIGHT_CLASSES[item.color][1])
+                run = paragraph.add_run(f"   {item.text}")
             else:
-                # Add bullet points or other text
-                paragraph = doc.add_paragraph()
-                run = paragraph.add_run(f"{bullet_style['symbol']}   {item}")
-                run.font.size = Pt(bullet_style["font_size"])
-                run.font.color.rgb = bullet_style["color"]
-                paragraph.paragraph_format.left_indent = Pt(bullet_style["indentation"])
-
-        i += 1
+                run = paragraph.add_run(f"{bullet_style['symbol']}   {item.text}")
+            run.font.size = Pt(bullet_style["font_size"])
+            run.font.color.rgb = bullet_style["color"]
+            paragraph.paragraph_format.left_indent = Pt(bullet_style["indentation"])
+        elif isinstance(item, ImageRecord):
+            # Embed the image
+            doc.add_picture(item.source, width=Pt(200), height=Pt(200))
+        elif isinstance(item, Caption):
+            paragraph = doc.add_paragraph()
+            run = paragraph.add_run(item.text)
+            run.font.size = Pt(12)
+            run.italic = True
+        elif isinstance(item, PageHeader):
+            create_header_footer_for_docx(doc, item.to_text())
+        elif isinstance(item, PageFooter):
+            create_header_footer_for_docx(doc, item.counts_text, is_footer=True)
+
+            # Add a horizontal line
+            paragraph = doc.add_paragraph()
+            run = paragraph.add_run("=" * 50)
+            run.font.size = Pt(12)
+            paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
 
     # Save the Word document
     doc.save(filename)
 
-    # Optional: Clear the images folder if specified
-    if clear_after_wards:
-        clear_images_folder(images_folder_path)
-
 
 
 def gradient_text(text, colors):
@@ -1254,18 +2158,3 @@ def gradient_text(text, colors):
             colored_line += colored_char
         colored_text.append(colored_line)
     return "\n".join(colored_text)
-
-
-
-def check_and_create_folder(folder_name):
-    # Get the current working directory
-    current_directory = os.getcwd()
-    
-    # Define the full path to the folder
-    folder_path = os.path.join(current_directory, folder_name)
-    
-    # Check if the folder exists
-    if not os.path.exists(folder_path):
-        # Create the folder if it doesn't exist
-        os.makedirs(folder_path)
-        print(f"Folder '{folder_name}' created.")
\ No newline at end of file